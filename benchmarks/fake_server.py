@@ -0,0 +1,628 @@
+#
+# SPDX-FileCopyrightText: Sebastiano Barezzi
+# SPDX-License-Identifier: Apache-2.0
+#
+"""Local stand-in for the GoFile API, for the libgofile benchmarks."""
+
+from contextlib import contextmanager
+from copy import deepcopy
+from hashlib import md5
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import dumps
+from random import Random
+from sebaubuntu_libs.libgofile import raw_api
+from secrets import token_hex
+from threading import Lock, Thread
+from time import monotonic, sleep, time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+from uuid import uuid4
+
+DEFAULT_TOKEN = "fake-token"
+DEFAULT_SERVER = "store1"
+
+# Size of the blocks used to throttle reads and writes
+THROTTLE_BLOCK_SIZE = 64 * 1024
+
+
+class FakeGoFileServer:
+    """
+    In-memory GoFile API server, listening on localhost.
+
+    It implements the endpoints used by raw_api with the same status/data
+    envelope, plus ranged downloads of the uploaded files from their direct link.
+    All the contents are owned by a single account, authenticated by token.
+
+    Network conditions can be simulated:
+    - latency: seconds to wait before handling each request
+    - bandwidth: bytes per second for request and response bodies, per connection
+    - error_rate: probability of answering a request with error_status
+    - rate_limit: API requests per second accepted, the ones over it are
+      answered with 429 and error-rateLimit, like the real API does
+
+    Use patch_raw_api() to point raw_api (and everything built on it) to this server.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        token: str = DEFAULT_TOKEN,
+        latency: float = 0.0,
+        bandwidth: Optional[float] = None,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        rate_limit: Optional[float] = None,
+        seed: Optional[int] = None,
+    ):
+        self.token = token
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rate_limit = rate_limit
+
+        self.requests_count = 0
+        self.errors_count = 0
+        self.throttled_count = 0
+
+        self._rate_limit_tokens = rate_limit or 0.0
+        self._rate_limit_time = monotonic()
+
+        self._random = Random(seed)
+        self._lock = Lock()
+
+        # Content ID -> content dict, as returned by the API
+        self._contents: Dict[str, Dict[str, Any]] = {}
+        # File ID -> file data
+        self._files_data: Dict[str, bytes] = {}
+
+        self.root_folder = self._new_folder(None, "root")["id"]
+
+        self._httpd = _HTTPServer((host, port), _RequestHandler, self)
+        self._thread: Optional[Thread] = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Start serving in a background thread."""
+        self._thread = Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    @contextmanager
+    def patch_raw_api(self) -> Iterator["FakeGoFileServer"]:
+        """Send the raw_api requests to this server while in the context."""
+        old_urls = (raw_api.API_URL, raw_api.SERVER_URL)
+        raw_api.API_URL = self.url
+        raw_api.SERVER_URL = self.url
+
+        try:
+            yield self
+        finally:
+            raw_api.API_URL, raw_api.SERVER_URL = old_urls
+
+    def create_folder(self, parent_folder_id: str, folder_name: str) -> Dict[str, Any]:
+        """Create a folder without going through HTTP, e.g. to populate the server."""
+        with self._lock:
+            return self._new_folder(self._get_folder(parent_folder_id), folder_name)
+
+    def add_file(self, parent_folder_id: str, name: str, data: bytes) -> Dict[str, Any]:
+        """Add a file without going through HTTP, e.g. to populate the server."""
+        with self._lock:
+            return self._new_file(self._get_folder(parent_folder_id), name, data)
+
+    def get_file_data(self, file_id: str) -> bytes:
+        return self._files_data[file_id]
+
+    # Endpoints, called with the lock held, they return the data or raise _APIError
+
+    def _get_server(self, args: Dict[str, str]) -> Any:
+        return {"server": DEFAULT_SERVER}
+
+    def _get_account_details(self, args: Dict[str, str]) -> Any:
+        self._check_token(args)
+
+        files = [content for content in self._contents.values() if content["type"] == "file"]
+
+        return {
+            "token": self.token,
+            "email": "fake@example.com",
+            "tier": "premium",
+            "rootFolder": self.root_folder,
+            "filesCount": len(files),
+            "filesCountLimit": None,
+            "totalSize": sum(file["size"] for file in files),
+            "totalSizeLimit": None,
+            "total30DDLTraffic": 0,
+            "total30DDLTrafficLimit": None,
+        }
+
+    def _get_content(self, args: Dict[str, str]) -> Any:
+        self._check_token(args)
+        folder = self._get_folder(self._get_arg(args, "contentId"))
+
+        contents = {child_id: deepcopy(self._contents[child_id]) for child_id in folder["childs"]}
+
+        response = deepcopy(folder)
+        response["isRoot"] = folder["id"] == self.root_folder
+        response["ownerId"] = "fake-owner"
+        response["totalDownloadCount"] = 0
+        response["totalSize"] = sum(content.get("size", 0) for content in contents.values())
+        response["contents"] = contents
+
+        return response
+
+    def _create_folder(self, args: Dict[str, str]) -> Any:
+        self._check_token(args)
+        parent_folder = self._get_folder(self._get_arg(args, "parentFolderId"))
+
+        return deepcopy(self._new_folder(parent_folder, self._get_arg(args, "folderName")))
+
+    def _set_folder_option(self, args: Dict[str, str]) -> Any:
+        self._check_token(args)
+        folder = self._get_folder(self._get_arg(args, "folderId"))
+
+        option = self._get_arg(args, "option")
+        value = self._get_arg(args, "value")
+        if option == "public":
+            folder["public"] = value == "true"
+        else:
+            folder[option] = value
+
+        return {}
+
+    def _copy_content(self, args: Dict[str, str]) -> Any:
+        self._check_token(args)
+        destination = self._get_folder(self._get_arg(args, "folderIdDest"))
+
+        contents = [self._get_existing(content_id) for content_id in self._get_contents_id(args)]
+        for content in contents:
+            self._copy(content, destination)
+
+        return {}
+
+    def _delete_content(self, args: Dict[str, str]) -> Any:
+        self._check_token(args)
+
+        contents_id = self._get_contents_id(args)
+        for content_id in contents_id:
+            content = self._get_existing(content_id)
+            if content["id"] == self.root_folder:
+                raise _APIError("error-notPermitted")
+
+        result = {}
+        for content_id in contents_id:
+            self._delete(content_id)
+            result[content_id] = {"status": "ok", "data": {}}
+
+        return result
+
+    def _upload_file(self, args: Dict[str, str], fields: Dict[str, Tuple[Optional[str], bytes]]):
+        if "token" in args:
+            self._check_token(args)
+
+        if "file" not in fields:
+            raise _APIError("error-noFile")
+        filename, data = fields["file"]
+
+        if "folderId" in args:
+            folder = self._get_folder(args["folderId"])
+        else:
+            # Like GoFile, every upload without a folder gets a new one
+            folder = self._new_folder(self._contents[self.root_folder], token_hex(4))
+
+        file = self._new_file(folder, filename or "file", data)
+
+        return {
+            "downloadPage": f"{self.url}/d/{folder['code']}",
+            "code": folder["code"],
+            "parentFolder": folder["id"],
+            "fileId": file["id"],
+            "fileName": file["name"],
+            "md5": file["md5"],
+        }
+
+    def _get_geo(self, args: Dict[str, str]) -> Any:
+        return {"country": "ZZ"}
+
+    # Helpers
+
+    def _should_throttle(self) -> bool:
+        if not self.rate_limit:
+            return False
+
+        with self._lock:
+            now = monotonic()
+            self._rate_limit_tokens = min(
+                self._rate_limit_tokens + (now - self._rate_limit_time) * self.rate_limit,
+                self.rate_limit,
+            )
+            self._rate_limit_time = now
+
+            if self._rate_limit_tokens < 1:
+                self.throttled_count += 1
+                return True
+
+            self._rate_limit_tokens -= 1
+
+        return False
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            self.requests_count += 1
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.errors_count += 1
+                return True
+
+        return False
+
+    def _check_token(self, args: Dict[str, str]):
+        if args.get("token") != self.token:
+            raise _APIError("error-wrongToken", 401)
+
+    @staticmethod
+    def _get_arg(args: Dict[str, str], name: str) -> str:
+        if name not in args:
+            raise _APIError(f"error-no{name[0].upper()}{name[1:]}")
+
+        return args[name]
+
+    def _get_contents_id(self, args: Dict[str, str]) -> List[str]:
+        return [
+            content_id for content_id in self._get_arg(args, "contentsId").split(",") if content_id
+        ]
+
+    def _get_existing(self, content_id: str) -> Dict[str, Any]:
+        if content_id not in self._contents:
+            raise _APIError("error-notFound", 404)
+
+        return self._contents[content_id]
+
+    def _get_folder(self, folder_id: str) -> Dict[str, Any]:
+        folder = self._get_existing(folder_id)
+        if folder["type"] != "folder":
+            raise _APIError("error-notFolder")
+
+        return folder
+
+    def _new_folder(self, parent_folder: Optional[Dict[str, Any]], name: str) -> Dict[str, Any]:
+        folder: Dict[str, Any] = {
+            "id": str(uuid4()),
+            "type": "folder",
+            "name": name,
+            "createTime": int(time()),
+            "childs": [],
+            "code": token_hex(3),
+            "public": True,
+        }
+        self._add_content(folder, parent_folder)
+
+        return folder
+
+    def _new_file(self, parent_folder: Dict[str, Any], name: str, data: bytes) -> Dict[str, Any]:
+        file_id = str(uuid4())
+        file = {
+            "id": file_id,
+            "type": "file",
+            "name": name,
+            "createTime": int(time()),
+            "size": len(data),
+            "downloadCount": 0,
+            "md5": md5(data).hexdigest(),
+            "mimetype": "application/octet-stream",
+            "serverChoosen": DEFAULT_SERVER,
+            "directLink": f"{self.url}/download/{file_id}/{quote(name)}",
+            "link": f"{self.url}/download/{file_id}/{quote(name)}",
+        }
+        self._files_data[file_id] = data
+        self._add_content(file, parent_folder)
+
+        return file
+
+    def _add_content(self, content: Dict[str, Any], parent_folder: Optional[Dict[str, Any]]):
+        if parent_folder is not None:
+            content["parentFolder"] = parent_folder["id"]
+            parent_folder["childs"].append(content["id"])
+
+        self._contents[content["id"]] = content
+
+    def _copy(self, content: Dict[str, Any], destination: Dict[str, Any]):
+        if content["type"] == "file":
+            self._new_file(destination, content["name"], self._files_data[content["id"]])
+            return
+
+        folder = self._new_folder(destination, content["name"])
+        for child_id in list(content["childs"]):
+            self._copy(self._contents[child_id], folder)
+
+    def _delete(self, content_id: str):
+        # Already deleted with its parent
+        content = self._contents.pop(content_id, None)
+        if content is None:
+            return
+
+        for child_id in content.get("childs", []):
+            self._delete(child_id)
+        self._files_data.pop(content_id, None)
+
+        parent_folder = self._contents.get(content.get("parentFolder", ""))
+        if parent_folder is not None:
+            parent_folder["childs"].remove(content_id)
+
+
+class _APIError(Exception):
+    def __init__(self, status: str, http_status: int = 200):
+        super().__init__(status)
+
+        self.status = status
+        self.http_status = http_status
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        server_address: Tuple[str, int],
+        handler: Callable[..., Any],
+        fake_server: FakeGoFileServer,
+    ):
+        super().__init__(server_address, handler)
+
+        self.fake_server = fake_server
+
+
+# (method, path) -> endpoint
+ENDPOINTS: Dict[Tuple[str, str], Callable[[FakeGoFileServer, Dict[str, str]], Any]] = {
+    ("GET", "/getServer"): FakeGoFileServer._get_server,
+    ("GET", "/getAccountDetails"): FakeGoFileServer._get_account_details,
+    ("GET", "/getContent"): FakeGoFileServer._get_content,
+    ("PUT", "/createFolder"): FakeGoFileServer._create_folder,
+    ("PUT", "/setFolderOption"): FakeGoFileServer._set_folder_option,
+    ("PUT", "/copyContent"): FakeGoFileServer._copy_content,
+    ("DELETE", "/deleteContent"): FakeGoFileServer._delete_content,
+    ("GET", "/getGeo"): FakeGoFileServer._get_geo,
+}
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, don't wait for delayed ACKs
+    disable_nagle_algorithm = True
+
+    def log_message(self, format: str, *args: Any):
+        pass
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+    def do_HEAD(self):
+        self._handle("HEAD")
+
+    @property
+    def fake_server(self) -> FakeGoFileServer:
+        assert isinstance(self.server, _HTTPServer)
+        return self.server.fake_server
+
+    def _handle(self, method: str):
+        # Always consume the body, to keep the connection usable
+        body = self._read_body()
+
+        if self.fake_server.latency:
+            sleep(self.fake_server.latency)
+
+        if self.fake_server._should_fail():
+            self._send_json({"status": "error-injected", "data": {}}, self.fake_server.error_status)
+            return
+
+        split_url = urlsplit(self.path)
+        args = _parse_args(split_url.query)
+
+        if split_url.path.startswith("/download/") and method in ("GET", "HEAD"):
+            self._send_file(split_url.path, method == "HEAD")
+            return
+
+        if self.fake_server._should_throttle():
+            self._send_json({"status": "error-rateLimit", "data": {}}, 429, {"Retry-After": "1"})
+            return
+
+        content_type = self.headers.get("Content-Type", "")
+        if content_type.startswith("application/x-www-form-urlencoded"):
+            args.update(_parse_args(body.decode("utf-8")))
+
+        try:
+            with self.fake_server._lock:
+                if (method, split_url.path) == ("POST", "/uploadFile"):
+                    data = self.fake_server._upload_file(args, _parse_multipart(content_type, body))
+                elif (method, split_url.path) in ENDPOINTS:
+                    data = ENDPOINTS[(method, split_url.path)](self.fake_server, args)
+                else:
+                    raise _APIError("error-notFound", 404)
+        except _APIError as e:
+            self._send_json({"status": e.status, "data": {}}, e.http_status)
+            return
+
+        self._send_json({"status": "ok", "data": data})
+
+    def _read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b";", 1)[0].strip(), 16)
+                if size == 0:
+                    # Skip trailers
+                    while self.rfile.readline() not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+
+                chunks.append(self._throttled_read(size))
+                self.rfile.readline()
+
+            return b"".join(chunks)
+
+        return self._throttled_read(int(self.headers.get("Content-Length", 0)))
+
+    def _throttled_read(self, size: int) -> bytes:
+        if not self.fake_server.bandwidth:
+            return self.rfile.read(size)
+
+        blocks = []
+        throttle = _Throttle(self.fake_server.bandwidth)
+        while size > 0:
+            block = self.rfile.read(min(size, THROTTLE_BLOCK_SIZE))
+            if not block:
+                break
+            blocks.append(block)
+            size -= len(block)
+            throttle.wait(len(block))
+
+        return b"".join(blocks)
+
+    def _throttled_write(self, data: bytes):
+        if not self.fake_server.bandwidth:
+            self.wfile.write(data)
+            return
+
+        throttle = _Throttle(self.fake_server.bandwidth)
+        view = memoryview(data)
+        for offset in range(0, len(data), THROTTLE_BLOCK_SIZE):
+            block = view[offset : offset + THROTTLE_BLOCK_SIZE]
+            self.wfile.write(block)
+            throttle.wait(len(block))
+
+    def _send_json(
+        self,
+        response: Dict[str, Any],
+        status: int = 200,
+        headers: Optional[Dict[str, str]] = None,
+    ):
+        data = dumps(response).encode("utf-8")
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self._throttled_write(data)
+
+    def _send_file(self, path: str, head_only: bool):
+        file_id = unquote(path.split("/")[2])
+
+        with self.fake_server._lock:
+            data = self.fake_server._files_data.get(file_id)
+
+        if data is None:
+            self._send_json({"status": "error-notFound", "data": {}}, 404)
+            return
+
+        status = 200
+        start, end = 0, len(data)
+
+        range_header = self.headers.get("Range")
+        if range_header is not None and range_header.startswith("bytes="):
+            range_start, range_end = range_header[len("bytes=") :].split("-", 1)
+            start = int(range_start) if range_start else max(len(data) - int(range_end), 0)
+            end = int(range_end) + 1 if range_start and range_end else len(data)
+            end = min(end, len(data))
+            if start >= end:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(data)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            status = 206
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start))
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end - 1}/{len(data)}")
+        self.end_headers()
+
+        if not head_only:
+            self._throttled_write(data[start:end])
+
+
+class _Throttle:
+    def __init__(self, bandwidth: float):
+        self.bandwidth = bandwidth
+
+        self._start_time = monotonic()
+        self._transferred = 0
+
+    def wait(self, size: int):
+        self._transferred += size
+        delay = self._start_time + self._transferred / self.bandwidth - monotonic()
+        if delay > 0:
+            sleep(delay)
+
+
+def _parse_args(query: str) -> Dict[str, str]:
+    return {name: values[-1] for name, values in parse_qs(query, keep_blank_values=True).items()}
+
+
+def _parse_multipart(content_type: str, body: bytes) -> Dict[str, Tuple[Optional[str], bytes]]:
+    """Parse a multipart/form-data body, returning field name -> (filename, data)."""
+    boundary = None
+    for param in content_type.split(";")[1:]:
+        name, _, value = param.strip().partition("=")
+        if name == "boundary":
+            boundary = value.strip('"')
+
+    if boundary is None:
+        raise _APIError("error-invalidBody")
+
+    fields: Dict[str, Tuple[Optional[str], bytes]] = {}
+    for part in body.split(f"--{boundary}".encode("latin-1"))[1:]:
+        if part.startswith(b"--"):
+            break
+
+        headers, _, data = part.partition(b"\r\n\r\n")
+        # Drop the CRLF before the next boundary
+        data = data[:-2] if data.endswith(b"\r\n") else data
+
+        field_name = None
+        filename = None
+        for header in headers.decode("utf-8").split("\r\n"):
+            if not header.lower().startswith("content-disposition:"):
+                continue
+
+            for param in header.split(";")[1:]:
+                name, _, value = param.strip().partition("=")
+                if name == "name":
+                    field_name = value.strip('"')
+                elif name == "filename":
+                    filename = value.strip('"')
+
+        if field_name is not None:
+            fields[field_name] = (filename, data)
+
+    return fields
@@ -0,0 +1,110 @@
+#
+# SPDX-FileCopyrightText: Sebastiano Barezzi
+# SPDX-License-Identifier: Apache-2.0
+#
+"""
+sebaubuntu_libs import time benchmark, based on python -X importtime.
+
+Every module is imported in a fresh interpreter, the best of a few runs is
+reported. The run fails if a module pulls in one of the heavy dependencies
+that must only be loaded on first use, or if it takes longer than --budget-ms.
+
+Usage, from the repository root:
+    python -m benchmarks.import_time [--runs 5] [--budget-ms 50] [module ...]
+"""
+
+from argparse import ArgumentParser
+import subprocess
+import sys
+from typing import List, Optional, Tuple
+
+MODULES = [
+    "sebaubuntu_libs.libaik",
+    "sebaubuntu_libs.libandroid.elf.elf",
+    "sebaubuntu_libs.libandroid.partitions",
+    "sebaubuntu_libs.libandroid.partitions.partitions",
+    "sebaubuntu_libs.libandroid.props",
+    "sebaubuntu_libs.libandroid.vintf.manifest",
+    "sebaubuntu_libs.libcas",
+    "sebaubuntu_libs.libcompat.distutils.dir_util",
+    "sebaubuntu_libs.libgofile",
+    "sebaubuntu_libs.libgofile.session",
+    "sebaubuntu_libs.libgofile.utils",
+    "sebaubuntu_libs.liblogging",
+    "sebaubuntu_libs.libnekobin",
+    "sebaubuntu_libs.libsed",
+]
+
+# Must not be imported by the modules above, only when actually used
+DEFERRED_MODULES = [
+    "asyncio",
+    "elftools",
+    "git",
+    "requests",
+    "urllib3",
+    "xml.etree.ElementTree",
+]
+
+IMPORT_CODE = (
+    "import sys; import {module}; "
+    "print(','.join(module for module in {deferred_modules!r} if module in sys.modules))"
+)
+
+
+def measure(module: str) -> Tuple[int, List[str]]:
+    """Return the cumulative import time in us and the deferred modules that got loaded."""
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            IMPORT_CODE.format(module=module, deferred_modules=DEFERRED_MODULES),
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    cumulative_us: Optional[int] = None
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            cumulative_us = int(fields[1])
+
+    assert cumulative_us is not None, f"No import time for {module}"
+
+    loaded = [name for name in result.stdout.strip().split(",") if name]
+
+    return cumulative_us, loaded
+
+
+def main():
+    parser = ArgumentParser(description="sebaubuntu_libs import time benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=None)
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    args = parser.parse_args()
+
+    failed = False
+
+    for module in args.modules:
+        results = [measure(module) for _ in range(args.runs)]
+        best_us = min(cumulative_us for cumulative_us, _ in results)
+        loaded = results[0][1]
+
+        errors = []
+        if loaded:
+            errors.append(f"loads {', '.join(loaded)}")
+        if args.budget_ms is not None and best_us / 1000 > args.budget_ms:
+            errors.append(f"over {args.budget_ms} ms")
+
+        print(f"{module:<52} {best_us / 1000:8.1f} ms {'; '.join(errors)}")
+        failed = failed or bool(errors)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#
+# SPDX-FileCopyrightText: Sebastiano Barezzi
+# SPDX-License-Identifier: Apache-2.0
+#
+"""
+libgofile content models benchmark: time and memory to parse a large folder listing.
+
+Usage, from the repository root:
+    python -m benchmarks.libgofile_contents [--entries 50000]
+"""
+
+from argparse import ArgumentParser
+from sebaubuntu_libs.libgofile.contents import ContentResponse
+from time import perf_counter
+from tracemalloc import get_traced_memory, reset_peak, start, stop
+from typing import Any, Callable, Dict
+
+
+def make_listing(entries: int) -> Dict[str, Any]:
+    contents = {}
+    for i in range(entries):
+        content_id = f"{i:08x}-0000-0000-0000-000000000000"
+        if i % 10 == 0:
+            contents[content_id] = {
+                "id": content_id,
+                "type": "folder",
+                "name": f"folder{i}",
+                "parentFolder": "root",
+                "createTime": 1700000000 + i,
+                "childs": [],
+                "code": f"{i:06x}",
+                "public": True,
+            }
+        else:
+            contents[content_id] = {
+                "id": content_id,
+                "type": "file",
+                "name": f"file{i}.bin",
+                "parentFolder": "root",
+                "createTime": 1700000000 + i,
+                "size": i,
+                "downloadCount": 0,
+                "md5": f"{i:032x}",
+                "mimetype": "application/octet-stream",
+                "serverChoosen": "store1",
+                "directLink": f"https://store1.gofile.io/download/{content_id}/file{i}.bin",
+                "link": f"https://store1.gofile.io/download/{content_id}/file{i}.bin",
+            }
+
+    return {
+        "id": "root",
+        "type": "folder",
+        "name": "root",
+        "createTime": 1700000000,
+        "childs": list(contents),
+        "code": "root",
+        "public": True,
+        "isRoot": True,
+        "totalDownloadCount": 0,
+        "totalSize": 0,
+        "contents": contents,
+    }
+
+
+def measure(name: str, func: Callable[[], Any]):
+    reset_peak()
+    before, _ = get_traced_memory()
+    start_time = perf_counter()
+
+    result = func()
+
+    elapsed = perf_counter() - start_time
+    current, peak = get_traced_memory()
+    print(
+        f"{name:<24} {elapsed * 1000:8.1f} ms"
+        f" {(current - before) / 1e6:8.2f} MB retained {(peak - before) / 1e6:8.2f} MB peak"
+    )
+
+    return result
+
+
+def main():
+    parser = ArgumentParser(description="libgofile content models benchmark")
+    parser.add_argument("--entries", type=int, default=50000)
+    args = parser.parse_args()
+
+    data = make_listing(args.entries)
+
+    start()
+    response = measure("ContentResponse", lambda: ContentResponse.from_dict(data))
+    contents = measure("get_contents()", response.get_contents)
+    listing = measure("get_listing()", response.get_listing)
+    stop()
+
+    assert len(contents) == len(listing) == args.entries
+
+
+if __name__ == "__main__":
+    main()
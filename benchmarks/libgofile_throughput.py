@@ -0,0 +1,164 @@
+#
+# SPDX-FileCopyrightText: Sebastiano Barezzi
+# SPDX-License-Identifier: Apache-2.0
+#
+"""
+libgofile throughput benchmark, against a local FakeGoFileServer.
+
+Usage, from the repository root:
+    python -m benchmarks.libgofile_throughput [--latency 0.01] [--bandwidth 100e6] ...
+"""
+
+from argparse import ArgumentParser
+from benchmarks.fake_server import FakeGoFileServer
+from io import BytesIO
+import os
+from pathlib import Path
+from sebaubuntu_libs.libgofile.bulk import BulkOperations, BulkResult
+from sebaubuntu_libs.libgofile.downloader import Downloader
+from sebaubuntu_libs.libgofile.raw_api.rest import GoFileRequests
+from sebaubuntu_libs.libgofile.scheduler import RequestScheduler
+from sebaubuntu_libs.libgofile.uploader import Uploader
+from sebaubuntu_libs.libgofile.utils import create_folder
+from sebaubuntu_libs.libgofile.walker import walk
+import sys
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Callable, List, Tuple
+
+
+def populate_tree(server: FakeGoFileServer, parent_folder_id: str, depth: int, breadth: int) -> int:
+    """Create a tree of folders with breadth subfolders and files each, return the folder count."""
+    count = 1
+
+    for i in range(breadth):
+        server.add_file(parent_folder_id, f"file{i}", b"")
+
+    if depth > 0:
+        for i in range(breadth):
+            folder = server.create_folder(parent_folder_id, f"folder{i}")
+            count += populate_tree(server, folder["id"], depth - 1, breadth)
+
+    return count
+
+
+def check_bulk_result(operation: str, result: BulkResult, total: int):
+    # Don't report the throughput of operations that didn't happen
+    if result.failed or result.error is not None:
+        error = result.error or next(iter(result.failed.values()))
+        sys.exit(f"{len(result.failed)}/{total} {operation} failed: {error}")
+
+
+def measure(name: str, func: Callable[[], Tuple[float, str]]):
+    start = perf_counter()
+    amount, unit = func()
+    elapsed = perf_counter() - start
+
+    print(f"{name:<10} {elapsed:8.3f} s {amount / elapsed:12.1f} {unit}/s")
+
+
+def main():
+    parser = ArgumentParser(description="libgofile throughput benchmark")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per request")
+    parser.add_argument("--bandwidth", type=float, default=None, help="bytes/s per connection")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="failed requests ratio")
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=None,
+        help="API requests/s accepted by the server, paced with a RequestScheduler",
+    )
+    parser.add_argument("--files", type=int, default=64, help="files to upload")
+    parser.add_argument("--file-size", type=int, default=1024 * 1024, help="bytes per file")
+    parser.add_argument("--download-size", type=int, default=64 * 1024 * 1024)
+    parser.add_argument("--tree-depth", type=int, default=3)
+    parser.add_argument("--tree-breadth", type=int, default=6)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    server = FakeGoFileServer(
+        latency=args.latency,
+        bandwidth=args.bandwidth,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        seed=0,
+    )
+
+    scheduler = None
+    if args.rate_limit:
+        scheduler = RequestScheduler(max_workers=args.workers, endpoint_rate=args.rate_limit)
+        GoFileRequests.set_scheduler(scheduler)
+
+    with server, server.patch_raw_api(), TemporaryDirectory() as temp_dir:
+        token = server.token
+        uploaded_ids: List[str] = []
+
+        def upload():
+            folder = create_folder(server.root_folder, "upload", token)
+            uploader = Uploader(token=token, max_workers=args.workers, retry_backoff=0.01)
+            files = [BytesIO(os.urandom(args.file_size)) for _ in range(args.files)]
+
+            results = uploader.upload_files(files, folder_id=folder.content_id)
+
+            # Don't report the throughput of uploads that didn't happen
+            failed = [result for result in results if not result.succeeded]
+            if failed:
+                sys.exit(f"{len(failed)}/{len(results)} uploads failed: {failed[0].error}")
+
+            uploaded_ids.extend(result.data["fileId"] for result in results if result.data)
+
+            return args.files * args.file_size / 1e6, "MB"
+
+        def download():
+            data = os.urandom(args.download_size)
+            file = server.add_file(server.root_folder, "download.bin", data)
+            downloader = Downloader(token=token, max_workers=args.workers)
+
+            downloader.download_file(
+                file["directLink"],
+                Path(temp_dir) / "download.bin",
+                size=len(data),
+                md5_hexdigest=file["md5"],
+            )
+
+            return len(data) / 1e6, "MB"
+
+        tree_root = server.create_folder(server.root_folder, "tree")["id"]
+        folders_count = populate_tree(server, tree_root, args.tree_depth, args.tree_breadth)
+
+        def walk_tree():
+            for _ in walk(tree_root, token, max_workers=args.workers):
+                pass
+
+            return folders_count, "folders"
+
+        def bulk():
+            destination = create_folder(server.root_folder, "copy", token)
+            bulk_operations = BulkOperations(token, max_workers=args.workers)
+
+            result = bulk_operations.copy(uploaded_ids, destination.content_id)
+            check_bulk_result("copies", result, len(uploaded_ids))
+
+            result = bulk_operations.delete(uploaded_ids)
+            check_bulk_result("deletions", result, len(uploaded_ids))
+
+            return 2 * len(uploaded_ids), "contents"
+
+        print(
+            f"latency {args.latency} s, bandwidth {args.bandwidth or 'unlimited'} B/s, "
+            f"error rate {args.error_rate}, {args.workers} workers"
+        )
+        measure("upload", upload)
+        measure("download", download)
+        measure("walk", walk_tree)
+        measure("bulk", bulk)
+        print(f"{server.requests_count} requests, {server.errors_count} injected errors")
+
+    if scheduler is not None:
+        GoFileRequests.set_scheduler(None)
+        scheduler.shutdown()
+        print(f"{server.throttled_count} throttled, scheduler: {scheduler.metrics.snapshot()}")
+
+
+if __name__ == "__main__":
+    main()
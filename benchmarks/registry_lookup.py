@@ -0,0 +1,149 @@
+#
+# SPDX-FileCopyrightText: Sebastiano Barezzi
+# SPDX-License-Identifier: Apache-2.0
+#
+"""
+sebaubuntu_libs registry lookup benchmark.
+
+Every indexed lookup (PartitionModels, DeviceArch and AndroidVersion) is first
+checked against a linear scan of the registered objects, for every known key
+and for a missing one, then both are timed with the first and the last
+registered key. Indexed lookups take the same time for both, scans don't.
+The run fails if any result differs.
+
+Usage, from the repository root:
+    python -m benchmarks.registry_lookup [--number 100000]
+"""
+
+from argparse import ArgumentParser
+from sebaubuntu_libs.libandroid.device_info import DeviceArch
+from sebaubuntu_libs.libandroid.partitions.partition_model import PartitionModel, PartitionModels
+from sebaubuntu_libs.libandroid.versions import AndroidVersion, _AndroidVersion
+import sys
+from timeit import timeit
+from typing import Any, Callable, List, Optional, Sequence
+
+ANDROID_VERSIONS = [
+    value for value in vars(AndroidVersion).values() if isinstance(value, _AndroidVersion)
+]
+
+
+def scan_first(objs: Sequence[Any], match: Callable[[Any], bool]) -> Optional[Any]:
+    for obj in objs:
+        if match(obj):
+            return obj
+
+    return None
+
+
+def none_on_value_error(func: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    """Return None instead of raising ValueError, like the other lookups."""
+
+    def wrapper(key: Any):
+        try:
+            return func(key)
+        except ValueError:
+            return None
+
+    return wrapper
+
+
+# Name, indexed lookup, linear scan, keys in registration order, missing key
+LOOKUPS: List[Any] = [
+    (
+        "PartitionModels.from_name",
+        PartitionModels.from_name,
+        lambda key: scan_first(PartitionModel.ALL, lambda model: model.name == key),
+        [model.name for model in PartitionModel.ALL],
+        "unknown",
+    ),
+    (
+        "PartitionModels.from_mount_point",
+        PartitionModels.from_mount_point,
+        lambda key: scan_first(PartitionModel.ALL, lambda model: key in model.mount_points),
+        [mount_point for model in PartitionModel.ALL for mount_point in model.mount_points],
+        "/unknown",
+    ),
+    (
+        "PartitionModels.from_group",
+        PartitionModels.from_group,
+        lambda key: [model for model in PartitionModel.ALL if model.group == key],
+        sorted({model.group for model in PartitionModel.ALL}),
+        -1,
+    ),
+    (
+        "DeviceArch.from_arch",
+        none_on_value_error(DeviceArch.from_arch),
+        lambda key: scan_first(list(DeviceArch), lambda arch: arch.arch == key),
+        [arch.arch for arch in DeviceArch],
+        "unknown",
+    ),
+    (
+        "DeviceArch.from_abi",
+        none_on_value_error(DeviceArch.from_abi),
+        lambda key: scan_first(list(DeviceArch), lambda arch: key in arch.cpu_abilist),
+        [abi for arch in DeviceArch for abi in arch.cpu_abilist],
+        "unknown",
+    ),
+    (
+        "AndroidVersion.from_version_code",
+        AndroidVersion.from_version_code,
+        lambda key: scan_first(ANDROID_VERSIONS, lambda version: version.version_code == key),
+        [version.version_code for version in ANDROID_VERSIONS],
+        "unknown",
+    ),
+    (
+        "AndroidVersion.from_version_name",
+        AndroidVersion.from_version_name,
+        lambda key: scan_first(ANDROID_VERSIONS, lambda version: version.version_name == key),
+        [version.version_name for version in ANDROID_VERSIONS],
+        "unknown",
+    ),
+    (
+        "AndroidVersion.from_api_version",
+        AndroidVersion.from_api_version,
+        lambda key: scan_first(ANDROID_VERSIONS, lambda version: version.api_version == key),
+        [version.api_version for version in ANDROID_VERSIONS],
+        -1,
+    ),
+    (
+        "AndroidVersion.from_version_short",
+        AndroidVersion.from_version_short,
+        lambda key: scan_first(ANDROID_VERSIONS, lambda version: version.version_short == key),
+        [version.version_short for version in ANDROID_VERSIONS],
+        "unknown",
+    ),
+]
+
+
+def main():
+    parser = ArgumentParser(description="sebaubuntu_libs registry lookup benchmark")
+    parser.add_argument("--number", type=int, default=100000)
+    args = parser.parse_args()
+
+    failed = False
+
+    columns = ["Index first", "Index last", "Scan first", "Scan last"]
+    print(f"{'Lookup':<36} {'Keys':>5} " + " ".join(f"{column:>11}" for column in columns))
+
+    for name, lookup, scan, keys, missing_key in LOOKUPS:
+        for key in keys + [missing_key]:
+            if lookup(key) != scan(key):
+                print(f"{name}({key!r}): {lookup(key)!r} != {scan(key)!r}")
+                failed = True
+
+        times_ns = [
+            timeit(lambda: func(key), number=args.number) / args.number * 1e9
+            for func in (lookup, scan)
+            for key in (keys[0], keys[-1])
+        ]
+
+        print(
+            f"{name:<36} {len(keys):>5} " + " ".join(f"{time_ns:>8.0f} ns" for time_ns in times_ns)
+        )
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,17 +4,25 @@
 #
 """AIK wrapper library."""
 
-from git import Repo
+from os import killpg
 from pathlib import Path
 from platform import system
-from sebaubuntu_libs.liblogging import LOGI
+from sebaubuntu_libs.liblogging import LOGD, LOGI
+from sebaubuntu_libs.liblogging.tracing import trace, traced
 from shutil import which
-from subprocess import check_output, STDOUT, CalledProcessError
+from signal import SIGKILL
+from subprocess import check_output, PIPE, STDOUT, CalledProcessError, TimeoutExpired
 from tempfile import TemporaryDirectory
-from typing import Optional
+from typing import TYPE_CHECKING, Callable, Optional
+
+if TYPE_CHECKING:
+    from asyncio.subprocess import Process
 
 AIK_REPO = "https://github.com/SebaUbuntu/AIK-Linux-mirror"
 
+# Max length of a single line of script output for async execution
+SCRIPT_OUTPUT_LINE_LIMIT = 1024 * 1024
+
 ALLOWED_OS = [
     "Linux",
     "Darwin",
@@ -43,12 +51,15 @@ class AIKImageInfo:
         ramdisk_offset: Optional[str],
         sigtype: Optional[str],
         tags_offset: Optional[str],
+        os_patch_level: Optional[str] = None,
+        ramdisk_image: Optional[Path] = None,
     ):
         self.kernel = kernel
         self.dt = dt
         self.dtb = dtb
         self.dtbo = dtbo
         self.ramdisk = ramdisk
+        self.ramdisk_image = ramdisk_image
         self.base_address = base_address
         self.board_name = board_name
         self.cmdline = cmdline
@@ -58,6 +69,7 @@ class AIKImageInfo:
         self.kernel_offset = kernel_offset
         self.origsize = origsize
         self.os_version = os_version
+        self.os_patch_level = os_patch_level
         self.pagesize = pagesize
         self.ramdisk_compression = ramdisk_compression
         self.ramdisk_offset = ramdisk_offset
@@ -75,6 +87,7 @@ class AIKImageInfo:
             f"kernel offset: {self.kernel_offset}\n"
             f"original size: {self.origsize}\n"
             f"os version: {self.os_version}\n"
+            f"os patch level: {self.os_patch_level}\n"
             f"page size: {self.pagesize}\n"
             f"ramdisk compression: {self.ramdisk_compression}\n"
             f"ramdisk offset: {self.ramdisk_offset}\n"
@@ -87,6 +100,10 @@ class AIKManager:
     """
     This class is responsible for dealing with AIK tasks
     such as cloning, updating, and extracting recovery images.
+
+    Every instance works on its own AIK copy, so operations of different
+    instances can run concurrently (e.g. with the *_async methods from a single
+    event loop), while operations on the same instance must not overlap.
     """
 
     UNPACKING_FAILED_STRING = "Unpacking failed, try without --nosudo."
@@ -106,9 +123,14 @@ class AIKManager:
         self.images_path = self.path / "split_img"
         self.ramdisk_path = self.path / "ramdisk"
 
+        # GitPython is slow to import, only load it once it's needed
+        from git import Repo
+
         LOGI("Cloning AIK...")
-        Repo.clone_from(AIK_REPO, self.path)
+        with trace("AIKManager.clone", "aik"):
+            Repo.clone_from(AIK_REPO, self.path)
 
+    @traced(category="aik")
     def unpackimg(self, image: Path, ignore_ramdisk_errors: bool = False):
         """Extract recovery image."""
         image_prefix = image.name
@@ -122,24 +144,67 @@ class AIKManager:
             returncode = 0
             output = process
 
-        if returncode != 0:
-            if self.UNPACKING_FAILED_STRING in output and ignore_ramdisk_errors:
-                # Delete ramdisk folder to avoid issues
-                try:
-                    self.ramdisk_path.rmdir()
-                except Exception:
-                    pass
-            else:
-                raise RuntimeError(f"AIK extraction failed, return code {returncode}")
+        self._handle_unpack_result(
+            returncode, self.UNPACKING_FAILED_STRING in output, ignore_ramdisk_errors
+        )
 
         return self._get_current_extracted_info(image_prefix)
 
+    @traced(category="aik")
     def repackimg(self):
         return self._execute_script("repack.sh")
 
+    @traced(category="aik")
     def cleanup(self):
         return self._execute_script("cleanup.sh")
 
+    @traced(category="aik")
+    async def unpackimg_async(
+        self,
+        image: Path,
+        ignore_ramdisk_errors: bool = False,
+        timeout: Optional[float] = None,
+    ):
+        """Extract recovery image without blocking the event loop."""
+        image_prefix = image.name
+        unpacking_failed = False
+
+        def check_line(line: str):
+            nonlocal unpacking_failed
+            if self.UNPACKING_FAILED_STRING in line:
+                unpacking_failed = True
+
+        returncode = await self._execute_script_async(
+            "unpackimg.sh", image, timeout=timeout, check=False, line_callback=check_line
+        )
+
+        self._handle_unpack_result(returncode, unpacking_failed, ignore_ramdisk_errors)
+
+        return self._get_current_extracted_info(image_prefix)
+
+    @traced(category="aik")
+    async def repackimg_async(self, timeout: Optional[float] = None):
+        await self._execute_script_async("repack.sh", timeout=timeout)
+
+    @traced(category="aik")
+    async def cleanup_async(self, timeout: Optional[float] = None):
+        await self._execute_script_async("cleanup.sh", timeout=timeout)
+
+    def _handle_unpack_result(
+        self, returncode: int, unpacking_failed: bool, ignore_ramdisk_errors: bool
+    ):
+        if returncode == 0:
+            return
+
+        if unpacking_failed and ignore_ramdisk_errors:
+            # Delete ramdisk folder to avoid issues
+            try:
+                self.ramdisk_path.rmdir()
+            except Exception:
+                pass
+        else:
+            raise RuntimeError(f"AIK extraction failed, return code {returncode}")
+
     def _get_current_extracted_info(self, prefix: str):
         return AIKImageInfo(
             base_address=self._read_recovery_file(prefix, "base"),
@@ -157,6 +222,7 @@ class AIKManager:
             kernel_offset=self._read_recovery_file(prefix, "kernel_offset"),
             origsize=self._read_recovery_file(prefix, "origsize"),
             os_version=self._read_recovery_file(prefix, "os_version"),
+            os_patch_level=self._read_recovery_file(prefix, "os_patch_level"),
             pagesize=self._read_recovery_file(prefix, "pagesize"),
             ramdisk=self.ramdisk_path if self.ramdisk_path.is_dir() else None,
             ramdisk_compression=self._read_recovery_file(prefix, "ramdiskcomp")
@@ -164,6 +230,7 @@ class AIKManager:
             ramdisk_offset=self._read_recovery_file(prefix, "ramdisk_offset"),
             sigtype=self._read_recovery_file(prefix, "sigtype"),
             tags_offset=self._read_recovery_file(prefix, "tags_offset"),
+            ramdisk_image=self._get_extracted_ramdisk_image(prefix),
         )
 
     def _read_recovery_file(
@@ -191,6 +258,84 @@ class AIKManager:
 
         return path
 
+    def _get_extracted_ramdisk_image(self, prefix: str) -> Optional[Path]:
+        # AIK keeps the packed ramdisk with its compression as extension
+        for fragment in ["ramdisk.cpio", "vendor_ramdisk.cpio"]:
+            for path in sorted(self.images_path.glob(f"{prefix}-{fragment}*")):
+                if path.is_file() and path.stat().st_size > 0:
+                    return path
+
+        return None
+
     def _execute_script(self, script: str, *args):
         command = [self.path / script, "--nosudo", *args]
         return check_output(command, stderr=STDOUT, universal_newlines=True, encoding="utf-8")
+
+    async def _execute_script_async(
+        self,
+        script: str,
+        *args,
+        timeout: Optional[float] = None,
+        check: bool = True,
+        line_callback: Optional[Callable[[str], None]] = None,
+    ) -> int:
+        """
+        Execute an AIK script, logging its output line by line as it comes.
+
+        The script runs in its own process group, if it doesn't complete
+        within the timeout the whole group gets killed and TimeoutExpired is raised.
+        """
+        # Already loaded by the running event loop, asyncio is slow to import for sync users
+        import asyncio
+
+        command = [str(self.path / script), "--nosudo", *[str(arg) for arg in args]]
+
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdout=PIPE,
+            stderr=STDOUT,
+            start_new_session=True,
+            limit=SCRIPT_OUTPUT_LINE_LIMIT,
+        )
+
+        try:
+            returncode = await asyncio.wait_for(
+                self._stream_script_output(process, script, line_callback), timeout
+            )
+        except asyncio.TimeoutError:
+            await self._kill_script(process)
+            raise TimeoutExpired(command, timeout or 0)
+        except BaseException:
+            # Don't leave orphans behind on cancellation
+            await self._kill_script(process)
+            raise
+
+        if check and returncode != 0:
+            raise CalledProcessError(returncode, command)
+
+        return returncode
+
+    @staticmethod
+    async def _stream_script_output(
+        process: "Process",
+        script: str,
+        line_callback: Optional[Callable[[str], None]],
+    ) -> int:
+        assert process.stdout is not None
+
+        async for raw_line in process.stdout:
+            line = raw_line.decode("utf-8", errors="replace").rstrip("\n")
+            LOGD("%s: %s", script, line)
+            if line_callback is not None:
+                line_callback(line)
+
+        return await process.wait()
+
+    @staticmethod
+    async def _kill_script(process: "Process"):
+        try:
+            killpg(process.pid, SIGKILL)
+        except ProcessLookupError:
+            pass
+
+        await process.wait()
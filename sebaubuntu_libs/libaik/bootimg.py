@@ -0,0 +1,366 @@
+#
+# SPDX-FileCopyrightText: Sebastiano Barezzi
+# SPDX-License-Identifier: Apache-2.0
+#
+"""In-process Android boot image builder.
+
+Layouts and header formats follow AOSP's system/tools/mkbootimg/include/bootimg/bootimg.h.
+"""
+
+from hashlib import sha1
+from pathlib import Path
+from struct import Struct
+from typing import BinaryIO, List, Optional, Tuple
+
+from sebaubuntu_libs.libaik import AIKImageInfo
+
+BOOT_MAGIC = b"ANDROID!"
+VENDOR_BOOT_MAGIC = b"VNDRBOOT"
+
+# Header v3+ boot images use a fixed page size
+BOOT_IMAGE_HEADER_V3_PAGESIZE = 4096
+
+# mkbootimg defaults
+DEFAULT_BASE = 0x10000000
+DEFAULT_KERNEL_OFFSET = 0x00008000
+DEFAULT_RAMDISK_OFFSET = 0x01000000
+DEFAULT_SECOND_OFFSET = 0x00F00000
+DEFAULT_TAGS_OFFSET = 0x00000100
+DEFAULT_DTB_OFFSET = 0x01F00000
+DEFAULT_PAGESIZE = 2048
+
+BOOT_NAME_SIZE = 16
+BOOT_ARGS_SIZE = 512
+BOOT_EXTRA_ARGS_SIZE = 1024
+BOOT_ID_SIZE = 32
+BOOT_V3_ARGS_SIZE = BOOT_ARGS_SIZE + BOOT_EXTRA_ARGS_SIZE
+VENDOR_BOOT_ARGS_SIZE = 2048
+VENDOR_RAMDISK_NAME_SIZE = 32
+VENDOR_RAMDISK_TABLE_ENTRY_BOARD_ID_SIZE = 16
+
+VENDOR_RAMDISK_TYPE_PLATFORM = 1
+
+# boot_img_hdr_v0, followed by the fields added by v1 and v2
+BOOT_IMAGE_HEADER_V0 = Struct(
+    f"<8s10I{BOOT_NAME_SIZE}s{BOOT_ARGS_SIZE}s{BOOT_ID_SIZE}s{BOOT_EXTRA_ARGS_SIZE}s"
+)
+BOOT_IMAGE_HEADER_V1 = Struct("<IQI")
+BOOT_IMAGE_HEADER_V2 = Struct("<IQ")
+# Offset of the id field inside the v0-v2 header
+BOOT_IMAGE_HEADER_ID_OFFSET = 8 + 10 * 4 + BOOT_NAME_SIZE + BOOT_ARGS_SIZE
+
+BOOT_IMAGE_HEADER_V3 = Struct(f"<8s4I4II{BOOT_V3_ARGS_SIZE}s")
+BOOT_IMAGE_HEADER_V4 = Struct("<I")
+
+VENDOR_BOOT_IMAGE_HEADER_V3 = Struct(f"<8s5I{VENDOR_BOOT_ARGS_SIZE}sI{BOOT_NAME_SIZE}sIIQ")
+VENDOR_BOOT_IMAGE_HEADER_V4 = Struct("<4I")
+VENDOR_RAMDISK_TABLE_ENTRY_V4 = Struct(
+    f"<3I{VENDOR_RAMDISK_NAME_SIZE}s{VENDOR_RAMDISK_TABLE_ENTRY_BOARD_ID_SIZE}I"
+)
+
+BOOT_IMAGE_HEADER_SIZES = {
+    0: BOOT_IMAGE_HEADER_V0.size,
+    1: BOOT_IMAGE_HEADER_V0.size + BOOT_IMAGE_HEADER_V1.size,
+    2: BOOT_IMAGE_HEADER_V0.size + BOOT_IMAGE_HEADER_V1.size + BOOT_IMAGE_HEADER_V2.size,
+    3: BOOT_IMAGE_HEADER_V3.size,
+    4: BOOT_IMAGE_HEADER_V3.size + BOOT_IMAGE_HEADER_V4.size,
+}
+
+VENDOR_BOOT_IMAGE_HEADER_SIZES = {
+    3: VENDOR_BOOT_IMAGE_HEADER_V3.size,
+    4: VENDOR_BOOT_IMAGE_HEADER_V3.size + VENDOR_BOOT_IMAGE_HEADER_V4.size,
+}
+
+AIK_VENDOR_IMAGE_TYPE = "AOSP_VENDOR"
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# (path, size) of an image component, path is None for missing components
+Component = Tuple[Optional[Path], int]
+
+
+def parse_address(value: Optional[str], default: int) -> int:
+    """Parse an hexadecimal value as written by AIK (with or without 0x prefix)."""
+    if not value:
+        return default
+
+    return int(value, 16)
+
+
+def parse_os_version(os_version: Optional[str], os_patch_level: Optional[str]) -> int:
+    """Encode OS version (e.g. 11.0.0) and patch level (e.g. 2021-05) like mkbootimg."""
+    version = 0
+    if os_version:
+        parts = [int(part) for part in os_version.split(".")][:3]
+        parts += [0] * (3 - len(parts))
+        a, b, c = parts
+        version = (a << 14) | (b << 7) | c
+
+    patch_level = 0
+    if os_patch_level:
+        year, month = [int(part) for part in os_patch_level.split("-")][:2]
+        patch_level = ((year - 2000) << 4) | month
+
+    return (version << 11) | patch_level
+
+
+def build_boot_image(
+    info: AIKImageInfo,
+    output: Path,
+    kernel: Optional[Path] = None,
+    ramdisk: Optional[Path] = None,
+    dtb: Optional[Path] = None,
+    dtbo: Optional[Path] = None,
+    cmdline: Optional[str] = None,
+):
+    """
+    Build a boot or vendor_boot image from an AIK image info, without calling repack.sh.
+
+    Every component can be replaced, missing ones are taken from the info.
+    The ramdisk must be an already packed (and compressed) cpio archive,
+    by default the one AIK left in split_img is used, the unpacked ramdisk
+    folder is ignored.
+
+    The output is written sequentially, components are streamed from disk
+    and hashed (for header v0-v2) in the same pass.
+    """
+    header_version = int(info.header_version or "0")
+
+    kernel = kernel or info.kernel
+    ramdisk = ramdisk or info.ramdisk_image
+    dtb = dtb or info.dtb
+    dtbo = dtbo or info.dtbo
+    if cmdline is None:
+        cmdline = info.cmdline or ""
+
+    if info.image_type == AIK_VENDOR_IMAGE_TYPE:
+        if header_version not in VENDOR_BOOT_IMAGE_HEADER_SIZES:
+            raise ValueError(f"Unsupported vendor_boot header version {header_version}")
+
+        with output.open("wb") as f:
+            _write_vendor_boot_image(f, info, header_version, ramdisk, dtb, cmdline)
+    else:
+        if header_version not in BOOT_IMAGE_HEADER_SIZES:
+            raise ValueError(f"Unsupported boot header version {header_version}")
+
+        with output.open("wb") as f:
+            if header_version < 3:
+                _write_boot_image_v0(f, info, header_version, kernel, ramdisk, dtb, dtbo, cmdline)
+            else:
+                _write_boot_image_v3(f, info, header_version, kernel, ramdisk, cmdline)
+
+
+def _write_boot_image_v0(
+    f: BinaryIO,
+    info: AIKImageInfo,
+    header_version: int,
+    kernel: Optional[Path],
+    ramdisk: Optional[Path],
+    dtb: Optional[Path],
+    dtbo: Optional[Path],
+    cmdline: str,
+):
+    page_size = int(info.pagesize or DEFAULT_PAGESIZE)
+    base = parse_address(info.base_address, DEFAULT_BASE)
+
+    kernel_component = _get_component(kernel)
+    ramdisk_component = _get_component(ramdisk)
+    second_component = _get_component(None)
+    dtbo_component = _get_component(dtbo if header_version >= 1 else None)
+    dtb_component = _get_component(dtb if header_version >= 2 else None)
+
+    # Legacy QCOM images store the DT size in place of the header version
+    dt_component = _get_component(info.dt if header_version == 0 else None)
+
+    # Components in image order, all of them are part of the id
+    components = [kernel_component, ramdisk_component, second_component]
+    if header_version >= 1:
+        components.append(dtbo_component)
+    if header_version >= 2:
+        components.append(dtb_component)
+    if dt_component[0] is not None:
+        components.append(dt_component)
+
+    # Like mkbootimg, both fields keep their NUL terminator
+    encoded_cmdline = _encode_string(cmdline, BOOT_ARGS_SIZE - 1 + BOOT_EXTRA_ARGS_SIZE, "cmdline")
+
+    header = BOOT_IMAGE_HEADER_V0.pack(
+        BOOT_MAGIC,
+        kernel_component[1],
+        base + parse_address(info.kernel_offset, DEFAULT_KERNEL_OFFSET),
+        ramdisk_component[1],
+        base + parse_address(info.ramdisk_offset, DEFAULT_RAMDISK_OFFSET),
+        second_component[1],
+        base + DEFAULT_SECOND_OFFSET,
+        base + parse_address(info.tags_offset, DEFAULT_TAGS_OFFSET),
+        page_size,
+        dt_component[1] if dt_component[0] is not None else header_version,
+        parse_os_version(info.os_version, info.os_patch_level),
+        _encode_string(info.board_name or "", BOOT_NAME_SIZE, "board name"),
+        encoded_cmdline[: BOOT_ARGS_SIZE - 1],
+        b"",  # id, filled once every component has been hashed
+        encoded_cmdline[BOOT_ARGS_SIZE - 1 :],
+    )
+
+    if header_version >= 1:
+        # The recovery DTBO comes after kernel, ramdisk and second stage
+        recovery_dtbo_offset = page_size * (
+            1 + sum(_get_pages_count(size, page_size) for _, size in components[:3])
+        )
+        header += BOOT_IMAGE_HEADER_V1.pack(
+            dtbo_component[1],
+            recovery_dtbo_offset if dtbo_component[1] else 0,
+            BOOT_IMAGE_HEADER_SIZES[header_version],
+        )
+    if header_version >= 2:
+        header += BOOT_IMAGE_HEADER_V2.pack(
+            dtb_component[1],
+            base + parse_address(info.dtb_offset, DEFAULT_DTB_OFFSET),
+        )
+
+    _write_padded(f, header, page_size)
+
+    image_id = sha1()
+    for component in components:
+        _write_component(f, component, page_size, image_id)
+
+    # Only the id needs to be patched, the rest of the header is already final
+    f.seek(BOOT_IMAGE_HEADER_ID_OFFSET)
+    f.write(image_id.digest().ljust(BOOT_ID_SIZE, b"\0"))
+
+
+def _write_boot_image_v3(
+    f: BinaryIO,
+    info: AIKImageInfo,
+    header_version: int,
+    kernel: Optional[Path],
+    ramdisk: Optional[Path],
+    cmdline: str,
+):
+    page_size = BOOT_IMAGE_HEADER_V3_PAGESIZE
+
+    kernel_component = _get_component(kernel)
+    ramdisk_component = _get_component(ramdisk)
+
+    header = BOOT_IMAGE_HEADER_V3.pack(
+        BOOT_MAGIC,
+        kernel_component[1],
+        ramdisk_component[1],
+        parse_os_version(info.os_version, info.os_patch_level),
+        BOOT_IMAGE_HEADER_SIZES[header_version],
+        0,
+        0,
+        0,
+        0,
+        header_version,
+        _encode_string(cmdline, BOOT_V3_ARGS_SIZE, "cmdline"),
+    )
+    if header_version >= 4:
+        # No boot signature
+        header += BOOT_IMAGE_HEADER_V4.pack(0)
+
+    _write_padded(f, header, page_size)
+    _write_component(f, kernel_component, page_size)
+    _write_component(f, ramdisk_component, page_size)
+
+
+def _write_vendor_boot_image(
+    f: BinaryIO,
+    info: AIKImageInfo,
+    header_version: int,
+    ramdisk: Optional[Path],
+    dtb: Optional[Path],
+    cmdline: str,
+):
+    page_size = int(info.pagesize or BOOT_IMAGE_HEADER_V3_PAGESIZE)
+    base = parse_address(info.base_address, DEFAULT_BASE)
+
+    ramdisk_component = _get_component(ramdisk)
+    dtb_component = _get_component(dtb)
+
+    header = VENDOR_BOOT_IMAGE_HEADER_V3.pack(
+        VENDOR_BOOT_MAGIC,
+        header_version,
+        page_size,
+        base + parse_address(info.kernel_offset, DEFAULT_KERNEL_OFFSET),
+        base + parse_address(info.ramdisk_offset, DEFAULT_RAMDISK_OFFSET),
+        ramdisk_component[1],
+        _encode_string(cmdline, VENDOR_BOOT_ARGS_SIZE, "cmdline"),
+        base + parse_address(info.tags_offset, DEFAULT_TAGS_OFFSET),
+        _encode_string(info.board_name or "", BOOT_NAME_SIZE, "board name"),
+        VENDOR_BOOT_IMAGE_HEADER_SIZES[header_version],
+        dtb_component[1],
+        base + parse_address(info.dtb_offset, DEFAULT_DTB_OFFSET),
+    )
+
+    ramdisk_table = b""
+    if header_version >= 4:
+        # A single platform ramdisk, covering the whole vendor ramdisk section
+        board_id: List[int] = [0] * VENDOR_RAMDISK_TABLE_ENTRY_BOARD_ID_SIZE
+        ramdisk_table = VENDOR_RAMDISK_TABLE_ENTRY_V4.pack(
+            ramdisk_component[1],
+            0,
+            VENDOR_RAMDISK_TYPE_PLATFORM,
+            b"",
+            *board_id,
+        )
+        header += VENDOR_BOOT_IMAGE_HEADER_V4.pack(
+            len(ramdisk_table),
+            1,
+            VENDOR_RAMDISK_TABLE_ENTRY_V4.size,
+            0,  # No bootconfig
+        )
+
+    _write_padded(f, header, page_size)
+    _write_component(f, ramdisk_component, page_size)
+    _write_component(f, dtb_component, page_size)
+    if ramdisk_table:
+        _write_padded(f, ramdisk_table, page_size)
+
+
+def _get_component(path: Optional[Path]) -> Component:
+    if path is None:
+        return (None, 0)
+
+    return (path, path.stat().st_size)
+
+
+def _get_pages_count(size: int, page_size: int) -> int:
+    return (size + page_size - 1) // page_size
+
+
+def _encode_string(string: str, size: int, name: str) -> bytes:
+    encoded = string.encode("utf-8")
+
+    # Leave room for the NUL terminator
+    if len(encoded) >= size:
+        raise ValueError(f"{name} too long ({len(encoded)} bytes, max {size - 1})")
+
+    return encoded
+
+
+def _write_padded(f: BinaryIO, data: bytes, page_size: int):
+    f.write(data)
+    f.write(b"\0" * (-len(data) % page_size))
+
+
+def _write_component(f: BinaryIO, component: Component, page_size: int, image_id=None):
+    path, size = component
+
+    written = 0
+    if path is not None:
+        with path.open("rb") as component_file:
+            while written < size:
+                buffer = component_file.read(min(COPY_BUFFER_SIZE, size - written))
+                if not buffer:
+                    raise RuntimeError(f"{path} shrunk while building the image")
+
+                f.write(buffer)
+                if image_id is not None:
+                    image_id.update(buffer)
+                written += len(buffer)
+
+    if image_id is not None:
+        image_id.update(size.to_bytes(4, "little"))
+
+    f.write(b"\0" * (-written % page_size))
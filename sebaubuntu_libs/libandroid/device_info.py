@@ -4,59 +4,82 @@
 #
 
 from enum import Enum
-from typing import Callable, List, TypeVar, Union
+from functools import lru_cache
+from typing import Callable, Dict, List, Sequence, Tuple, TypeVar, Union
 
 from sebaubuntu_libs.libandroid.props import BuildProp
 from sebaubuntu_libs.libandroid.props.utils import fingerprint_to_description, get_partition_props
 from sebaubuntu_libs.libcompat.distutils.util import strtobool
+from sebaubuntu_libs.libregistry import Registry
 
 
 T = TypeVar("T")
 D = TypeVar("D")
 
+# Candidate props of each prop table, most important first: either a tuple of
+# props or a format string for get_partition_props(add_empty=True).
+# The tables are available as module attributes (e.g. DEVICE_CODENAME),
+# they're built on first use.
+_PROP_TABLES: Dict[str, Union[str, Tuple[str, ...]]] = {
+    "DEVICE_CODENAME": "ro.product.{}device",
+    "DEVICE_MANUFACTURER": "ro.product.{}manufacturer",
+    "DEVICE_BRAND": "ro.product.{}brand",
+    "DEVICE_MODEL": "ro.product.{}model",
+    "DEVICE_ARCH": ("ro.bionic.arch",),
+    "DEVICE_CPU_ABILIST": "ro.{}product.cpu.abilist",
+    "DEVICE_CPU_VARIANT": ("ro.bionic.cpu_variant",),
+    "DEVICE_SECOND_ARCH": ("ro.bionic.2nd_arch",),
+    "DEVICE_SECOND_CPU_VARIANT": ("ro.bionic.2nd_cpu_variant",),
+    "DEVICE_IS_AB": ("ro.build.ab_update",),
+    "DEVICE_USES_DYNAMIC_PARTITIONS": ("ro.boot.dynamic_partitions",),
+    "DEVICE_USES_VIRTUAL_AB": ("ro.virtual_ab.enabled",),
+    "DEVICE_USES_SYSTEM_AS_ROOT": ("ro.build.system_root_image",),
+    "BOOTLOADER_BOARD_NAME": ("ro.product.board",),
+    "DEVICE_PLATFORM": ("ro.board.platform",),
+    "DEVICE_PIXEL_FORMAT": ("ro.minui.pixel_format",),
+    "SCREEN_DENSITY": ("ro.sf.lcd_density",),
+    "USE_VULKAN": ("ro.hwui.use_vulkan",),
+    "BUILD_FINGERPRINT": "ro.{}build.fingerprint",
+    "BUILD_DESCRIPTION": "ro.{}build.description",
+    "GMS_CLIENTID_BASE": ("ro.com.google.clientidbase",),
+    "BUILD_SECURITY_PATCH": ("ro.build.version.security_patch",),
+    "BUILD_VENDOR_SECURITY_PATCH": ("ro.vendor.build.security_patch",),
+    "FIRST_API_LEVEL": ("ro.product.first_api_level",),
+    "PRODUCT_CHARACTERISTICS": ("ro.build.characteristics",),
+    "APEX_UPDATABLE": ("ro.apex.updatable",),
+    "BOARD_FIRST_API_LEVEL": ("ro.board.first_api_level",),
+    "BOARD_API_LEVEL": ("ro.board.api_level",),
+    "ENABLE_UFFD_GC": ("ro.dalvik.vm.enable_uffd_gc",),
+}
+
+
+def __getattr__(name: str):
+    if name in _PROP_TABLES:
+        return get_prop_table(name)
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 def get_product_props(value: str):
     return get_partition_props("ro.product.{}" + value, add_empty=True)
 
 
-DEVICE_CODENAME = get_product_props("device")
-DEVICE_MANUFACTURER = get_product_props("manufacturer")
-DEVICE_BRAND = get_product_props("brand")
-DEVICE_MODEL = get_product_props("model")
-
-DEVICE_ARCH = ["ro.bionic.arch"]
-DEVICE_CPU_ABILIST = get_partition_props("ro.{}product.cpu.abilist", add_empty=True)
-DEVICE_CPU_VARIANT = ["ro.bionic.cpu_variant"]
-DEVICE_SECOND_ARCH = ["ro.bionic.2nd_arch"]
-DEVICE_SECOND_CPU_VARIANT = ["ro.bionic.2nd_cpu_variant"]
-
-DEVICE_IS_AB = ["ro.build.ab_update"]
-DEVICE_USES_DYNAMIC_PARTITIONS = ["ro.boot.dynamic_partitions"]
-DEVICE_USES_VIRTUAL_AB = ["ro.virtual_ab.enabled"]
-DEVICE_USES_SYSTEM_AS_ROOT = ["ro.build.system_root_image"]
-
-BOOTLOADER_BOARD_NAME = ["ro.product.board"]
-DEVICE_PLATFORM = ["ro.board.platform"]
-DEVICE_PIXEL_FORMAT = ["ro.minui.pixel_format"]
-SCREEN_DENSITY = ["ro.sf.lcd_density"]
-USE_VULKAN = ["ro.hwui.use_vulkan"]
-
-BUILD_FINGERPRINT = get_partition_props("ro.{}build.fingerprint", add_empty=True)
-BUILD_DESCRIPTION = get_partition_props("ro.{}build.description", add_empty=True)
+@lru_cache(maxsize=None)
+def get_prop_tables() -> Dict[str, Tuple[str, ...]]:
+    """Get the candidate props of every prop table, most important first."""
+    return {
+        name: get_partition_props(props, add_empty=True) if isinstance(props, str) else props
+        for name, props in _PROP_TABLES.items()
+    }
 
-GMS_CLIENTID_BASE = ["ro.com.google.clientidbase"]
 
-BUILD_SECURITY_PATCH = ["ro.build.version.security_patch"]
-BUILD_VENDOR_SECURITY_PATCH = ["ro.vendor.build.security_patch"]
+def get_prop_table(name: str) -> Tuple[str, ...]:
+    """Get the candidate props of a prop table (e.g. "DEVICE_CODENAME"), most important first."""
+    return get_prop_tables()[name]
 
-FIRST_API_LEVEL = ["ro.product.first_api_level"]
-PRODUCT_CHARACTERISTICS = ["ro.build.characteristics"]
-APEX_UPDATABLE = ["ro.apex.updatable"]
 
-BOARD_FIRST_API_LEVEL = ["ro.board.first_api_level"]
-BOARD_API_LEVEL = ["ro.board.api_level"]
-
-ENABLE_UFFD_GC = ["ro.dalvik.vm.enable_uffd_gc"]
+# Can't be a class attribute of DeviceArch, it would be a member
+_DEVICE_ARCHS: Registry["DeviceArch"] = Registry(keys=["arch"], multi_keys=["cpu_abilist"])
 
 
 class DeviceArch(Enum):
@@ -81,6 +104,8 @@ class DeviceArch(Enum):
         self.cpu_abi = self.cpu_abilist[0]
         self.cpu_abi2 = self.cpu_abilist[1] if len(self.cpu_abilist) > 1 else ""
 
+        _DEVICE_ARCHS.register(self)
+
     def __bool__(self):
         return self.arch != "unknown"
 
@@ -89,23 +114,19 @@ class DeviceArch(Enum):
 
     @classmethod
     def from_arch(cls, arch: str):
-        for arch_enum in cls:
-            if arch_enum.arch != arch:
-                continue
+        arch_enum = _DEVICE_ARCHS.get("arch", arch)
+        if arch_enum is None:
+            raise ValueError(f"Unknown arch: {arch}")
 
-            return arch_enum
-
-        raise ValueError(f"Unknown arch: {arch}")
+        return arch_enum
 
     @classmethod
     def from_abi(cls, abi: str):
-        for arch_enum in cls:
-            if abi not in arch_enum.cpu_abilist:
-                continue
+        arch_enum = _DEVICE_ARCHS.get("cpu_abilist", abi)
+        if arch_enum is None:
+            raise ValueError(f"Unknown ABI: {abi}")
 
-            return arch_enum
-
-        raise ValueError(f"Unknown ABI: {abi}")
+        return arch_enum
 
     ARM = ("arm", "armv7-a-neon", 32, ["armeabi-v7a", "armeabi"])
     ARM64 = ("arm64", "armv8-a", 64, ["arm64-v8a"])
@@ -127,16 +148,17 @@ class DeviceInfo:
         Parse common build props.
         """
         self.build_prop = build_prop
+        self.prop_tables = get_prop_tables()
 
         # Parse props
-        self.codename = self.get_first_prop(DEVICE_CODENAME)
-        manufacturer = self.get_first_prop(DEVICE_MANUFACTURER)
+        self.codename = self.get_table_prop("DEVICE_CODENAME")
+        manufacturer = self.get_table_prop("DEVICE_MANUFACTURER")
         self.manufacturer = manufacturer.split()[0].lower() if manufacturer else None
-        self.brand = self.get_first_prop(DEVICE_BRAND, raise_exception=False)
-        self.model = self.get_first_prop(DEVICE_MODEL, raise_exception=False)
-        self.build_fingerprint = self.get_first_prop(BUILD_FINGERPRINT, raise_exception=False)
-        self.build_description = self.get_first_prop(
-            BUILD_DESCRIPTION,
+        self.brand = self.get_table_prop("DEVICE_BRAND", raise_exception=False)
+        self.model = self.get_table_prop("DEVICE_MODEL", raise_exception=False)
+        self.build_fingerprint = self.get_table_prop("BUILD_FINGERPRINT", raise_exception=False)
+        self.build_description = self.get_table_prop(
+            "BUILD_DESCRIPTION",
             default=fingerprint_to_description(self.build_fingerprint)
             if self.build_fingerprint
             else None,
@@ -146,15 +168,15 @@ class DeviceInfo:
         self.arch = None
         self.second_arch = None
 
-        arch_prop = self.get_first_prop(DEVICE_ARCH, raise_exception=False)
-        second_arch_prop = self.get_first_prop(DEVICE_SECOND_ARCH, raise_exception=False)
+        arch_prop = self.get_table_prop("DEVICE_ARCH", raise_exception=False)
+        second_arch_prop = self.get_table_prop("DEVICE_SECOND_ARCH", raise_exception=False)
         if arch_prop:
             self.arch = DeviceArch.from_arch(arch_prop)
             if second_arch_prop:
                 self.second_arch = DeviceArch.from_arch(second_arch_prop)
         else:
             # Fallback to ABI list
-            abi_list = self.get_first_prop(DEVICE_CPU_ABILIST)
+            abi_list = self.get_table_prop("DEVICE_CPU_ABILIST")
             assert abi_list, "No ABI list prop found"
             archs = list(set([DeviceArch.from_abi(abi) for abi in abi_list.split(",")]))
             assert 0 < len(archs) <= 2, "Invalid ABI list"
@@ -164,56 +186,62 @@ class DeviceInfo:
             if len(archs) > 1:
                 self.second_arch = archs[1]
 
-        self.cpu_variant = self.get_first_prop(DEVICE_CPU_VARIANT, default="generic")
-        self.second_cpu_variant = self.get_first_prop(DEVICE_SECOND_CPU_VARIANT, default="generic")
+        self.cpu_variant = self.get_table_prop("DEVICE_CPU_VARIANT", default="generic")
+        self.second_cpu_variant = self.get_table_prop(
+            "DEVICE_SECOND_CPU_VARIANT", default="generic"
+        )
 
-        self.bootloader_board_name = self.get_first_prop(BOOTLOADER_BOARD_NAME)
-        self.platform = self.get_first_prop(DEVICE_PLATFORM, default="default")
-        self.device_is_ab = self.get_first_prop(DEVICE_IS_AB, data_type=bool_cast, default=False)
-        self.device_uses_dynamic_partitions = self.get_first_prop(
-            DEVICE_USES_DYNAMIC_PARTITIONS, data_type=bool_cast, default=False
+        self.bootloader_board_name = self.get_table_prop("BOOTLOADER_BOARD_NAME")
+        self.platform = self.get_table_prop("DEVICE_PLATFORM", default="default")
+        self.device_is_ab = self.get_table_prop("DEVICE_IS_AB", data_type=bool_cast, default=False)
+        self.device_uses_dynamic_partitions = self.get_table_prop(
+            "DEVICE_USES_DYNAMIC_PARTITIONS", data_type=bool_cast, default=False
         )
-        self.device_uses_virtual_ab = self.get_first_prop(
-            DEVICE_USES_VIRTUAL_AB, data_type=bool_cast, default=False
+        self.device_uses_virtual_ab = self.get_table_prop(
+            "DEVICE_USES_VIRTUAL_AB", data_type=bool_cast, default=False
         )
-        self.device_uses_system_as_root = self.get_first_prop(
-            DEVICE_USES_SYSTEM_AS_ROOT, data_type=bool_cast, default=False
+        self.device_uses_system_as_root = self.get_table_prop(
+            "DEVICE_USES_SYSTEM_AS_ROOT", data_type=bool_cast, default=False
         )
-        self.device_uses_updatable_apex = self.get_first_prop(
-            APEX_UPDATABLE, data_type=bool_cast, default=False
+        self.device_uses_updatable_apex = self.get_table_prop(
+            "APEX_UPDATABLE", data_type=bool_cast, default=False
         )
 
-        self.device_pixel_format = self.get_first_prop(DEVICE_PIXEL_FORMAT, raise_exception=False)
-        self.screen_density = self.get_first_prop(SCREEN_DENSITY, raise_exception=False)
-        self.use_vulkan = self.get_first_prop(USE_VULKAN, data_type=bool_cast, default=False)
-        self.gms_clientid_base = self.get_first_prop(
-            GMS_CLIENTID_BASE, default=f"android-{self.manufacturer}"
+        self.device_pixel_format = self.get_table_prop("DEVICE_PIXEL_FORMAT", raise_exception=False)
+        self.screen_density = self.get_table_prop("SCREEN_DENSITY", raise_exception=False)
+        self.use_vulkan = self.get_table_prop("USE_VULKAN", data_type=bool_cast, default=False)
+        self.gms_clientid_base = self.get_table_prop(
+            "GMS_CLIENTID_BASE", default=f"android-{self.manufacturer}"
         )
-        self.first_api_level = self.get_first_prop(FIRST_API_LEVEL)
-        self.product_characteristics = self.get_first_prop(PRODUCT_CHARACTERISTICS, default="")
+        self.first_api_level = self.get_table_prop("FIRST_API_LEVEL")
+        self.product_characteristics = self.get_table_prop("PRODUCT_CHARACTERISTICS", default="")
 
-        self.build_security_patch = self.get_first_prop(BUILD_SECURITY_PATCH)
-        self.vendor_build_security_patch = self.get_first_prop(
-            BUILD_VENDOR_SECURITY_PATCH, default=self.build_security_patch
+        self.build_security_patch = self.get_table_prop("BUILD_SECURITY_PATCH")
+        self.vendor_build_security_patch = self.get_table_prop(
+            "BUILD_VENDOR_SECURITY_PATCH", default=self.build_security_patch
         )
 
-        self.board_first_api_level = self.get_first_prop(
-            BOARD_FIRST_API_LEVEL, raise_exception=False
+        self.board_first_api_level = self.get_table_prop(
+            "BOARD_FIRST_API_LEVEL", raise_exception=False
         )
-        self.board_api_level = self.get_first_prop(BOARD_API_LEVEL, raise_exception=False)
+        self.board_api_level = self.get_table_prop("BOARD_API_LEVEL", raise_exception=False)
 
-        self.enable_uffd_gc = self.get_first_prop(
-            ENABLE_UFFD_GC, data_type=bool_cast, raise_exception=False
+        self.enable_uffd_gc = self.get_table_prop(
+            "ENABLE_UFFD_GC", data_type=bool_cast, raise_exception=False
         )
 
     def get_first_prop(
         self,
-        props: List[str],
+        props: Sequence[str],
         data_type: Callable[[str], T] = str,
         default: D = None,
         raise_exception: bool = True,
     ) -> Union[T, D]:
         for prop in props:
+            # Most candidates are missing, skip them without calling _get_prop()
+            if prop not in self.build_prop:
+                continue
+
             prop_value = self.build_prop._get_prop(prop, data_type)
             if prop_value is None:
                 continue
@@ -224,3 +252,13 @@ class DeviceInfo:
             raise AssertionError(f"Property {props[0]} could not be found in build.prop")
         else:
             return default
+
+    def get_table_prop(
+        self,
+        name: str,
+        data_type: Callable[[str], T] = str,
+        default: D = None,
+        raise_exception: bool = True,
+    ) -> Union[T, D]:
+        """Same as get_first_prop(), with the props of a prop table (e.g. "DEVICE_CODENAME")."""
+        return self.get_first_prop(self.prop_tables[name], data_type, default, raise_exception)
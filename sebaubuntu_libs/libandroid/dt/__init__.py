@@ -0,0 +1,5 @@
+#
+# SPDX-FileCopyrightText: Sebastiano Barezzi
+# SPDX-License-Identifier: Apache-2.0
+#
+"""Device tree (FDT and DTBO) library."""
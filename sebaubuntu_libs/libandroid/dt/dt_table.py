@@ -0,0 +1,190 @@
+#
+# SPDX-FileCopyrightText: Sebastiano Barezzi
+# SPDX-License-Identifier: Apache-2.0
+#
+
+from mmap import ACCESS_READ, mmap
+from pathlib import Path
+from struct import Struct
+from typing import List, Optional, Sequence
+
+from sebaubuntu_libs.libandroid.dt.fdt import FDT_HEADER, FDT_MAGIC, Buffer, Fdt
+
+DT_TABLE_MAGIC = 0xD7B7AB1E
+
+# magic, total_size, header_size, dt_entry_size, dt_entry_count, dt_entries_offset,
+# page_size, version
+DT_TABLE_HEADER = Struct(">8I")
+# dt_size, dt_offset, id, rev, custom[4]
+DT_TABLE_ENTRY = Struct(">8I")
+
+FDT_MAGIC_BYTES = FDT_MAGIC.to_bytes(4, "big")
+
+
+class DtTableEntry:
+    """Class representing an entry of a DTBO image (dt_table_entry)."""
+
+    def __init__(
+        self,
+        dt_size: int,
+        dt_offset: int,
+        id: int,
+        rev: int,
+        custom: List[int],
+        fdt: Optional[Fdt],
+    ):
+        """Initialize a DT table entry."""
+        self.dt_size = dt_size
+        self.dt_offset = dt_offset
+        self.id = id
+        self.rev = rev
+        self.custom = custom
+        # None if the entry doesn't contain a plain FDT (e.g. it is compressed)
+        self.fdt = fdt
+
+
+def is_dt_table(buffer: Buffer) -> bool:
+    """Check whether a buffer starts with a DT table header."""
+    return len(buffer) >= DT_TABLE_HEADER.size and (
+        DT_TABLE_HEADER.unpack_from(buffer)[0] == DT_TABLE_MAGIC
+    )
+
+
+def parse_dt_table(buffer: Buffer) -> List[DtTableEntry]:
+    """Parse a DTBO image (dt_table_header followed by dt_table_entry structs)."""
+    (
+        magic,
+        _,  # total_size
+        _,  # header_size
+        dt_entry_size,
+        dt_entry_count,
+        dt_entries_offset,
+        _,  # page_size
+        _,  # version
+    ) = DT_TABLE_HEADER.unpack_from(buffer)
+
+    if magic != DT_TABLE_MAGIC:
+        raise ValueError(f"Invalid DT table magic: {magic:#x}")
+
+    entries: List[DtTableEntry] = []
+    for i in range(dt_entry_count):
+        dt_size, dt_offset, id, rev, *custom = DT_TABLE_ENTRY.unpack_from(
+            buffer, dt_entries_offset + i * dt_entry_size
+        )
+
+        fdt = None
+        if buffer[dt_offset : dt_offset + 4] == FDT_MAGIC_BYTES:
+            fdt = Fdt(buffer, dt_offset)
+
+        entries.append(DtTableEntry(dt_size, dt_offset, id, rev, custom, fdt))
+
+    return entries
+
+
+def find_fdts(buffer: Buffer) -> List[Fdt]:
+    """
+    Find all the FDTs in a buffer of concatenated DTBs.
+
+    Blobs are expected to be back to back, but any padding or garbage
+    between them (e.g. in kernel appended DTBs) is skipped.
+    """
+    fdts: List[Fdt] = []
+
+    offset = buffer.find(FDT_MAGIC_BYTES)
+    while 0 <= offset <= len(buffer) - FDT_HEADER.size:
+        try:
+            fdt = Fdt(buffer, offset)
+        except ValueError:
+            # Not an actual FDT, just the magic appearing somewhere
+            offset = buffer.find(FDT_MAGIC_BYTES, offset + 1)
+            continue
+
+        fdts.append(fdt)
+        offset = buffer.find(FDT_MAGIC_BYTES, offset + max(fdt.size, 1))
+
+    return fdts
+
+
+class DeviceTreeImage:
+    """
+    A DTBO image or a file with concatenated DTBs, mapped in memory.
+
+    All the FDTs read from the image share the same mapping, which is
+    released by close() (or at the end of a with block), after that the FDTs
+    can't be used anymore.
+    """
+
+    def __init__(self, path: Path):
+        """Map and index a device tree image."""
+        self.path = path
+
+        self.entries: List[DtTableEntry] = []
+        self.fdts: List[Fdt] = []
+
+        self._file = path.open("rb")
+        self._mmap: Optional[mmap] = None
+
+        if path.stat().st_size == 0:
+            return
+
+        self._mmap = mmap(self._file.fileno(), 0, access=ACCESS_READ)
+
+        if is_dt_table(self._mmap):
+            self.entries = parse_dt_table(self._mmap)
+            self.fdts = [entry.fdt for entry in self.entries if entry.fdt is not None]
+        else:
+            self.fdts = find_fdts(self._mmap)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.entries = []
+        self.fdts = []
+
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+        self._file.close()
+
+    def find(
+        self,
+        compatible: Optional[str] = None,
+        model: Optional[str] = None,
+        board_id: Optional[Sequence[int]] = None,
+    ) -> List[Fdt]:
+        """
+        Return the FDTs matching all the given criteria.
+
+        board_id is matched against each group of len(board_id) cells
+        of the qcom,board-id property.
+        """
+        matches: List[Fdt] = []
+
+        for fdt in self.fdts:
+            if compatible is not None and compatible not in fdt.compatible:
+                continue
+
+            if model is not None and fdt.model != model:
+                continue
+
+            if board_id is not None and not _match_cells(fdt.board_id, board_id):
+                continue
+
+            matches.append(fdt)
+
+        return matches
+
+
+def _match_cells(cells: List[int], group: Sequence[int]) -> bool:
+    size = len(group)
+    if not size:
+        return True
+
+    return any(
+        tuple(cells[i : i + size]) == tuple(group) for i in range(0, len(cells) - size + 1, size)
+    )
@@ -0,0 +1,226 @@
+#
+# SPDX-FileCopyrightText: Sebastiano Barezzi
+# SPDX-License-Identifier: Apache-2.0
+#
+
+from mmap import mmap
+from struct import Struct
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+FDT_MAGIC = 0xD00DFEED
+
+# magic, totalsize, off_dt_struct, off_dt_strings, off_mem_rsvmap, version,
+# last_comp_version, boot_cpuid_phys, size_dt_strings, size_dt_struct
+FDT_HEADER = Struct(">10I")
+FDT_U32 = Struct(">I")
+FDT_PROP = Struct(">II")
+
+FDT_BEGIN_NODE = 0x1
+FDT_END_NODE = 0x2
+FDT_PROP_TOKEN = 0x3
+FDT_NOP = 0x4
+FDT_END = 0x9
+
+Buffer = Union[bytes, bytearray, mmap]
+
+
+class Fdt:
+    """
+    A flattened device tree blob.
+
+    The blob is never copied, the structure block is walked in place
+    on the underlying buffer (usually a mmap) and only the requested
+    property values are read.
+    """
+
+    def __init__(self, buffer: Buffer, offset: int = 0):
+        """Initialize a FDT at the given offset of a buffer."""
+        (
+            magic,
+            totalsize,
+            off_dt_struct,
+            off_dt_strings,
+            _,  # off_mem_rsvmap
+            version,
+            _,  # last_comp_version
+            _,  # boot_cpuid_phys
+            _,  # size_dt_strings
+            _,  # size_dt_struct
+        ) = FDT_HEADER.unpack_from(buffer, offset)
+
+        if magic != FDT_MAGIC:
+            raise ValueError(f"Invalid FDT magic at offset {offset}: {magic:#x}")
+
+        if offset + totalsize > len(buffer):
+            raise ValueError(f"Truncated FDT at offset {offset}")
+
+        self.buffer = buffer
+        self.offset = offset
+        self.size = totalsize
+        self.version = version
+
+        self._struct_offset = offset + off_dt_struct
+        self._strings_offset = offset + off_dt_strings
+
+    def __repr__(self) -> str:
+        return f"Fdt(offset={self.offset}, size={self.size}, model={self.model!r})"
+
+    @property
+    def compatible(self) -> List[str]:
+        return self.get_strings("compatible")
+
+    @property
+    def model(self) -> Optional[str]:
+        return self.get_string("model")
+
+    @property
+    def board_id(self) -> List[int]:
+        return self.get_u32_list("qcom,board-id")
+
+    @property
+    def msm_id(self) -> List[int]:
+        return self.get_u32_list("qcom,msm-id")
+
+    def get_property(self, name: str, path: str = "/") -> Optional[bytes]:
+        """Get the raw value of a property, None if the node or the property doesn't exist."""
+        encoded_name = name.encode("utf-8") + b"\0"
+
+        node_offset = self._find_node(path)
+        if node_offset is None:
+            return None
+
+        for name_offset, value_offset, length in self._iter_properties(node_offset):
+            name_start = self._strings_offset + name_offset
+            if self.buffer[name_start : name_start + len(encoded_name)] != encoded_name:
+                continue
+
+            return bytes(self.buffer[value_offset : value_offset + length])
+
+        return None
+
+    def get_properties(self, path: str = "/") -> Dict[str, bytes]:
+        """Get all the properties of a node."""
+        node_offset = self._find_node(path)
+        if node_offset is None:
+            return {}
+
+        return {
+            self._read_string(self._strings_offset + name_offset)[0]: bytes(
+                self.buffer[value_offset : value_offset + length]
+            )
+            for name_offset, value_offset, length in self._iter_properties(node_offset)
+        }
+
+    def get_strings(self, name: str, path: str = "/") -> List[str]:
+        """Get a string list property (e.g. compatible)."""
+        value = self.get_property(name, path)
+        if not value:
+            return []
+
+        return [string.decode("utf-8", errors="replace") for string in value.split(b"\0")[:-1]]
+
+    def get_string(self, name: str, path: str = "/") -> Optional[str]:
+        """Get a string property (e.g. model)."""
+        strings = self.get_strings(name, path)
+        return strings[0] if strings else None
+
+    def get_u32_list(self, name: str, path: str = "/") -> List[int]:
+        """Get a property made of u32 cells."""
+        value = self.get_property(name, path)
+        if not value:
+            return []
+
+        return [cell for (cell,) in FDT_U32.iter_unpack(value[: len(value) & ~3])]
+
+    def _align(self, offset: int) -> int:
+        """Align to 4 bytes, relative to the start of the blob."""
+        return self.offset + ((offset - self.offset + 3) & ~3)
+
+    def _read_string(self, offset: int) -> Tuple[str, int]:
+        """Read a NUL-terminated string, returns it along with the offset after the NUL."""
+        end = self.buffer.find(b"\0", offset)
+        if end < 0:
+            raise ValueError(f"Unterminated string at offset {offset}")
+
+        return self.buffer[offset:end].decode("utf-8", errors="replace"), end + 1
+
+    def _next_token(self, offset: int) -> Tuple[int, int]:
+        """Return a token and the offset of its payload, skipping NOPs."""
+        while True:
+            (token,) = FDT_U32.unpack_from(self.buffer, offset)
+            offset += 4
+            if token != FDT_NOP:
+                return token, offset
+
+    def _iter_properties(self, offset: int) -> Iterator[Tuple[int, int, int]]:
+        """
+        Iterate over the properties of the node whose body starts at offset.
+
+        Properties always come before subnodes, stop at the first one.
+        """
+        while True:
+            token, offset = self._next_token(offset)
+            if token != FDT_PROP_TOKEN:
+                return
+
+            length, name_offset = FDT_PROP.unpack_from(self.buffer, offset)
+            value_offset = offset + FDT_PROP.size
+            yield name_offset, value_offset, length
+            offset = self._align(value_offset + length)
+
+    def _skip_node(self, offset: int) -> int:
+        """Skip the body of a node, return the offset after its FDT_END_NODE."""
+        depth = 1
+        while depth:
+            token, offset = self._next_token(offset)
+            if token == FDT_BEGIN_NODE:
+                offset = self._read_string(offset)[1]
+                offset = self._align(offset)
+                depth += 1
+            elif token == FDT_END_NODE:
+                depth -= 1
+            elif token == FDT_PROP_TOKEN:
+                (length,) = FDT_U32.unpack_from(self.buffer, offset)
+                offset = self._align(offset + FDT_PROP.size + length)
+            else:
+                raise ValueError(f"Unexpected FDT token {token:#x}")
+
+        return offset
+
+    def _find_node(self, path: str) -> Optional[int]:
+        """Return the offset of the body of a node (right after its name)."""
+        token, offset = self._next_token(self._struct_offset)
+        if token != FDT_BEGIN_NODE:
+            raise ValueError("FDT structure block doesn't start with the root node")
+
+        offset = self._align(self._read_string(offset)[1])
+
+        for component in [component for component in path.split("/") if component]:
+            # Subnodes come after the properties of the current node
+            offset = self._skip_properties(offset)
+
+            while True:
+                token, child_offset = self._next_token(offset)
+                if token != FDT_BEGIN_NODE:
+                    # No more subnodes
+                    return None
+
+                name, offset = self._read_string(child_offset)
+                offset = self._align(offset)
+
+                # Allow omitting the unit address
+                if name == component or ("@" not in component and name.split("@")[0] == component):
+                    break
+
+                offset = self._skip_node(offset)
+
+        return offset
+
+    def _skip_properties(self, offset: int) -> int:
+        while True:
+            token, next_offset = self._next_token(offset)
+            if token != FDT_PROP_TOKEN:
+                return offset
+
+            (length,) = FDT_U32.unpack_from(self.buffer, next_offset)
+            offset = self._align(next_offset + FDT_PROP.size + length)
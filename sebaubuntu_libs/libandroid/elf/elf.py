@@ -3,16 +3,19 @@
 # SPDX-License-Identifier: Apache-2.0
 #
 
-from elftools.common.exceptions import ELFError
-from elftools.elf.elffile import ELFFile
 from pathlib import Path
+from sebaubuntu_libs.liblogging.tracing import traced
 from typing import Set
 
 
 class ELF:
+    @traced(category="android")
     def __init__(self, path: Path):
         self.path = path
 
+        # pyelftools is slow to import, only load it once it's needed
+        from elftools.elf.elffile import ELFFile
+
         # Just check that this is actually an ELF file, die otherwise
         with self.path.open("rb") as f:
             ELFFile(f)
@@ -20,7 +23,11 @@ class ELF:
         self.needed_libraries = self.get_needed_libs(self.path)
 
     @classmethod
+    @traced(category="android")
     def get_needed_libs(cls, file: Path) -> Set[str]:
+        from elftools.common.exceptions import ELFError
+        from elftools.elf.elffile import ELFFile
+
         needed_libs: Set[str] = set()
 
         with file.open("rb") as f:
@@ -3,3 +3,47 @@
 # SPDX-License-Identifier: Apache-2.0
 #
 """AOSP partitions library."""
+
+from importlib import import_module
+from typing import TYPE_CHECKING, Any, List
+
+if TYPE_CHECKING:
+    from sebaubuntu_libs.libandroid.partitions.partition import AndroidPartition
+    from sebaubuntu_libs.libandroid.partitions.partition_model import (
+        PartitionGroup,
+        PartitionModel,
+        PartitionModels,
+    )
+    from sebaubuntu_libs.libandroid.partitions.partitions import Partitions
+
+# Attribute -> submodule, imported on first access so that importing
+# the package doesn't load props, fstab and VINTF parsing
+_LAZY_ATTRIBUTES = {
+    "AndroidPartition": "partition",
+    "PartitionGroup": "partition_model",
+    "PartitionModel": "partition_model",
+    "PartitionModels": "partition_model",
+    "Partitions": "partitions",
+}
+
+__all__ = [
+    "AndroidPartition",
+    "PartitionGroup",
+    "PartitionModel",
+    "PartitionModels",
+    "Partitions",
+]
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(import_module(f"{__name__}.{_LAZY_ATTRIBUTES[name]}"), name)
+    globals()[name] = value
+
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted({*globals(), *_LAZY_ATTRIBUTES})
@@ -11,6 +11,7 @@ from sebaubuntu_libs.libandroid.fstab import Fstab, FstabEntry
 from sebaubuntu_libs.libandroid.partitions.partition_model import PartitionModel
 from sebaubuntu_libs.libandroid.props import BuildProp
 from sebaubuntu_libs.libandroid.vintf.manifest import Manifest
+from sebaubuntu_libs.liblogging.tracing import trace, traced
 from sebaubuntu_libs.libreorder import strcoll_files_key
 
 BUILD_PROP_LOCATION = ["build.prop", "etc/build.prop"]
@@ -32,11 +33,13 @@ def get_files_list(path: Path) -> List[Path]:
 
 
 class AndroidPartition:
+    @traced(category="android")
     def __init__(self, model: PartitionModel, path: Path):
         self.model = model
         self.path = path
 
-        self.files = get_files_list(self.path)
+        with trace("get_files_list", "android", path=self.path):
+            self.files = get_files_list(self.path)
 
         self.fstab_entry: Optional[FstabEntry] = None
 
@@ -5,6 +5,7 @@
 
 from enum import IntEnum
 from pathlib import Path
+from sebaubuntu_libs.libregistry import Registry
 from typing import List, Optional
 
 
@@ -16,7 +17,10 @@ class PartitionGroup(IntEnum):
 
 
 class PartitionModel:
-    ALL: List["PartitionModel"] = []
+    REGISTRY: Registry["PartitionModel"] = Registry(
+        keys=["name", "group"], multi_keys=["mount_points"]
+    )
+    ALL: List["PartitionModel"] = REGISTRY.all
 
     def __init__(
         self,
@@ -30,7 +34,7 @@ class PartitionModel:
         self.mount_points = mount_points or [f"/{self.name}"]
         self.proprietary_files_prefix = proprietary_files_prefix or Path(self.name)
 
-        PartitionModel.ALL.append(self)
+        PartitionModel.REGISTRY.register(self)
 
 
 class PartitionModels:
@@ -63,20 +67,12 @@ class PartitionModels:
 
     @classmethod
     def from_name(cls, name: str):
-        for model in PartitionModel.ALL:
-            if model.name == name:
-                return model
-
-        return None
+        return PartitionModel.REGISTRY.get("name", name)
 
     @classmethod
     def from_group(cls, group: PartitionGroup):
-        return [model for model in PartitionModel.ALL if model.group == group]
+        return PartitionModel.REGISTRY.get_all("group", group)
 
     @classmethod
     def from_mount_point(cls, mount_point: str):
-        for model in PartitionModel.ALL:
-            if mount_point in model.mount_points:
-                return model
-
-        return None
+        return PartitionModel.REGISTRY.get("mount_points", mount_point)
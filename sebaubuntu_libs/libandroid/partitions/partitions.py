@@ -4,7 +4,7 @@
 #
 
 from pathlib import Path
-from typing import Dict
+from typing import TYPE_CHECKING, Dict, Union
 
 from sebaubuntu_libs.libandroid.partitions.partition import AndroidPartition, BUILD_PROP_LOCATION
 from sebaubuntu_libs.libandroid.partitions.partition_model import (
@@ -12,9 +12,14 @@ from sebaubuntu_libs.libandroid.partitions.partition_model import (
     PartitionModel,
     PartitionModels,
 )
+from sebaubuntu_libs.liblogging.tracing import traced
+
+if TYPE_CHECKING:
+    from sebaubuntu_libs.libcas import ContentStore, StoredTree
 
 
 class Partitions:
+    @traced(category="android")
     def __init__(self, dump_path: Path):
         self.dump_path = dump_path
 
@@ -64,6 +69,20 @@ class Partitions:
         ]:
             self._search_for_partition(model)
 
+    @classmethod
+    def from_store(
+        cls, store: "ContentStore", tree: Union[str, "StoredTree"], dump_path: Path
+    ) -> "Partitions":
+        """
+        Load a dump saved in a ContentStore (see ContentStore.add_tree()).
+
+        The tree is materialized under dump_path as hard links to the stored
+        objects, so it takes no space of its own and must not be modified.
+        """
+        store.materialize_tree(tree, dump_path)
+
+        return cls(dump_path)
+
     def get_partition(self, model: PartitionModel):
         if model in self.partitions:
             return self.partitions[model]
@@ -80,6 +99,7 @@ class Partitions:
     def get_all_partitions(self):
         return self.partitions.values()
 
+    @traced(category="android")
     def _search_for_partition(self, model: PartitionModel):
         possible_locations = [
             self.partitions[PartitionModels.SYSTEM].path / model.name,
@@ -9,6 +9,7 @@ from pathlib import Path
 from typing import Callable, List, Optional, TypeVar, Union
 
 from sebaubuntu_libs.libcompat.distutils.util import strtobool
+from sebaubuntu_libs.liblogging.tracing import traced
 
 
 T = TypeVar("T")
@@ -39,6 +40,7 @@ class BuildProp(dict):
 
         return "\n".join(f"{key}={value}" for key, value in ordered_props.items()) + "\n"
 
+    @traced(category="android")
     def import_props(self, file: Union[Path, BuildProp]):
         if isinstance(file, BuildProp):
             text = str(file)
@@ -3,31 +3,51 @@
 # SPDX-License-Identifier: Apache-2.0
 #
 
+from functools import lru_cache
 from sebaubuntu_libs.libandroid.partitions.partition_model import PartitionModels, PartitionGroup
+from typing import Tuple
 
-PARTITIONS = [
-    partition.name
-    for partition in PartitionModels.from_group(PartitionGroup.SSI)
-    + PartitionModels.from_group(PartitionGroup.TREBLE)
-] + [
-    "bootimage",
-]
 
+def __getattr__(name: str):
+    # PARTITIONS is computed on first use, not at import
+    if name == "PARTITIONS":
+        return get_partitions()
 
-def get_partition_props(format_string: str, add_empty: bool = False):
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@lru_cache(maxsize=None)
+def get_partitions() -> Tuple[str, ...]:
+    """Get the names of the partitions that can have their own build props."""
+    return tuple(
+        [
+            partition.name
+            for partition in PartitionModels.from_group(PartitionGroup.SSI)
+            + PartitionModels.from_group(PartitionGroup.TREBLE)
+        ]
+        + [
+            "bootimage",
+        ]
+    )
+
+
+@lru_cache(maxsize=None)
+def get_partition_props(format_string: str, add_empty: bool = False) -> Tuple[str, ...]:
     """
-    Get a list of props given a string to format.
+    Get a tuple of props given a string to format.
 
     If add_empty is True, you need to omit a dot at the end of the partition
     (e.g. "ro.{}.build.date" if add_empty is False, "ro.{}build.date" otherwise).
+
+    The result is cached, every call with the same arguments returns the same tuple.
     """
-    partitions_formatted = [(f"{part}." if add_empty else part) for part in PARTITIONS]
+    partitions_formatted = [(f"{part}." if add_empty else part) for part in get_partitions()]
 
     partition_props = [format_string.format(partition) for partition in partitions_formatted]
     if add_empty:
         partition_props.append(format_string.format(""))
 
-    return partition_props
+    return tuple(partition_props)
 
 
 def fingerprint_to_description(fingerprint: str):
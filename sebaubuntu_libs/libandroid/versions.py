@@ -4,11 +4,13 @@
 #
 """Android library."""
 
-from typing import List
+from sebaubuntu_libs.libregistry import Registry
 
 
 class _AndroidVersion:
-    __ALL: List["_AndroidVersion"] = []
+    __REGISTRY: Registry["_AndroidVersion"] = Registry(
+        keys=["version_code", "version_name", "api_version", "version_short"]
+    )
 
     def __init__(
         self,
@@ -23,35 +25,23 @@ class _AndroidVersion:
         version_name_split = self.version_name.split()
         self.version_short = version_name_split[0][0]
 
-        self.__ALL.append(self)
+        self.__REGISTRY.register(self)
 
     @classmethod
     def from_version_code(cls, version_code: str):
-        for version in cls.__ALL:
-            if version.version_code == version_code:
-                return version
-        return None
+        return cls.__REGISTRY.get("version_code", version_code)
 
     @classmethod
     def from_version_name(cls, version_name: str):
-        for version in cls.__ALL:
-            if version.version_name == version_name:
-                return version
-        return None
+        return cls.__REGISTRY.get("version_name", version_name)
 
     @classmethod
     def from_api_version(cls, api_version: int):
-        for version in cls.__ALL:
-            if version.api_version == api_version:
-                return version
-        return None
+        return cls.__REGISTRY.get("api_version", api_version)
 
     @classmethod
     def from_version_short(cls, version_short: str):
-        for version in cls.__ALL:
-            if version.version_short == version_short:
-                return version
-        return None
+        return cls.__REGISTRY.get("version_short", version_short)
 
 
 class AndroidVersion(_AndroidVersion):
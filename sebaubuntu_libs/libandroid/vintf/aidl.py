@@ -4,12 +4,14 @@
 #
 
 from textwrap import indent
-from typing import Set
-from xml.etree.ElementTree import Element
+from typing import TYPE_CHECKING, Set
 
 from sebaubuntu_libs.libandroid.vintf import INDENTATION
 from sebaubuntu_libs.libandroid.vintf.common import Hal, cast_to_str_key
 
+if TYPE_CHECKING:
+    from xml.etree.ElementTree import Element
+
 
 class AidlInterface:
     """Class representing a AIDL HAL."""
@@ -62,7 +64,7 @@ class AidlHal(Hal):
         return string
 
     @classmethod
-    def from_entry(cls, entry: Element) -> "AidlHal":
+    def from_entry(cls, entry: "Element") -> "AidlHal":
         """Create a AIDL HAL from a VINTF entry."""
         assert entry.get("format") == "aidl"
 
@@ -3,14 +3,16 @@
 # SPDX-License-Identifier: Apache-2.0
 #
 
-from typing import List, Optional, Set
+from typing import TYPE_CHECKING, List, Optional, Set
 from sebaubuntu_libs.libstring import removeprefix
 from textwrap import indent
-from xml.etree.ElementTree import Element
 
 from sebaubuntu_libs.libandroid.vintf import INDENTATION
 from sebaubuntu_libs.libandroid.vintf.common import Hal, cast_to_str_key
 
+if TYPE_CHECKING:
+    from xml.etree.ElementTree import Element
+
 
 class HidlInterface:
     """Class representing a HIDL interface."""
@@ -46,7 +48,7 @@ class HidlInterface:
         return cls(name, version, instance)
 
     @classmethod
-    def from_interface(cls, version: str, interface: Element) -> List["HidlInterface"]:
+    def from_interface(cls, version: str, interface: "Element") -> List["HidlInterface"]:
         """Create a AIDL HAL from an interface."""
         name = interface.findtext("name")
         assert name is not None, "Missing name in HIDL interface"
@@ -58,7 +60,7 @@ class HidlInterface:
         ]
 
     @classmethod
-    def from_interfaces(cls, version: str, interfaces: List[Element]) -> List["HidlInterface"]:
+    def from_interfaces(cls, version: str, interfaces: List["Element"]) -> List["HidlInterface"]:
         instances = [cls.from_interface(version, interface) for interface in interfaces]
 
         return [interface for interfaces in instances for interface in interfaces]
@@ -87,7 +89,7 @@ class HidlTransport:
         return hash((self.name, self.passthrough_arch))
 
     @classmethod
-    def from_element(cls, element: Element):
+    def from_element(cls, element: "Element"):
         """Get a HidlTransport from an XML element."""
         name = element.text
         assert name is not None, "Missing name in HIDL transport"
@@ -132,7 +134,7 @@ class HidlHal(Hal):
         return string
 
     @classmethod
-    def from_entry(cls, entry: Element) -> "HidlHal":
+    def from_entry(cls, entry: "Element") -> "HidlHal":
         """Create a HIDL HAL from a VINTF entry."""
         assert entry.get("format") == "hidl", "Invalid format for HIDL HAL"
 
@@ -8,7 +8,7 @@ from locale import strcoll
 from pathlib import Path
 from typing import List, Optional
 from sebaubuntu_libs.liblogging import LOGW
-from xml.etree import ElementTree
+from sebaubuntu_libs.liblogging.tracing import traced
 from textwrap import indent
 
 from sebaubuntu_libs.libandroid.vintf import INDENTATION
@@ -54,8 +54,11 @@ class Manifest:
 
         return string
 
+    @traced(category="android")
     def import_file(self, file: Path):
         """Import a manifest file."""
+        from xml.etree import ElementTree
+
         tree = ElementTree.parse(file)
         root = tree.getroot()
 
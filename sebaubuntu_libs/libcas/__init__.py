@@ -0,0 +1,411 @@
+#
+# SPDX-FileCopyrightText: Sebastiano Barezzi
+# SPDX-License-Identifier: Apache-2.0
+#
+"""Content-addressed store library."""
+
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+from json import dump, load
+import os
+from pathlib import Path, PurePosixPath
+from sebaubuntu_libs.libcompat.distutils.file_util import copy_file
+from sebaubuntu_libs.liblogging import LOGD, LOGI
+import sqlite3
+from threading import Lock, get_ident
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+DEFAULT_MAX_WORKERS = 8
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Cache entries written to the database at once
+HASH_CACHE_BATCH_SIZE = 1000
+
+# Stored objects are shared by every file linked to them, nobody should write them
+OBJECT_MODE = 0o444
+
+TREE_VERSION = 1
+
+
+class ContentChangedError(Exception):
+    """A file changed while it was being stored, the stored copy doesn't match its digest."""
+
+
+class HashCache:
+    """
+    Persistent cache of file digests, backed by SQLite.
+
+    Entries are keyed by (device, inode) and valid while the file size and
+    modification time don't change, so a file is hashed only once no matter
+    how many paths (e.g. hard links made by ContentStore) point to it.
+    Writes are batched, call flush() (or use it as a context manager)
+    to make sure they're saved.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+
+        self._connection = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS hashes ("
+            "device INTEGER NOT NULL, "
+            "inode INTEGER NOT NULL, "
+            "size INTEGER NOT NULL, "
+            "mtime_ns INTEGER NOT NULL, "
+            "digest TEXT NOT NULL, "
+            "PRIMARY KEY (device, inode))"
+        )
+        self._connection.commit()
+
+        self._pending: Dict[Tuple[int, int], Tuple[int, int, str]] = {}
+        self._lock = Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def get(self, stat: os.stat_result) -> Optional[str]:
+        """Return the cached digest of a file, None if unknown or outdated."""
+        key = (stat.st_dev, stat.st_ino)
+
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is None:
+                entry = self._connection.execute(
+                    "SELECT size, mtime_ns, digest FROM hashes WHERE device = ? AND inode = ?",
+                    key,
+                ).fetchone()
+
+        if entry is None or tuple(entry[:2]) != (stat.st_size, stat.st_mtime_ns):
+            return None
+
+        return entry[2]
+
+    def put(self, stat: os.stat_result, digest: str):
+        with self._lock:
+            self._pending[(stat.st_dev, stat.st_ino)] = (stat.st_size, stat.st_mtime_ns, digest)
+
+            if len(self._pending) >= HASH_CACHE_BATCH_SIZE:
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        self.flush()
+        self._connection.close()
+
+    def _flush(self):
+        if not self._pending:
+            return
+
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?)",
+            [key + entry for key, entry in self._pending.items()],
+        )
+        self._connection.commit()
+        self._pending.clear()
+
+
+class StoredTree:
+    """A directory tree kept in a ContentStore: file digests and symlink targets by POSIX path."""
+
+    def __init__(
+        self,
+        files: Optional[Dict[str, str]] = None,
+        links: Optional[Dict[str, str]] = None,
+    ):
+        self.files = files if files is not None else {}
+        self.links = links if links is not None else {}
+
+    def __len__(self):
+        return len(self.files) + len(self.links)
+
+    @classmethod
+    def from_file(cls, path: Path) -> "StoredTree":
+        with path.open() as f:
+            data = load(f)
+
+        assert data["version"] == TREE_VERSION, f"Unsupported tree version {data['version']}"
+
+        return cls(data["files"], data["links"])
+
+    def to_file(self, path: Path):
+        tmp_path = path.with_name(f"{path.name}.tmp")
+        with tmp_path.open("w") as f:
+            dump({"version": TREE_VERSION, "files": self.files, "links": self.links}, f)
+        os.replace(tmp_path, path)
+
+
+class ContentStore:
+    """
+    Content-addressed, deduplicating file store.
+
+    Each unique content is stored once, as a read-only object named after its
+    SHA-256, and trees are materialized from the objects as hard links (or as
+    copies, reflinked by the filesystem when it supports it). Adding many
+    similar dumps only costs the disk space and the hashing of the content
+    that's new: digests are cached in a HashCache keyed by inode, and files
+    materialized from the store share the inode of their object.
+
+    Layout:
+    - objects/<first 2 digest characters>/<rest of the digest>
+    - trees/<name>.json: StoredTree saved with add_tree()
+    - hash_cache.sqlite3
+
+    Hard links share the object with every other tree linked to it, they
+    must be treated as read-only: the mode only stops unprivileged writers,
+    a process running as root (or one that changes the mode) writing to a
+    hard linked file silently changes the content of every tree. Materialize
+    trees that will be modified with link=None.
+
+    The store also works as a 'store' target for the libcompat copy_file()
+    and copy_tree(), and Partitions.from_store() loads a dump saved in it.
+    """
+
+    def __init__(self, path: Union[str, Path], max_workers: int = DEFAULT_MAX_WORKERS):
+        self.path = Path(path)
+        self.max_workers = max_workers
+
+        self.objects_path = self.path / "objects"
+        self.trees_path = self.path / "trees"
+
+        self.objects_path.mkdir(parents=True, exist_ok=True)
+        self.trees_path.mkdir(exist_ok=True)
+
+        self.hash_cache = HashCache(self.path / "hash_cache.sqlite3")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.hash_cache.close()
+
+    def get_object_path(self, digest: str) -> Path:
+        return self.objects_path / digest[:2] / digest[2:]
+
+    def has_object(self, digest: str) -> bool:
+        return self.get_object_path(digest).is_file()
+
+    def hash_file(self, path: Union[str, Path]) -> str:
+        """Return the SHA-256 of a file, from the cache if it didn't change."""
+        stat = os.stat(path)
+
+        digest = self.hash_cache.get(stat)
+        if digest is not None:
+            return digest
+
+        digest = _hash_path(path)
+
+        self.hash_cache.put(stat, digest)
+
+        return digest
+
+    def hash_files(self, paths: Iterable[Union[str, Path]]) -> List[str]:
+        """Hash files in parallel, returns the digests in the same order."""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(self.hash_file, paths))
+
+    def add_file(self, path: Union[str, Path], digest: Optional[str] = None) -> str:
+        """
+        Store the content of a file if it's new, returns its digest.
+
+        The copy is hashed again before being stored,
+        ContentChangedError is raised if it doesn't match the digest.
+        """
+        if digest is None:
+            digest = self.hash_file(path)
+
+        object_path = self.get_object_path(digest)
+        if object_path.is_file():
+            return digest
+
+        object_path.parent.mkdir(exist_ok=True)
+
+        # Written aside and renamed, concurrent adds of the same content are harmless
+        tmp_path = object_path.with_name(f".{object_path.name}.{os.getpid()}.{get_ident()}.tmp")
+        copy_file(str(path), str(tmp_path), preserve_mode=0, preserve_times=0, verbose=0)
+
+        # The file may have changed after it was hashed, check what was actually copied
+        copied_digest = _hash_path(tmp_path)
+        if copied_digest != digest:
+            os.unlink(tmp_path)
+            raise ContentChangedError(
+                f"{path} changed while being stored: expected {digest}, got {copied_digest}"
+            )
+
+        os.chmod(tmp_path, OBJECT_MODE)
+        os.replace(tmp_path, object_path)
+
+        # The object is another inode with the same content
+        self.hash_cache.put(os.stat(object_path), digest)
+
+        LOGD(f"Stored {path} as {digest}")
+
+        return digest
+
+    def materialize(self, digest: str, dst: Union[str, Path], link: Optional[str] = "hard") -> bool:
+        """
+        Create dst with the content of an object, replacing it if it exists.
+
+        link is the same as for copy_file(): with "hard" (the default) dst is
+        a hard link to the object, falling back to a copy if the object is on
+        another filesystem; with None it's a copy.
+        Returns whether dst is a hard link, sharing the mode and times of the object.
+        A hard linked dst must not be written to, see ContentStore.
+        """
+        object_path = self.get_object_path(digest)
+        if not object_path.is_file():
+            raise FileNotFoundError(f"Object {digest} not found")
+
+        dst = Path(dst)
+        tmp_path = dst.with_name(f".{dst.name}.{os.getpid()}.{get_ident()}.tmp")
+        if os.path.lexists(tmp_path):
+            os.unlink(tmp_path)
+
+        linked = False
+        if link == "hard":
+            try:
+                os.link(object_path, tmp_path)
+                linked = True
+            except OSError:
+                pass
+        elif link is not None:
+            raise ValueError(f"Invalid value {link!r} for link")
+
+        if not linked:
+            copy_file(str(object_path), str(tmp_path), preserve_mode=0, preserve_times=0, verbose=0)
+            os.chmod(tmp_path, 0o644)
+
+        os.replace(tmp_path, dst)
+
+        return linked
+
+    def copy_file(self, src: Union[str, Path], dst: Union[str, Path], link: Optional[str] = "hard"):
+        """Store src and materialize it as dst, returns whether dst is a hard link."""
+        return self.materialize(self.add_file(src), dst, link=link)
+
+    def add_tree(
+        self, path: Union[str, Path], name: Optional[str] = None, replace: bool = False
+    ) -> StoredTree:
+        """
+        Store every file of a directory tree, hashing them in parallel.
+
+        If name is given the tree is saved, to be loaded with get_tree().
+        With replace, the files of the tree are replaced with hard links to
+        their objects (read-only, with the object times), so an existing dump
+        stops taking space of its own.
+        """
+        path = Path(path)
+        tree = StoredTree()
+
+        file_paths: List[str] = []
+        for relative_path, entry in _scan_tree(path):
+            if entry.is_symlink():
+                tree.links[relative_path] = os.readlink(entry.path)
+            elif entry.is_file():
+                file_paths.append(relative_path)
+
+        def add(relative_path: str) -> str:
+            file_path = path / relative_path
+            digest = self.add_file(file_path)
+            if replace and not os.path.samefile(file_path, self.get_object_path(digest)):
+                self.materialize(digest, file_path)
+
+            return digest
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            tree.files = dict(zip(file_paths, executor.map(add, file_paths)))
+
+        self.hash_cache.flush()
+
+        LOGI(f"Stored {path}: {len(tree.files)} files, {len(set(tree.files.values()))} unique")
+
+        if name is not None:
+            tree.to_file(self.trees_path / f"{name}.json")
+
+        return tree
+
+    def get_tree(self, name: str) -> StoredTree:
+        return StoredTree.from_file(self.trees_path / f"{name}.json")
+
+    def get_tree_names(self) -> List[str]:
+        return sorted(tree_path.stem for tree_path in self.trees_path.glob("*.json"))
+
+    def materialize_tree(
+        self,
+        tree: Union[str, StoredTree],
+        dst: Union[str, Path],
+        link: Optional[str] = "hard",
+    ):
+        """Recreate a tree (or a saved tree by name) under dst, see materialize()."""
+        if isinstance(tree, str):
+            tree = self.get_tree(tree)
+
+        dst = Path(dst)
+
+        for directory in sorted(
+            {(dst / relative_path).parent for relative_path in tree.files}
+            | {(dst / relative_path).parent for relative_path in tree.links}
+        ):
+            directory.mkdir(parents=True, exist_ok=True)
+
+        for relative_path, link_dest in tree.links.items():
+            link_path = dst / relative_path
+            if os.path.lexists(link_path):
+                os.unlink(link_path)
+            os.symlink(link_dest, link_path)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            list(
+                executor.map(
+                    lambda item: self.materialize(item[1], dst / item[0], link=link),
+                    tree.files.items(),
+                )
+            )
+
+    def get_unreferenced_objects(self) -> List[str]:
+        """Return the digests of the objects no saved tree uses."""
+        referenced = set()
+        for name in self.get_tree_names():
+            referenced.update(self.get_tree(name).files.values())
+
+        return [
+            f"{directory.name}{object_path.name}"
+            for directory in self.objects_path.iterdir()
+            for object_path in directory.iterdir()
+            if not object_path.name.startswith(".")
+            and f"{directory.name}{object_path.name}" not in referenced
+        ]
+
+
+def _hash_path(path: Union[str, Path]) -> str:
+    hash = sha256()
+    with open(path, "rb", buffering=0) as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            hash.update(chunk)
+
+    return hash.hexdigest()
+
+
+def _scan_tree(path: Path, relative_path: Optional[PurePosixPath] = None):
+    if relative_path is None:
+        relative_path = PurePosixPath()
+
+    with os.scandir(path) as it:
+        entries = list(it)
+
+    for entry in entries:
+        entry_relative_path = relative_path / entry.name
+
+        if entry.is_dir(follow_symlinks=False):
+            yield from _scan_tree(Path(entry.path), entry_relative_path)
+        elif entry.is_symlink() or entry.is_file(follow_symlinks=False):
+            yield str(entry_relative_path), entry
@@ -0,0 +1,84 @@
+#
+# SPDX-FileCopyrightText: 2023 Python Packaging Authority
+# SPDX-FileCopyrightText: Sebastiano Barezzi
+# SPDX-License-Identifier: MIT
+#
+
+import hashlib
+import json
+import os
+
+from sebaubuntu_libs.liblogging import LOGW
+
+from .errors import DistutilsFileError
+
+MANIFEST_VERSION = 1
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class Manifest:
+    """Record of what an incremental 'copy_tree()' wrote under its
+    destination, by path relative to it.
+
+    Files are recorded with the size and modification time (in ns) of
+    their source when they were copied, and with its SHA-256 once it has
+    been computed (None until then).  Symlinks are recorded with their
+    target.  A missing or invalid manifest is treated as empty.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.files = {}
+        self.links = {}
+
+        self.load()
+
+    def load(self):
+        if not os.path.isfile(self.path):
+            return
+
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            LOGW("ignoring invalid manifest %s: %s", self.path, e)
+            return
+
+        if data.get("version") != MANIFEST_VERSION:
+            return
+
+        self.files = {
+            relative_path: (size, mtime_ns, digest)
+            for relative_path, (size, mtime_ns, digest) in data["files"].items()
+        }
+        self.links = data["links"]
+
+    def save(self):
+        data = {
+            "version": MANIFEST_VERSION,
+            "files": self.files,
+            "links": self.links,
+        }
+
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            raise DistutilsFileError(f"could not write manifest '{self.path}': {e.strerror}") from e
+
+
+def file_digest(path):
+    """Return the SHA-256 hex digest of the file 'path'."""
+    digest = hashlib.sha256()
+
+    try:
+        with open(path, "rb", buffering=0) as f:
+            for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+    except OSError as e:
+        raise DistutilsFileError(f"could not read from '{path}': {e.strerror}") from e
+
+    return digest.hexdigest()
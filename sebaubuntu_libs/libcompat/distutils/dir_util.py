@@ -7,7 +7,7 @@
 import errno
 import os
 
-from sebaubuntu_libs.liblogging import LOGI
+from sebaubuntu_libs.liblogging import LOGD, LOGI, LOGW
 
 from .errors import DistutilsFileError, DistutilsInternalError
 
@@ -77,7 +77,7 @@ def mkpath(name, mode=0o777, verbose=1, dry_run=0):  # noqa: C901
                 os.mkdir(head, mode)
             except OSError as exc:
                 if not (exc.errno == errno.EEXIST and os.path.isdir(head)):
-                    raise DistutilsFileError(f"could not create '{head}': {exc.args[-1]}")
+                    raise DistutilsFileError(f"could not create '{head}': {exc.args[-1]}") from exc
             created_dirs.append(head)
 
         _path_created[abs_head] = 1
@@ -94,6 +94,10 @@ def copy_tree(  # noqa: C901
     verbose=1,
     dry_run=0,
     skip_non_regular_files=0,
+    max_workers=None,
+    manifest=None,
+    delete_orphans=0,
+    store=None,
 ):
     """Copy an entire directory tree 'src' to a new location 'dst'.
 
@@ -113,18 +117,70 @@ def copy_tree(  # noqa: C901
     copied as symlinks (on platforms that support them!); otherwise
     (the default), the destination of the symlink will be copied.
     'update' and 'verbose' are the same as for 'copy_file'.
+
+    If 'max_workers' is given, the tree is walked with 'os.scandir()',
+    all the directories are created first and the files are then copied
+    by a pool of 'max_workers' threads.  The return value and the errors
+    raised are the same.
+
+    If 'manifest' is given, the copy is incremental: the manifest file at
+    that path records what was copied to 'dst' (see '_manifest.Manifest')
+    and 'update' is ignored.  A file whose size and modification time
+    still match the manifest is skipped after a single stat; if only its
+    modification time changed, it's skipped when its content hash is
+    unchanged.  Files and symlinks recorded in the manifest but gone from
+    'src' are orphans: they're removed if 'delete_orphans' is true, along
+    with the directories they leave empty (unless they're still in 'src'),
+    otherwise they're reported and left alone.  Changes made to 'dst'
+    behind the manifest's back aren't detected.
+
+    If 'store' is given, files are copied through that content-addressed
+    store (see 'copy_file()'), as hard links to the stored objects, so
+    'dst' must be treated as read-only.
     """
     from .file_util import copy_file
 
     if not dry_run and not os.path.isdir(src):
         raise DistutilsFileError("cannot copy tree '%s': not a directory" % src)
+
+    if manifest is not None:
+        return _copy_tree_incremental(
+            src,
+            dst,
+            preserve_mode,
+            preserve_times,
+            preserve_symlinks,
+            verbose,
+            dry_run,
+            skip_non_regular_files,
+            max_workers,
+            manifest,
+            delete_orphans,
+            store,
+        )
+
+    if max_workers is not None:
+        return _copy_tree_parallel(
+            src,
+            dst,
+            preserve_mode,
+            preserve_times,
+            preserve_symlinks,
+            update,
+            verbose,
+            dry_run,
+            skip_non_regular_files,
+            max_workers,
+            store,
+        )
+
     try:
         names = os.listdir(src)
     except OSError as e:
         if dry_run:
             names = []
         else:
-            raise DistutilsFileError(f"error listing files in '{src}': {e.strerror}")
+            raise DistutilsFileError(f"error listing files in '{src}': {e.strerror}") from e
 
     if not dry_run:
         mkpath(dst, verbose=verbose)
@@ -158,6 +214,7 @@ def copy_tree(  # noqa: C901
                     update,
                     verbose=verbose,
                     dry_run=dry_run,
+                    store=store,
                 )
             )
 
@@ -173,9 +230,323 @@ def copy_tree(  # noqa: C901
                 preserve_mode,
                 preserve_times,
                 update,
+                link=_get_store_link(store),
                 verbose=verbose,
                 dry_run=dry_run,
+                store=store,
             )
             outputs.append(dst_name)
 
     return outputs
+
+
+def _copy_tree_parallel(
+    src,
+    dst,
+    preserve_mode,
+    preserve_times,
+    preserve_symlinks,
+    update,
+    verbose,
+    dry_run,
+    skip_non_regular_files,
+    max_workers,
+    store,
+):
+    dirs = []
+    links = []
+    files = []
+    outputs = []
+    _scan_tree(
+        src,
+        dst,
+        preserve_symlinks,
+        verbose,
+        dry_run,
+        skip_non_regular_files,
+        dirs,
+        links,
+        files,
+        outputs,
+    )
+
+    if not dry_run:
+        # Parents come before their children
+        for dir_name in dirs:
+            mkpath(dir_name, verbose=verbose)
+
+    for dst_name, link_dest in links:
+        if verbose >= 1:
+            LOGI("linking %s -> %s", dst_name, link_dest)
+        if not dry_run:
+            os.symlink(link_dest, dst_name)
+
+    _copy_files(files, preserve_mode, preserve_times, update, verbose, dry_run, max_workers, store)
+
+    return outputs
+
+
+def _copy_tree_incremental(  # noqa: C901
+    src,
+    dst,
+    preserve_mode,
+    preserve_times,
+    preserve_symlinks,
+    verbose,
+    dry_run,
+    skip_non_regular_files,
+    max_workers,
+    manifest_path,
+    delete_orphans,
+    store,
+):
+    from ._manifest import Manifest, file_digest
+
+    dirs = []
+    links = []
+    files = []
+    outputs = []
+    _scan_tree(
+        src,
+        dst,
+        preserve_symlinks,
+        verbose,
+        dry_run,
+        skip_non_regular_files,
+        dirs,
+        links,
+        files,
+        outputs,
+    )
+
+    manifest = Manifest(manifest_path)
+    new_files = {}
+    new_links = {}
+    changed_files = []
+
+    for src_name, dst_name in files:
+        relative_path = os.path.relpath(dst_name, dst)
+        entry = manifest.files.get(relative_path)
+
+        try:
+            st = os.stat(src_name)
+        except OSError:
+            # Let copy_file() raise its usual error
+            changed_files.append((src_name, dst_name))
+            continue
+
+        if entry is not None and entry[:2] == (st.st_size, st.st_mtime_ns):
+            new_files[relative_path] = entry
+            continue
+
+        digest = None
+        if entry is not None and entry[0] == st.st_size:
+            # Only the mtime changed (e.g. extracted again from an archive), compare the contents
+            digest = file_digest(src_name)
+            old_digest = entry[2]
+            if old_digest is None:
+                try:
+                    old_digest = file_digest(dst_name)
+                except DistutilsFileError:
+                    pass
+
+            if digest == old_digest:
+                if verbose >= 1:
+                    LOGD("not copying %s (content unchanged)", src_name)
+                if preserve_times and not dry_run:
+                    os.utime(dst_name, (st.st_atime, st.st_mtime))
+                new_files[relative_path] = (st.st_size, st.st_mtime_ns, digest)
+                continue
+
+        changed_files.append((src_name, dst_name))
+        new_files[relative_path] = (st.st_size, st.st_mtime_ns, digest)
+
+    if not dry_run:
+        # Parents come before their children
+        for dir_name in dirs:
+            mkpath(dir_name, verbose=verbose)
+
+    for dst_name, link_dest in links:
+        relative_path = os.path.relpath(dst_name, dst)
+        new_links[relative_path] = link_dest
+
+        if manifest.links.get(relative_path) == link_dest:
+            continue
+
+        if verbose >= 1:
+            LOGI("linking %s -> %s", dst_name, link_dest)
+        if not dry_run:
+            if os.path.lexists(dst_name):
+                os.unlink(dst_name)
+            os.symlink(link_dest, dst_name)
+
+    _copy_files(
+        changed_files, preserve_mode, preserve_times, 0, verbose, dry_run, max_workers, store
+    )
+
+    orphans = [
+        relative_path
+        for relative_path in sorted({*manifest.files, *manifest.links})
+        if relative_path not in new_files and relative_path not in new_links
+    ]
+    orphan_dirs = set()
+    src_dirs = {os.path.normpath(dir_name) for dir_name in dirs}
+    for relative_path in orphans:
+        orphan = os.path.join(dst, relative_path)
+
+        if not delete_orphans:
+            LOGW("orphan %s (not in '%s' anymore)", orphan, src)
+            # Still ours, keep reporting it
+            if relative_path in manifest.files:
+                new_files[relative_path] = manifest.files[relative_path]
+            else:
+                new_links[relative_path] = manifest.links[relative_path]
+            continue
+
+        if verbose >= 1:
+            LOGI("removing orphan %s", orphan)
+        if not dry_run:
+            try:
+                os.unlink(orphan)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                raise DistutilsFileError(f"could not delete '{orphan}': {e.strerror}") from e
+
+        # Its parents, up to the first one that's still in 'src' ('dst' is)
+        parent = os.path.dirname(os.path.normpath(orphan))
+        while parent not in src_dirs and parent not in orphan_dirs:
+            orphan_dirs.add(parent)
+            parent = os.path.dirname(parent)
+
+    # Children first
+    for orphan_dir in sorted(orphan_dirs, key=len, reverse=True):
+        if verbose >= 1:
+            LOGI("removing orphan directory %s", orphan_dir)
+        if not dry_run:
+            try:
+                os.rmdir(orphan_dir)
+            except OSError:
+                # Not empty, it holds files that were never copied by us
+                pass
+
+    if not dry_run:
+        manifest.files = new_files
+        manifest.links = new_links
+        manifest.save()
+
+    return outputs
+
+
+def _copy_files(files, preserve_mode, preserve_times, update, verbose, dry_run, max_workers, store):
+    """Copy (src, dst) pairs with 'copy_file()', on a pool of
+    'max_workers' threads if given."""
+    from .file_util import copy_file
+
+    if max_workers is None:
+        for src_name, dst_name in files:
+            copy_file(
+                src_name,
+                dst_name,
+                preserve_mode,
+                preserve_times,
+                update,
+                link=_get_store_link(store),
+                verbose=verbose,
+                dry_run=dry_run,
+                store=store,
+            )
+        return
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = [
+            executor.submit(
+                copy_file,
+                src_name,
+                dst_name,
+                preserve_mode,
+                preserve_times,
+                update,
+                link=_get_store_link(store),
+                verbose=verbose,
+                dry_run=dry_run,
+                store=store,
+            )
+            for src_name, dst_name in files
+        ]
+
+        # Raise the error of the first failing file, like the serial copy would
+        for future in futures:
+            future.result()
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def _scan_tree(
+    src,
+    dst,
+    preserve_symlinks,
+    verbose,
+    dry_run,
+    skip_non_regular_files,
+    dirs,
+    links,
+    files,
+    outputs,
+):
+    """Walk 'src' like 'copy_tree()' does, collecting what has to be
+    created under 'dst' and the output names in the same order."""
+    try:
+        with os.scandir(src) as it:
+            entries = list(it)
+    except OSError as e:
+        if dry_run:
+            entries = []
+        else:
+            raise DistutilsFileError(f"error listing files in '{src}': {e.strerror}") from e
+
+    dirs.append(dst)
+
+    for entry in entries:
+        src_name = os.path.join(src, entry.name)
+        dst_name = os.path.join(dst, entry.name)
+
+        if entry.name.startswith(".nfs"):
+            # skip NFS rename files
+            continue
+
+        if preserve_symlinks and entry.is_symlink():
+            links.append((dst_name, os.readlink(src_name)))
+            outputs.append(dst_name)
+
+        elif entry.is_dir():
+            # Like copy_tree(), 'skip_non_regular_files' only applies to the top level
+            _scan_tree(
+                src_name,
+                dst_name,
+                preserve_symlinks,
+                verbose,
+                dry_run,
+                0,
+                dirs,
+                links,
+                files,
+                outputs,
+            )
+
+        elif skip_non_regular_files and not entry.is_file():
+            if verbose >= 1:
+                LOGI("skipping non-regular file %s", src_name)
+            continue
+
+        else:
+            files.append((src_name, dst_name))
+            outputs.append(dst_name)
+
+
+def _get_store_link(store):
+    # Files copied through a store are deduplicated as hard links to its objects
+    return "hard" if store is not None else None
@@ -4,6 +4,7 @@
 # SPDX-License-Identifier: MIT
 #
 
+import errno
 import os
 
 from sebaubuntu_libs.liblogging import LOGD, LOGI
@@ -13,11 +14,31 @@ from .errors import DistutilsFileError
 _copy_action = {None: "copying", "hard": "hard linking", "sym": "symbolically linking"}
 
 
-def _copy_file_contents(src, dst, buffer_size=16 * 1024):  # noqa: C901
+# FICLONE ioctl, from linux/fs.h
+_FICLONE = 0x40049409
+
+# Errors meaning that a copy method isn't supported for these files,
+# the next one is tried instead
+_UNSUPPORTED_ERRNOS = {
+    errno.EBADF,
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.ENOTSOCK,
+    errno.ENOTSUP,
+    errno.ENOTTY,
+    errno.EOPNOTSUPP,
+    errno.EPERM,
+    errno.EXDEV,
+}
+
+
+def _copy_file_contents(src, dst, buffer_size=1024 * 1024):  # noqa: C901
     """Copy the file 'src' to 'dst'; both must be filenames.  Any error
     opening either file, reading from 'src', or writing to 'dst', raises
-    DistutilsFileError.  Data is read/written in chunks of 'buffer_size'
-    bytes (default 16k).  No attempt is made to handle anything apart from
+    DistutilsFileError.  The kernel is asked to do the copy, trying in order
+    a reflink (FICLONE), os.copy_file_range() and os.sendfile(), the data is
+    read/written in chunks of 'buffer_size' bytes (default 1M) only if none
+    of them is supported.  No attempt is made to handle anything apart from
     regular files.
     """
     # Stolen from shutil module in the standard library, but with
@@ -26,7 +47,7 @@ def _copy_file_contents(src, dst, buffer_size=16 * 1024):  # noqa: C901
     fdst = None
     try:
         try:
-            fsrc = open(src, "rb")
+            fsrc = open(src, "rb", buffering=0)
         except OSError as e:
             raise DistutilsFileError(f"could not open '{src}': {e.strerror}")
 
@@ -37,13 +58,27 @@ def _copy_file_contents(src, dst, buffer_size=16 * 1024):  # noqa: C901
                 raise DistutilsFileError(f"could not delete '{dst}': {e.strerror}")
 
         try:
-            fdst = open(dst, "wb")
+            fdst = open(dst, "wb", buffering=0)
         except OSError as e:
             raise DistutilsFileError(f"could not create '{dst}': {e.strerror}")
 
+        infd = fsrc.fileno()
+        outfd = fdst.fileno()
+
+        if _reflink(infd, outfd):
+            return
+
+        # Each one gives up only if it couldn't copy anything
+        for copy_func in (_copy_file_range, _sendfile):
+            try:
+                if copy_func(infd, outfd):
+                    return
+            except OSError as e:
+                raise DistutilsFileError(f"could not copy '{src}' to '{dst}': {e.strerror}")
+
         while True:
             try:
-                buf = fsrc.read(buffer_size)
+                buf = os.read(infd, buffer_size)
             except OSError as e:
                 raise DistutilsFileError(f"could not read from '{src}': {e.strerror}")
 
@@ -51,7 +86,9 @@ def _copy_file_contents(src, dst, buffer_size=16 * 1024):  # noqa: C901
                 break
 
             try:
-                fdst.write(buf)
+                view = memoryview(buf)
+                while view:
+                    view = view[os.write(outfd, view) :]
             except OSError as e:
                 raise DistutilsFileError(f"could not write to '{dst}': {e.strerror}")
     finally:
@@ -61,6 +98,70 @@ def _copy_file_contents(src, dst, buffer_size=16 * 1024):  # noqa: C901
             fsrc.close()
 
 
+def _reflink(infd, outfd):
+    """Share the data blocks of 'infd' with 'outfd' (e.g. on Btrfs or XFS),
+    return whether it worked."""
+    try:
+        import fcntl
+    except ImportError:
+        return False
+
+    try:
+        fcntl.ioctl(outfd, _FICLONE, infd)
+    except OSError:
+        return False
+
+    return True
+
+
+def _get_block_size(infd):
+    # Same as shutil: at least 8M, at most 1G
+    try:
+        size = os.fstat(infd).st_size
+    except OSError:
+        size = 0
+
+    return min(max(size, 2**23), 2**30)
+
+
+def _copy_file_range(infd, outfd):
+    """Copy with os.copy_file_range() until EOF, return False if it isn't
+    supported before copying anything."""
+    if not hasattr(os, "copy_file_range"):
+        return False
+
+    return _copy_in_kernel(lambda count: os.copy_file_range(infd, outfd, count), infd)
+
+
+def _sendfile(infd, outfd):
+    """Copy with os.sendfile() until EOF, return False if it isn't supported
+    before copying anything."""
+    if not hasattr(os, "sendfile"):
+        return False
+
+    return _copy_in_kernel(lambda count: os.sendfile(outfd, infd, None, count), infd)
+
+
+def _copy_in_kernel(copy_func, infd):
+    block_size = _get_block_size(infd)
+    copied = 0
+
+    while True:
+        try:
+            sent = copy_func(block_size)
+        except OSError as e:
+            # Nothing written yet, let the caller try something else
+            if copied == 0 and e.errno in _UNSUPPORTED_ERRNOS:
+                return False
+            raise
+
+        if sent == 0:
+            # Some filesystems (e.g. procfs) report 0 without copying anything
+            return copied > 0 or os.fstat(infd).st_size == 0
+
+        copied += sent
+
+
 def copy_file(  # noqa: C901
     src,
     dst,
@@ -70,6 +171,7 @@ def copy_file(  # noqa: C901
     link=None,
     verbose=1,
     dry_run=0,
+    store=None,
 ):
     """Copy a file 'src' to 'dst'.  If 'dst' is a directory, then 'src' is
     copied there with the same name; otherwise, it must be a filename.  (If
@@ -88,8 +190,17 @@ def copy_file(  # noqa: C901
     linking is available. If hardlink fails, falls back to
     _copy_file_contents().
 
-    Under Mac OS, uses the native file copy function in macostools; on
-    other systems, uses '_copy_file_contents()' to copy file contents.
+    If 'store' is given (a 'libcas.ContentStore'), the contents of 'src'
+    are added to the store and 'dst' is materialized from it: with 'link'
+    set to "hard" it's a hard link to the stored object, sharing its
+    (read-only) mode and times, with "sym" it's a symbolic link to it and
+    otherwise it's a copy of it, with 'preserve_mode' and 'preserve_times'
+    applied like for any other copy.  Linked files must never be written
+    to, that would change the stored object for every file linked to it:
+    leave 'link' unset for files that will be modified.
+
+    Uses '_copy_file_contents()' to copy file contents, letting the kernel
+    do the copy (reflink, copy_file_range or sendfile) when possible.
 
     Return a tuple (dest_name, copied): 'dest_name' is the actual name of
     the output file, and 'copied' is true if the file was copied (or would
@@ -130,9 +241,24 @@ def copy_file(  # noqa: C901
         else:
             LOGI("%s %s -> %s", action, src, dst)
 
+    # Whether 'dst' already has the contents of 'src'
+    contents_copied = False
+
     if dry_run:
         return (dst, 1)
 
+    elif store is not None:
+        digest = store.add_file(src)
+        if link == "sym":
+            if os.path.lexists(dst):
+                os.unlink(dst)
+            os.symlink(store.get_object_path(digest), dst)
+            return (dst, 1)
+        if store.materialize(digest, dst, link=link):
+            return (dst, 1)
+        # Materialized as a copy, only the times and mode are left
+        contents_copied = True
+
     # If linking (hard or symbolic), use the appropriate system call
     # (Unix only, of course, but that's the caller's responsibility)
     elif link == "hard":
@@ -152,7 +278,8 @@ def copy_file(  # noqa: C901
 
     # Otherwise (non-Mac, not linking), copy the file contents and
     # (optionally) copy the times and mode.
-    _copy_file_contents(src, dst)
+    if not contents_copied:
+        _copy_file_contents(src, dst)
     if preserve_mode or preserve_times:
         st = os.stat(src)
 
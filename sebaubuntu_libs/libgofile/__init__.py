@@ -4,4 +4,56 @@
 #
 """gofile.io library."""
 
+from importlib import import_module
+from typing import TYPE_CHECKING, Any, List
+
+if TYPE_CHECKING:
+    from sebaubuntu_libs.libgofile.async_client import AsyncGoFileClient
+    from sebaubuntu_libs.libgofile.bulk import BulkOperations
+    from sebaubuntu_libs.libgofile.downloader import Downloader
+    from sebaubuntu_libs.libgofile.scheduler import RequestScheduler
+    from sebaubuntu_libs.libgofile.session import Session
+    from sebaubuntu_libs.libgofile.sync import sync_folder
+    from sebaubuntu_libs.libgofile.uploader import Uploader
+    from sebaubuntu_libs.libgofile.walker import walk
+
 DOMAIN = "gofile.io"
+
+# Attribute -> submodule, imported on first access so that importing
+# the package doesn't load requests and the rest of the client
+_LAZY_ATTRIBUTES = {
+    "AsyncGoFileClient": "async_client",
+    "BulkOperations": "bulk",
+    "Downloader": "downloader",
+    "RequestScheduler": "scheduler",
+    "Session": "session",
+    "sync_folder": "sync",
+    "Uploader": "uploader",
+    "walk": "walker",
+}
+
+__all__ = [
+    "DOMAIN",
+    "AsyncGoFileClient",
+    "BulkOperations",
+    "Downloader",
+    "RequestScheduler",
+    "Session",
+    "sync_folder",
+    "Uploader",
+    "walk",
+]
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(import_module(f"{__name__}.{_LAZY_ATTRIBUTES[name]}"), name)
+    globals()[name] = value
+
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted({*globals(), *_LAZY_ATTRIBUTES})
@@ -0,0 +1,220 @@
+#
+# SPDX-FileCopyrightText: Sebastiano Barezzi
+# SPDX-License-Identifier: Apache-2.0
+#
+
+import asyncio
+from datetime import datetime
+from pathlib import Path
+from sebaubuntu_libs.libgofile import raw_api
+from sebaubuntu_libs.libgofile.account import Account
+from sebaubuntu_libs.libgofile.contents import ContentResponse, Folder
+from sebaubuntu_libs.libgofile.raw_api.async_http import (
+    DEFAULT_MAX_CONNECTIONS_PER_HOST,
+    AsyncConnectionPool,
+)
+from sebaubuntu_libs.libgofile.raw_api.multipart import (
+    DEFAULT_CHUNK_SIZE,
+    MultipartEncoder,
+    UploadSource,
+)
+from sebaubuntu_libs.libgofile.raw_api.rest import process_response
+from typing import Any, AsyncIterator, Dict, Iterable, Optional, Union
+
+
+class AsyncGoFileClient:
+    """
+    asyncio GoFile API client.
+
+    Mirrors the functions of libgofile.utils, all the requests share one
+    pool of keep-alive connections, so hundreds of them can be in flight
+    from a single thread.
+
+    api_url and server_url default to the ones used by raw_api
+    and can be pointed to a local server for testing.
+    """
+
+    def __init__(
+        self,
+        api_url: Optional[str] = None,
+        server_url: Optional[str] = None,
+        pool: Optional[AsyncConnectionPool] = None,
+        max_connections_per_host: int = DEFAULT_MAX_CONNECTIONS_PER_HOST,
+    ):
+        self.api_url = api_url or raw_api.API_URL
+        self.server_url = server_url or raw_api.SERVER_URL
+        self.pool = pool or AsyncConnectionPool(max_connections_per_host=max_connections_per_host)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        await self.pool.close()
+
+    async def get_server(self) -> str:
+        """Returns the best server available to receive files."""
+        data = await self._request("GET", f"{self.api_url}/getServer")
+
+        return data["server"]
+
+    async def upload_file(
+        self,
+        file: Union[str, Path, UploadSource],
+        server: Optional[str] = None,
+        token: Optional[str] = None,
+        folder_id: Optional[str] = None,
+        description: Optional[str] = None,
+        password: Optional[str] = None,
+        tags: Optional[Iterable[str]] = None,
+        expire: Optional[datetime] = None,
+        filename: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Upload one file on a specific server.
+
+        The file is streamed like in raw_api.upload_file(), reads from
+        the source run in the default executor to not block the event loop.
+        """
+        if server is None:
+            server = await self.get_server()
+
+        params: Dict[str, Any] = {}
+        if token is not None:
+            params["token"] = token
+        if folder_id is not None:
+            params["folderId"] = folder_id
+        if description is not None:
+            params["description"] = description
+        if password is not None:
+            params["password"] = password
+        if tags:
+            params["tags"] = ",".join(tags)
+        if expire is not None:
+            params["expire"] = expire.timestamp()
+
+        url = f"{self.server_url.format(server=server)}/uploadFile"
+
+        if isinstance(file, (str, Path)):
+            with open(file, "rb") as f:
+                encoder = MultipartEncoder(f, filename=filename)
+                data = await self._upload(url, params, encoder)
+        else:
+            encoder = MultipartEncoder(file, filename=filename)
+            data = await self._upload(url, params, encoder)
+
+        remote_md5 = data.get("md5") if isinstance(data, dict) else None
+        if remote_md5 is not None and remote_md5 != encoder.md5_hexdigest:
+            raise Exception(
+                f"MD5 mismatch: uploaded {encoder.md5_hexdigest}, server has {remote_md5}"
+            )
+
+        return data
+
+    async def get_content(self, content_id: str, token: str) -> ContentResponse:
+        """Get a specific content details."""
+        params = {
+            "contentId": content_id,
+            "token": token,
+        }
+
+        data = await self._request("GET", f"{self.api_url}/getContent", params=params)
+
+        return ContentResponse.from_dict(data)
+
+    async def create_folder(self, parent_folder_id: str, folder_name: str, token: str) -> Folder:
+        """Create a new folder."""
+        data = {
+            "parentFolderId": parent_folder_id,
+            "folderName": folder_name,
+            "token": token,
+        }
+
+        response_data = await self._request("PUT", f"{self.api_url}/createFolder", data=data)
+
+        return Folder.from_dict(response_data)
+
+    async def copy_content(
+        self, contents_id: Iterable[str], folder_id_dest: str, token: str
+    ) -> bool:
+        """Copy one or multiple contents to another folder."""
+        data = {
+            "contentsId": ",".join(contents_id),
+            "folderIdDest": folder_id_dest,
+            "token": token,
+        }
+
+        await self._request("PUT", f"{self.api_url}/copyContent", data=data)
+
+        return True
+
+    async def delete_content(self, contents_id: Iterable[str], token: str) -> bool:
+        """Delete one or multiple files/folders."""
+        params = {
+            "contentsId": ",".join(contents_id),
+            "token": token,
+        }
+
+        await self._request("DELETE", f"{self.api_url}/deleteContent", params=params)
+
+        return True
+
+    async def get_account_details(self, token: str, all_details: bool = False) -> Dict[str, Any]:
+        """Get the raw account details."""
+        params = {
+            "token": token,
+        }
+        if all_details:
+            params["allDetails"] = "true"
+
+        return await self._request("GET", f"{self.api_url}/getAccountDetails", params=params)
+
+    async def get_account(self, token: str) -> Account:
+        """Get the account details."""
+        # As of now toggling all_details does nothing
+        data = await self.get_account_details(token, True)
+
+        return Account.from_dict(data)
+
+    async def _request(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        data: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> Any:
+        # Same as GoFileRequests._send_request
+        params = dict(params or {})
+        params["websiteToken"] = "websiteToken"
+        if data is not None:
+            data = dict(data)
+            data["websiteToken"] = "websiteToken"
+
+        response = await self.pool.request(method, url, params=params, data=data, **kwargs)
+
+        return process_response(response.json, response.status, response.headers.get("retry-after"))
+
+    async def _upload(self, url: str, params: Dict[str, Any], encoder: MultipartEncoder) -> Any:
+        return await self._request(
+            "POST",
+            url,
+            params=params,
+            body=_read_in_executor(encoder),
+            content_length=encoder.len,
+            headers={"Content-Type": encoder.content_type},
+        )
+
+
+async def _read_in_executor(
+    encoder: MultipartEncoder, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> AsyncIterator[bytes]:
+    loop = asyncio.get_running_loop()
+
+    while True:
+        chunk = await loop.run_in_executor(None, encoder.read, chunk_size)
+        if not chunk:
+            return
+        yield chunk
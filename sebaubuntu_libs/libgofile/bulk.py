@@ -0,0 +1,280 @@
+#
+# SPDX-FileCopyrightText: Sebastiano Barezzi
+# SPDX-License-Identifier: Apache-2.0
+#
+
+from concurrent.futures import ThreadPoolExecutor
+from sebaubuntu_libs.libgofile import raw_api
+from sebaubuntu_libs.libgofile.raw_api.rest import GoFileError, GoFileRateLimitError
+from sebaubuntu_libs.libgofile.utils import get_content
+from sebaubuntu_libs.liblogging import LOGD, LOGW
+from threading import Lock
+from time import sleep
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# GoFile doesn't document a limit, stay well under the usual URL length limits
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_MAX_BATCH_LENGTH = 4000
+
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_RETRIES = 3
+DEFAULT_RETRY_BACKOFF = 1.0
+
+# API errors that a single ID can cause, the batch is split to find it
+CONTENT_ERROR_STATUSES = ["error-notFound", "error-notPermitted"]
+# API errors about the token or the destination, every other batch would fail the same way
+FATAL_ERROR_STATUSES = ["error-notFolder", "error-notPremium", "error-wrongToken"]
+
+
+def plan_batches(
+    contents_id: Iterable[str],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_batch_length: int = DEFAULT_MAX_BATCH_LENGTH,
+) -> List[List[str]]:
+    """
+    Split content IDs in batches, dropping duplicates.
+
+    Each batch has at most batch_size IDs and, once comma-joined,
+    at most max_batch_length characters (unless a single ID is longer).
+    """
+    batches: List[List[str]] = []
+    batch: List[str] = []
+    batch_length = 0
+
+    for content_id in dict.fromkeys(contents_id):
+        length = len(content_id) + (1 if batch else 0)
+        if batch and (len(batch) >= batch_size or batch_length + length > max_batch_length):
+            batches.append(batch)
+            batch = []
+            length = len(content_id)
+            batch_length = 0
+
+        batch.append(content_id)
+        batch_length += length
+
+    if batch:
+        batches.append(batch)
+
+    return batches
+
+
+class BulkResult:
+    """The outcome of a bulk operation, per content ID."""
+
+    def __init__(self):
+        self.succeeded: List[str] = []
+        self.failed: Dict[str, Exception] = {}
+        # The error that stopped the whole operation, if any
+        self.error: Optional[Exception] = None
+
+        self._lock = Lock()
+
+    def __bool__(self):
+        return not self.failed
+
+    def add_succeeded(self, contents_id: Iterable[str]):
+        with self._lock:
+            self.succeeded.extend(contents_id)
+
+    def add_failed(self, content_id: str, error: Exception):
+        with self._lock:
+            self.failed[content_id] = error
+
+    def set_error(self, error: Exception):
+        with self._lock:
+            if self.error is None:
+                self.error = error
+
+
+class BulkOperations:
+    """
+    Copy and delete many contents with batched, concurrent API calls.
+
+    IDs are split with plan_batches() and up to max_workers batches run at a time.
+    Throttling is retried with exponential backoff (or after the Retry-After
+    the server asked for), network errors too, except for copies: a copy
+    that may have happened isn't sent again, so it's never duplicated.
+    When a batch fails because of an ID (CONTENT_ERROR_STATUSES) it is split
+    in half until the failing IDs are found, so one bad ID doesn't fail the
+    whole operation and errors are reported per ID. Token and destination
+    errors (FATAL_ERROR_STATUSES) stop the operation, the batches not sent
+    yet fail with the same error, also saved in BulkResult.error.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_batch_length: int = DEFAULT_MAX_BATCH_LENGTH,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        retries: int = DEFAULT_RETRIES,
+        retry_backoff: float = DEFAULT_RETRY_BACKOFF,
+    ):
+        self.token = token
+        self.batch_size = batch_size
+        self.max_batch_length = max_batch_length
+        self.max_workers = max_workers
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+
+    def copy(self, contents_id: Iterable[str], folder_id_dest: str) -> BulkResult:
+        """Copy contents to another folder."""
+
+        def copy_batch(batch: List[str]) -> Any:
+            return raw_api.copy_content(",".join(batch), folder_id_dest, self.token)
+
+        # error-notFound can also mean that the destination doesn't exist,
+        # check it once before splitting batches looking for the missing IDs
+        destination_lock = Lock()
+        destination_checked = False
+
+        def check_destination():
+            nonlocal destination_checked
+
+            with destination_lock:
+                if not destination_checked:
+                    raw_api.get_content(folder_id_dest, self.token)
+                    destination_checked = True
+
+        return self._run(
+            contents_id, copy_batch, idempotent=False, check_before_split=check_destination
+        )
+
+    def delete(self, contents_id: Iterable[str]) -> BulkResult:
+        """Delete contents."""
+
+        def delete_batch(batch: List[str]) -> Any:
+            return raw_api.delete_content(",".join(batch), self.token)
+
+        return self._run(contents_id, delete_batch)
+
+    def empty_folder(self, folder_id: str) -> BulkResult:
+        """Delete everything inside a folder, subfolders included."""
+        content = get_content(folder_id, self.token)
+
+        return self.delete(content.contents.keys())
+
+    def _run(
+        self,
+        contents_id: Iterable[str],
+        func: Callable[[List[str]], Any],
+        idempotent: bool = True,
+        check_before_split: Optional[Callable[[], Any]] = None,
+    ) -> BulkResult:
+        batches = plan_batches(
+            contents_id, batch_size=self.batch_size, max_batch_length=self.max_batch_length
+        )
+        result = BulkResult()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for batch in batches:
+                executor.submit(
+                    self._run_batch, batch, func, result, idempotent, check_before_split
+                )
+
+        return result
+
+    def _run_batch(
+        self,
+        batch: List[str],
+        func: Callable[[List[str]], Any],
+        result: BulkResult,
+        idempotent: bool,
+        check_before_split: Optional[Callable[[], Any]],
+    ):
+        if result.error is not None:
+            for content_id in batch:
+                result.add_failed(content_id, result.error)
+            return
+
+        try:
+            data = self._call_with_retries(batch, func, idempotent)
+        except Exception as e:
+            error = e
+            fatal = _is_error_status(error, FATAL_ERROR_STATUSES)
+
+            if len(batch) > 1 and _is_error_status(error, CONTENT_ERROR_STATUSES):
+                try:
+                    if check_before_split is not None:
+                        check_before_split()
+                except Exception as check_error:
+                    # Not about the IDs after all
+                    error = check_error
+                    fatal = True
+                else:
+                    LOGD(f"Batch of {len(batch)} failed, splitting it: {error}")
+                    middle = len(batch) // 2
+                    self._run_batch(batch[:middle], func, result, idempotent, check_before_split)
+                    self._run_batch(batch[middle:], func, result, idempotent, check_before_split)
+                    return
+
+            if fatal:
+                result.set_error(error)
+
+            if len(batch) == 1:
+                LOGW(f"Operation on {batch[0]} failed: {error}")
+            else:
+                LOGW(f"Operation on {len(batch)} contents failed: {error}")
+
+            for content_id in batch:
+                result.add_failed(content_id, error)
+            return
+
+        # Some endpoints (e.g. deleteContent) report a status for each ID
+        succeeded = []
+        for content_id in batch:
+            status = data.get(content_id) if isinstance(data, dict) else None
+            if isinstance(status, dict) and status.get("status", "ok") != "ok":
+                result.add_failed(content_id, Exception(f"Error: {status['status']}"))
+            else:
+                succeeded.append(content_id)
+
+        result.add_succeeded(succeeded)
+
+    def _call_with_retries(
+        self, batch: List[str], func: Callable[[List[str]], Any], idempotent: bool
+    ) -> Any:
+        from requests import RequestException
+
+        retries = 0
+
+        while True:
+            backoff = self.retry_backoff * 2**retries
+
+            try:
+                return func(batch)
+            except (RequestException, GoFileRateLimitError) as e:
+                # API errors won't change by retrying, network ones and throttling might.
+                # After a network error the server may have done it already
+                if retries >= self.retries or (
+                    not idempotent and not isinstance(e, GoFileRateLimitError)
+                ):
+                    raise
+
+                if isinstance(e, GoFileRateLimitError) and e.retry_after is not None:
+                    backoff = e.retry_after
+
+                LOGD(f"Retrying batch of {len(batch)}: {e}")
+
+            sleep(backoff)
+            retries += 1
+
+
+def _is_error_status(error: Exception, statuses: List[str]) -> bool:
+    return (
+        isinstance(error, GoFileError)
+        and not isinstance(error, GoFileRateLimitError)
+        and error.status in statuses
+    )
+
+
+def bulk_copy(
+    contents_id: Iterable[str], folder_id_dest: str, token: str, **kwargs: Any
+) -> BulkResult:
+    """Copy many contents to another folder, see BulkOperations."""
+    return BulkOperations(token, **kwargs).copy(contents_id, folder_id_dest)
+
+
+def bulk_delete(contents_id: Iterable[str], token: str, **kwargs: Any) -> BulkResult:
+    """Delete many contents, see BulkOperations."""
+    return BulkOperations(token, **kwargs).delete(contents_id)
@@ -3,25 +3,46 @@
 # SPDX-License-Identifier: Apache-2.0
 #
 
+from array import array
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+# Contents are built from the API data once, with slots, and the fields
+# that need decoding are decoded on first access
 
 
 class Content:
+    __slots__ = (
+        "content_id",
+        "content_type",
+        "name",
+        "parent_folder",
+        "_create_time",
+    )
+
     def __init__(
         self,
         content_id: str,
         content_type: str,
         name: str,
-        parent_folder: str,
-        create_time: datetime,
+        # Root folders don't have a parent folder
+        parent_folder: Optional[str],
+        # A datetime or a UNIX timestamp
+        create_time: Union[datetime, int, float],
     ):
         """Initialize a GoFile content."""
         self.content_id = content_id
         self.content_type = content_type
         self.name = name
         self.parent_folder = parent_folder
-        self.create_time = create_time
+        self._create_time = create_time
+
+    @property
+    def create_time(self) -> datetime:
+        if not isinstance(self._create_time, datetime):
+            self._create_time = datetime.fromtimestamp(self._create_time)
+
+        return self._create_time
 
     def get_kwargs(self) -> Dict[str, Any]:
         return {
@@ -32,22 +53,35 @@ class Content:
             "create_time": self.create_time,
         }
 
-    @staticmethod
-    def from_dict(data: Dict[str, Any]):
-        create_time = datetime.fromtimestamp(data["createTime"])
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]):
+        content = cls.__new__(cls)
+        content._load(data)
+
+        return content
 
-        return Content(
-            content_id=data["id"],
-            content_type=data["type"],
-            name=data["name"],
-            parent_folder=data["parentFolder"],
-            create_time=create_time,
-        )
+    def _load(self, data: Dict[str, Any]):
+        """Set the fields from the API data, each subclass sets its own."""
+        self.content_id = data["id"]
+        self.content_type = data["type"]
+        self.name = data["name"]
+        self.parent_folder = data.get("parentFolder")
+        self._create_time = data["createTime"]
 
 
 class File(Content):
     """Class representing a GoFile file."""
 
+    __slots__ = (
+        "size",
+        "download_count",
+        "md5",
+        "mimetype",
+        "server_choosen",
+        "direct_link",
+        "link",
+    )
+
     def __init__(
         self,
         size: int,
@@ -84,25 +118,27 @@ class File(Content):
 
         return kwargs
 
-    @staticmethod
-    def from_dict(data: Dict[str, Any]):
-        content = Content.from_dict(data)
+    def _load(self, data: Dict[str, Any]):
+        super()._load(data)
 
-        return File(
-            size=data["size"],
-            download_count=data["downloadCount"],
-            md5=data["md5"],
-            mimetype=data["mimetype"],
-            server_choosen=data["serverChoosen"],
-            direct_link=data["directLink"],
-            link=data["link"],
-            **content.get_kwargs(),
-        )
+        self.size = data["size"]
+        self.download_count = data["downloadCount"]
+        self.md5 = data["md5"]
+        self.mimetype = data["mimetype"]
+        self.server_choosen = data["serverChoosen"]
+        self.direct_link = data["directLink"]
+        self.link = data["link"]
 
 
 class Folder(Content):
     """Class representing a GoFile folder."""
 
+    __slots__ = (
+        "childs",
+        "code",
+        "public",
+    )
+
     def __init__(
         self,
         childs: List[str],
@@ -127,18 +163,12 @@ class Folder(Content):
 
         return kwargs
 
-    @staticmethod
-    def from_dict(data: Dict[str, Any]) -> "Folder":
-        content = Content.from_dict(data)
-
-        public = data.get("public", False)
+    def _load(self, data: Dict[str, Any]):
+        super()._load(data)
 
-        return Folder(
-            childs=data["childs"],
-            code=data["code"],
-            public=public,
-            **content.get_kwargs(),
-        )
+        self.childs = data["childs"]
+        self.code = data["code"]
+        self.public = data.get("public", False)
 
 
 class ContentResponse(Folder):
@@ -146,6 +176,14 @@ class ContentResponse(Folder):
 
     As of now all contents returned by get_content are folders."""
 
+    __slots__ = (
+        "total_download_count",
+        "total_size",
+        "contents",
+        "owner_id",
+        "is_root",
+    )
+
     def __init__(
         self,
         total_download_count: int,
@@ -161,29 +199,90 @@ class ContentResponse(Folder):
         **kwargs: Any,
     ):
         """Initialize a GoFile content."""
-        super().__init__(*args, **kwargs)
+        super().__init__(*args, parent_folder=parent_folder, **kwargs)
 
         self.total_download_count = total_download_count
         self.total_size = total_size
         self.contents = contents
         self.owner_id = owner_id
-        self.parent_folder = parent_folder
         self.is_root = is_root
 
-    @staticmethod
-    def from_dict(data: Dict[str, Any]) -> "ContentResponse":
-        folder = Folder.from_dict(data)
-
-        owner_id = data.get("ownerId")
-        parent_folder = data.get("parentFolder")
-        is_root = data.get("isRoot", False)
-
-        return ContentResponse(
-            total_download_count=data["totalDownloadCount"],
-            total_size=data["totalSize"],
-            contents=data["contents"],
-            owner_id=owner_id,
-            parent_folder=parent_folder,
-            is_root=is_root,
-            **folder.get_kwargs(),
-        )
+    def get_contents(self) -> List[Content]:
+        """Get the contents of this folder as File and Folder objects."""
+        return [content_from_dict(data) for data in self.contents.values()]
+
+    def get_listing(self) -> "ContentListing":
+        """Get the contents of this folder as a ContentListing."""
+        return ContentListing(self.contents)
+
+    def _load(self, data: Dict[str, Any]):
+        super()._load(data)
+
+        # Kept as returned by the API, see get_contents() and get_listing()
+        self.total_download_count = data["totalDownloadCount"]
+        self.total_size = data["totalSize"]
+        self.contents = data["contents"]
+        self.owner_id = data.get("ownerId")
+        self.is_root = data.get("isRoot", False)
+
+
+class ContentListing:
+    """
+    Columnar view of the contents of a folder.
+
+    The fields needed to list and filter contents are kept in one list
+    (or array) per field instead of one object per content, File and Folder
+    objects are only built for the entries that are accessed.
+    """
+
+    __slots__ = (
+        "content_ids",
+        "names",
+        "is_folder",
+        "sizes",
+        "md5s",
+        "_records",
+    )
+
+    def __init__(self, contents: Dict[str, Dict[str, Any]]):
+        self._records = list(contents.values())
+
+        self.content_ids: List[str] = [record["id"] for record in self._records]
+        self.names: List[str] = [record["name"] for record in self._records]
+        self.is_folder = array("b", [record["type"] == "folder" for record in self._records])
+        # 0 for folders
+        self.sizes = array("q", [record.get("size", 0) for record in self._records])
+        # None for folders
+        self.md5s: List[Optional[str]] = [record.get("md5") for record in self._records]
+
+    def __len__(self):
+        return len(self._records)
+
+    def __getitem__(self, index: int) -> Content:
+        return content_from_dict(self._records[index])
+
+    def __iter__(self) -> Iterator[Content]:
+        for record in self._records:
+            yield content_from_dict(record)
+
+    @property
+    def total_size(self) -> int:
+        return sum(self.sizes)
+
+    def files(self) -> Iterator[File]:
+        for index, is_folder in enumerate(self.is_folder):
+            if not is_folder:
+                yield File.from_dict(self._records[index])
+
+    def folders(self) -> Iterator[Folder]:
+        for index, is_folder in enumerate(self.is_folder):
+            if is_folder:
+                yield Folder.from_dict(self._records[index])
+
+
+def content_from_dict(data: Dict[str, Any]) -> Content:
+    """Create a File or a Folder from a content dict, based on its type."""
+    if data["type"] == "folder":
+        return Folder.from_dict(data)
+
+    return File.from_dict(data)
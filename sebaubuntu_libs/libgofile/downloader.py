@@ -0,0 +1,361 @@
+#
+# SPDX-FileCopyrightText: Sebastiano Barezzi
+# SPDX-License-Identifier: Apache-2.0
+#
+
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from hashlib import md5
+from json import dump, load
+import os
+from pathlib import Path
+from sebaubuntu_libs.libgofile.contents import File
+from sebaubuntu_libs.libgofile.raw_api.rest import GoFileRequests
+from sebaubuntu_libs.liblogging import LOGD, LOGW
+from threading import Event, Lock
+from time import sleep
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple, Union
+
+if TYPE_CHECKING:
+    from requests import Session
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_PART_SIZE = 16 * 1024 * 1024
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+DEFAULT_RETRIES = 3
+DEFAULT_RETRY_BACKOFF = 1.0
+
+# Appended to the output path
+STATE_SUFFIX = ".state"
+
+STATE_VERSION = 1
+
+
+class _RangesNotSupportedError(Exception):
+    """The server answered a ranged request with the whole file."""
+
+
+class _DownloadState:
+    """Which parts of a download are done, saved next to the output to resume it."""
+
+    def __init__(self, path: Path, url: str, size: int, part_size: int):
+        self.path = path
+        self.url = url
+        self.size = size
+        self.part_size = part_size
+
+        # (start, end) of every part, end excluded
+        self.parts: List[Tuple[int, int]] = [
+            (start, min(start + part_size, size)) for start in range(0, size, part_size)
+        ]
+        self.done: Set[int] = set()
+
+        self._lock = Lock()
+
+    def load(self, output: Path):
+        """Load the done parts, if the state matches this download and the output is intact."""
+        if not self.path.is_file() or not output.is_file():
+            return
+
+        try:
+            with self.path.open() as f:
+                data = load(f)
+        except (OSError, ValueError) as e:
+            LOGW(f"Ignoring invalid download state {self.path}: {e}")
+            return
+
+        if data != {**data, **self._get_header()}:
+            LOGD(f"Download state {self.path} is for another download, starting over")
+            return
+
+        if output.stat().st_size != self.size:
+            return
+
+        self.done = set(data.get("done", []))
+
+    def mark_done(self, index: int):
+        with self._lock:
+            self.done.add(index)
+            self._save()
+
+    def remove(self):
+        self.path.unlink(missing_ok=True)
+
+    def _save(self):
+        data = self._get_header()
+        data["done"] = sorted(self.done)
+
+        # Never leave a truncated state behind
+        tmp_path = self.path.with_name(f"{self.path.name}.tmp")
+        with tmp_path.open("w") as f:
+            dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def _get_header(self) -> Dict[str, Any]:
+        return {
+            "version": STATE_VERSION,
+            "url": self.url,
+            "size": self.size,
+            "part_size": self.part_size,
+        }
+
+
+class _MD5Cursor:
+    """
+    MD5 of the output, computed in order while parts complete out of order.
+
+    Done parts are hashed as soon as all the ones before them are done,
+    reading them back while they are still in the page cache.
+    """
+
+    def __init__(self, fd: int, parts: List[Tuple[int, int]], chunk_size: int):
+        self.fd = fd
+        self.parts = parts
+        self.chunk_size = chunk_size
+
+        self.hash = md5()
+        self.next_part = 0
+
+        self._lock = Lock()
+
+    def advance(self, done: Set[int], block: bool = False):
+        """Hash the parts that can be hashed, unless another thread is already doing it."""
+        if not self._lock.acquire(blocking=block):
+            return
+
+        try:
+            while self.next_part < len(self.parts) and self.next_part in done:
+                start, end = self.parts[self.next_part]
+                for offset in range(start, end, self.chunk_size):
+                    self.hash.update(os.pread(self.fd, min(self.chunk_size, end - offset), offset))
+                self.next_part += 1
+        finally:
+            self._lock.release()
+
+    def hexdigest(self) -> str:
+        return self.hash.hexdigest()
+
+
+class Downloader:
+    """
+    Download files with parallel ranged requests.
+
+    Files are split in parts of part_size bytes, fetched by up to max_workers
+    threads over the shared pooled session and written straight in place into
+    the preallocated output. The done parts are recorded in a sidecar state file
+    (output + STATE_SUFFIX), so an interrupted download resumes where it was left.
+    The MD5 is computed while downloading and checked against the expected one.
+    """
+
+    def __init__(
+        self,
+        token: Optional[str] = None,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        part_size: int = DEFAULT_PART_SIZE,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        retries: int = DEFAULT_RETRIES,
+        retry_backoff: float = DEFAULT_RETRY_BACKOFF,
+        session: Optional["Session"] = None,
+    ):
+        self.token = token
+        self.max_workers = max_workers
+        self.part_size = part_size
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.session = session
+
+    def download_file(
+        self,
+        file: Union[File, str],
+        output: Union[str, Path],
+        size: Optional[int] = None,
+        md5_hexdigest: Optional[str] = None,
+    ) -> Path:
+        """
+        Download a file (or a direct link) to output.
+
+        size and md5_hexdigest are taken from the File if not given,
+        without a size the server is asked for it, without an MD5 the result isn't verified.
+        """
+        output = Path(output)
+
+        if isinstance(file, File):
+            url = file.direct_link
+            if size is None:
+                size = file.size
+            if md5_hexdigest is None:
+                md5_hexdigest = file.md5
+        else:
+            url = file
+
+        supports_ranges = True
+        if size is None:
+            size, supports_ranges = self._get_remote_info(url)
+
+        if not supports_ranges or size is None:
+            return self._download_single(url, output, md5_hexdigest)
+
+        state = _DownloadState(
+            output.with_name(f"{output.name}{STATE_SUFFIX}"), url, size, self.part_size
+        )
+        state.load(output)
+        if state.done:
+            LOGD(f"Resuming download of {output}, {len(state.done)}/{len(state.parts)} parts done")
+
+        fd = os.open(output, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, size)
+
+            cursor = _MD5Cursor(fd, state.parts, self.chunk_size)
+            self._download_parts(url, fd, state, cursor)
+            cursor.advance(state.done, block=True)
+        except _RangesNotSupportedError as e:
+            # The size came from the File, the server was never asked about ranges
+            LOGD(f"{e}, downloading {url} in a single request")
+            state.remove()
+            return self._download_single(url, output, md5_hexdigest)
+        finally:
+            os.close(fd)
+
+        if md5_hexdigest is not None and cursor.hexdigest() != md5_hexdigest:
+            # The data is bad, don't resume from it
+            state.remove()
+            raise Exception(
+                f"MD5 mismatch for {output}: expected {md5_hexdigest}, got {cursor.hexdigest()}"
+            )
+
+        state.remove()
+
+        return output
+
+    def _get_session(self) -> "Session":
+        return self.session or GoFileRequests.get_session()
+
+    def _get_cookies(self) -> Dict[str, str]:
+        return {"accountToken": self.token} if self.token is not None else {}
+
+    def _get_remote_info(self, url: str) -> Tuple[Optional[int], bool]:
+        response = self._get_session().head(url, cookies=self._get_cookies(), allow_redirects=True)
+        response.raise_for_status()
+
+        content_length = response.headers.get("Content-Length")
+        size = int(content_length) if content_length is not None else None
+        supports_ranges = response.headers.get("Accept-Ranges", "").lower() == "bytes"
+
+        return size, supports_ranges
+
+    def _download_parts(self, url: str, fd: int, state: _DownloadState, cursor: _MD5Cursor):
+        stop = Event()
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            futures = [
+                executor.submit(self._download_part, url, fd, state, cursor, index, stop)
+                for index in range(len(state.parts))
+                if index not in state.done
+            ]
+
+            done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+            for future in done:
+                # Raise the first error, the done parts are kept in the state
+                future.result()
+        finally:
+            stop.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _download_part(
+        self,
+        url: str,
+        fd: int,
+        state: _DownloadState,
+        cursor: _MD5Cursor,
+        index: int,
+        stop: Event,
+    ):
+        start, end = state.parts[index]
+        offset = start
+        retries = 0
+
+        while True:
+            try:
+                offset = self._fetch_range(url, fd, offset, end, stop)
+            except _RangesNotSupportedError:
+                # Asking again won't help
+                raise
+            except Exception as e:
+                if stop.is_set() or retries >= self.retries:
+                    raise
+
+                LOGD(f"Retrying bytes {offset}-{end - 1} of {url}: {e}")
+                sleep(self.retry_backoff * 2**retries)
+                retries += 1
+                continue
+
+            if offset >= end or stop.is_set():
+                break
+
+        if offset >= end:
+            state.mark_done(index)
+            cursor.advance(state.done)
+
+    def _fetch_range(self, url: str, fd: int, start: int, end: int, stop: Event) -> int:
+        """Write the bytes from start to end, return where it got to."""
+        headers = {"Range": f"bytes={start}-{end - 1}"}
+
+        with self._get_session().get(
+            url, headers=headers, cookies=self._get_cookies(), stream=True
+        ) as response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise _RangesNotSupportedError(
+                    f"Server ignored the range request, status {response.status_code}"
+                )
+
+            offset = start
+            for chunk in response.iter_content(self.chunk_size):
+                if stop.is_set():
+                    break
+
+                chunk = chunk[: end - offset]
+                os.pwrite(fd, chunk, offset)
+                offset += len(chunk)
+
+                if offset >= end:
+                    break
+
+        if offset < end and not stop.is_set():
+            raise Exception(f"Connection closed at byte {offset}, expected {end}")
+
+        return offset
+
+    def _download_single(self, url: str, output: Path, md5_hexdigest: Optional[str]) -> Path:
+        """Fallback for servers not supporting ranges, no resume."""
+        hash = md5()
+
+        with self._get_session().get(url, cookies=self._get_cookies(), stream=True) as response:
+            response.raise_for_status()
+
+            with output.open("wb") as f:
+                for chunk in response.iter_content(self.chunk_size):
+                    hash.update(chunk)
+                    f.write(chunk)
+
+        if md5_hexdigest is not None and hash.hexdigest() != md5_hexdigest:
+            raise Exception(
+                f"MD5 mismatch for {output}: expected {md5_hexdigest}, got {hash.hexdigest()}"
+            )
+
+        return output
+
+
+def download_file(
+    file: Union[File, str],
+    output: Union[str, Path],
+    token: Optional[str] = None,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    **kwargs: Any,
+) -> Path:
+    """Download a file with parallel ranged requests, see Downloader."""
+    downloader = Downloader(token=token, max_workers=max_workers)
+
+    return downloader.download_file(file, output, **kwargs)
@@ -4,8 +4,8 @@
 #
 
 from datetime import datetime
-from io import BytesIO
 from sebaubuntu_libs.libgofile import DOMAIN
+from sebaubuntu_libs.libgofile.raw_api.multipart import MultipartEncoder, UploadSource
 from sebaubuntu_libs.libgofile.raw_api.rest import GoFileRequests
 from typing import Optional
 
@@ -21,6 +21,7 @@ __all__ = [
 ]
 
 API_URL = f"https://api.{DOMAIN}"
+SERVER_URL = f"https://{{server}}.{DOMAIN}"
 
 
 def get_server():
@@ -30,15 +31,23 @@ def get_server():
 
 def upload_file(
     server: str,
-    file: BytesIO,
+    file: UploadSource,
     token: Optional[str] = None,
     folder_id: Optional[str] = None,
     description: Optional[str] = None,
     password: Optional[str] = None,
     tags: Optional[str] = None,
     expire: Optional[datetime] = None,
+    filename: Optional[str] = None,
+    size: Optional[int] = None,
 ):
-    """Upload one file on a specific server."""
+    """
+    Upload one file on a specific server.
+
+    The file is streamed in chunks, it can be any binary file-like object
+    or an iterable of bytes. Its MD5 is computed while uploading and checked
+    against the one returned by the server.
+    """
     params = {}
     if token is not None:
         params["token"] = token
@@ -53,9 +62,20 @@ def upload_file(
     if expire is not None:
         params["expire"] = expire.timestamp()
 
-    files = {"file": file}
+    encoder = MultipartEncoder(file, filename=filename, size=size)
+
+    data = GoFileRequests.post(
+        f"{SERVER_URL.format(server=server)}/uploadFile",
+        params=params,
+        data=encoder,
+        headers={"Content-Type": encoder.content_type},
+    )
+
+    remote_md5 = data.get("md5") if isinstance(data, dict) else None
+    if remote_md5 is not None and remote_md5 != encoder.md5_hexdigest:
+        raise Exception(f"MD5 mismatch: uploaded {encoder.md5_hexdigest}, server has {remote_md5}")
 
-    return GoFileRequests.post(f"{server}.{DOMAIN}/uploadFile", params=params, files=files)
+    return data
 
 
 def get_content(content_id: str, token: str):
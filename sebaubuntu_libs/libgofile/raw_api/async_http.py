@@ -0,0 +1,351 @@
+#
+# SPDX-FileCopyrightText: Sebastiano Barezzi
+# SPDX-License-Identifier: Apache-2.0
+#
+"""Minimal asyncio HTTP/1.1 client with keep-alive connection pooling."""
+
+import asyncio
+from collections import deque
+from json import loads
+from ssl import SSLContext, create_default_context
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Deque,
+    Dict,
+    Mapping,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+)
+from urllib.parse import urlencode, urlsplit
+
+DEFAULT_MAX_CONNECTIONS_PER_HOST = 100
+DEFAULT_TIMEOUT = 300.0
+DEFAULT_RETRIES = 5
+DEFAULT_BACKOFF_FACTOR = 0.5
+RETRY_STATUS_FORCELIST = [429, 500, 502, 503, 504]
+# No PUT, the API uses it to create folders and copy content, which aren't idempotent
+IDEMPOTENT_METHODS = ["DELETE", "GET", "HEAD", "OPTIONS", "TRACE"]
+
+USER_AGENT = "sebaubuntu_libs"
+
+Body = Union[bytes, AsyncIterator[bytes]]
+# (scheme, host, port)
+ConnectionKey = Tuple[str, str, int]
+
+T = TypeVar("T")
+
+
+class AsyncHTTPResponse:
+    """A fully read HTTP response."""
+
+    def __init__(self, status: int, reason: str, headers: Dict[str, str], content: bytes):
+        self.status = status
+        self.reason = reason
+        # Header names are lowercase
+        self.headers = headers
+        self.content = content
+
+    def json(self) -> Any:
+        return loads(self.content)
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise AsyncHTTPError(f"{self.status} {self.reason}", self)
+
+
+class AsyncHTTPError(Exception):
+    def __init__(self, message: str, response: AsyncHTTPResponse):
+        super().__init__(message)
+
+        self.response = response
+
+
+class _Connection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    def is_usable(self) -> bool:
+        return not self.writer.is_closing() and not self.reader.at_eof()
+
+    def close(self):
+        self.writer.close()
+
+
+class AsyncConnectionPool:
+    """
+    Keep-alive HTTP/1.1 connections, pooled per host.
+
+    Each host gets at most max_connections_per_host connections at a time,
+    requests over the limit wait for a free connection. Idle connections
+    are reused, requests with idempotent methods are retried with
+    exponential backoff on 429/5xx answers and connection errors.
+    timeout limits each connect, write and read, not the whole request,
+    so long uploads only fail if the connection stalls.
+    """
+
+    def __init__(
+        self,
+        max_connections_per_host: int = DEFAULT_MAX_CONNECTIONS_PER_HOST,
+        timeout: Optional[float] = DEFAULT_TIMEOUT,
+        retries: int = DEFAULT_RETRIES,
+        backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+        ssl_context: Optional[SSLContext] = None,
+    ):
+        self.max_connections_per_host = max_connections_per_host
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.ssl_context = ssl_context
+
+        self._semaphores: Dict[ConnectionKey, asyncio.Semaphore] = {}
+        self._idle: Dict[ConnectionKey, Deque[_Connection]] = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        """Close all the idle connections."""
+        connections = [connection for idle in self._idle.values() for connection in idle]
+        self._idle.clear()
+
+        for connection in connections:
+            connection.close()
+
+        for connection in connections:
+            try:
+                await connection.writer.wait_closed()
+            except Exception:
+                pass
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Mapping[str, Any]] = None,
+        data: Optional[Mapping[str, Any]] = None,
+        body: Optional[Body] = None,
+        content_length: Optional[int] = None,
+        headers: Optional[Mapping[str, str]] = None,
+    ) -> AsyncHTTPResponse:
+        """
+        Send a request and read the whole response.
+
+        data is sent form-encoded, body can be bytes or an async iterator of
+        bytes, sent with content_length if given, else with chunked encoding.
+        Streamed bodies are never retried.
+        """
+        method = method.upper()
+
+        split_url = urlsplit(url)
+        if split_url.scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported URL: {url}")
+
+        host = split_url.hostname or ""
+        port = split_url.port or (443 if split_url.scheme == "https" else 80)
+        key = (split_url.scheme, host, port)
+
+        target = split_url.path or "/"
+        query = split_url.query
+        if params:
+            query = f"{query}&{urlencode(params)}" if query else urlencode(params)
+        if query:
+            target += f"?{query}"
+
+        request_headers = {
+            "Host": split_url.netloc,
+            "User-Agent": USER_AGENT,
+            "Accept": "*/*",
+            "Connection": "keep-alive",
+        }
+        if data is not None:
+            body = urlencode(data).encode("utf-8")
+            request_headers["Content-Type"] = "application/x-www-form-urlencoded"
+        request_headers.update(headers or {})
+
+        if isinstance(body, bytes):
+            request_headers["Content-Length"] = str(len(body))
+        elif body is not None:
+            if content_length is not None:
+                request_headers["Content-Length"] = str(content_length)
+            else:
+                request_headers["Transfer-Encoding"] = "chunked"
+        elif method in ("POST", "PUT", "PATCH"):
+            request_headers["Content-Length"] = "0"
+
+        head = f"{method} {target} HTTP/1.1\r\n"
+        head += "".join(f"{name}: {value}\r\n" for name, value in request_headers.items())
+        head += "\r\n"
+
+        replayable = body is None or isinstance(body, bytes)
+        retries = self.retries if replayable and method in IDEMPOTENT_METHODS else 0
+
+        attempt = 0
+        while True:
+            response = None
+            try:
+                response = await self._send(
+                    key, method, head.encode("latin-1"), body, content_length
+                )
+            except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                if attempt >= retries:
+                    raise
+            else:
+                if response.status not in RETRY_STATUS_FORCELIST or attempt >= retries:
+                    return response
+
+            await asyncio.sleep(self._get_backoff(attempt, response))
+            attempt += 1
+
+    def _get_backoff(self, attempt: int, response: Optional[AsyncHTTPResponse] = None) -> float:
+        if response is not None:
+            retry_after = response.headers.get("retry-after")
+            if retry_after is not None and retry_after.isdigit():
+                return float(retry_after)
+
+        return self.backoff_factor * 2**attempt
+
+    async def _wait(self, awaitable: Awaitable[T]) -> T:
+        # Idle timeout, for a single step of the exchange
+        return await asyncio.wait_for(awaitable, self.timeout)
+
+    def _get_semaphore(self, key: ConnectionKey) -> asyncio.Semaphore:
+        if key not in self._semaphores:
+            self._semaphores[key] = asyncio.Semaphore(self.max_connections_per_host)
+
+        return self._semaphores[key]
+
+    async def _send(
+        self,
+        key: ConnectionKey,
+        method: str,
+        head: bytes,
+        body: Optional[Body],
+        content_length: Optional[int],
+    ) -> AsyncHTTPResponse:
+        async with self._get_semaphore(key):
+            idle = self._idle.setdefault(key, deque())
+
+            while True:
+                reused = bool(idle)
+                connection = idle.pop() if reused else await self._connect(key)
+                if reused and not connection.is_usable():
+                    connection.close()
+                    continue
+
+                try:
+                    response, keep_alive = await self._exchange(
+                        connection, method, head, body, content_length
+                    )
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    connection.close()
+                    # The server may have closed an idle connection in the meantime,
+                    # try again on a new one if the request can be sent again
+                    if reused and (body is None or isinstance(body, bytes)):
+                        continue
+                    raise
+                except BaseException:
+                    connection.close()
+                    raise
+
+                if keep_alive:
+                    idle.append(connection)
+                else:
+                    connection.close()
+
+                return response
+
+    async def _connect(self, key: ConnectionKey) -> _Connection:
+        scheme, host, port = key
+
+        ssl = None
+        if scheme == "https":
+            if self.ssl_context is None:
+                self.ssl_context = create_default_context()
+            ssl = self.ssl_context
+
+        reader, writer = await self._wait(asyncio.open_connection(host, port, ssl=ssl))
+        return _Connection(reader, writer)
+
+    async def _exchange(
+        self,
+        connection: _Connection,
+        method: str,
+        head: bytes,
+        body: Optional[Body],
+        content_length: Optional[int],
+    ) -> Tuple[AsyncHTTPResponse, bool]:
+        writer = connection.writer
+        reader = connection.reader
+
+        if isinstance(body, bytes):
+            writer.write(head + body)
+        else:
+            writer.write(head)
+            if body is not None:
+                chunked = content_length is None
+                async for chunk in body:
+                    if not chunk:
+                        continue
+                    if chunked:
+                        writer.write(f"{len(chunk):x}\r\n".encode("latin-1"))
+                        writer.write(chunk)
+                        writer.write(b"\r\n")
+                    else:
+                        writer.write(chunk)
+                    await self._wait(writer.drain())
+                if chunked:
+                    writer.write(b"0\r\n\r\n")
+        await self._wait(writer.drain())
+
+        status_line = (await self._wait(reader.readuntil(b"\r\n"))).decode("latin-1")
+        status_line = status_line.rstrip("\r\n")
+        version, status, *reason = status_line.split(" ", 2)
+
+        headers: Dict[str, str] = {}
+        while True:
+            line = (await self._wait(reader.readuntil(b"\r\n"))).decode("latin-1").rstrip("\r\n")
+            if not line:
+                break
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+        if method == "HEAD" or status in ("204", "304") or status.startswith("1"):
+            content = b""
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            content = await self._read_chunked(reader)
+        elif "content-length" in headers:
+            content = await self._wait(reader.readexactly(int(headers["content-length"])))
+        else:
+            # Body delimited by the end of the connection
+            content = await self._wait(reader.read())
+            keep_alive = False
+
+        return AsyncHTTPResponse(int(status), reason[0] if reason else "", headers, content), (
+            keep_alive
+        )
+
+    async def _read_chunked(self, reader: asyncio.StreamReader) -> bytes:
+        chunks = []
+        while True:
+            size_line = await self._wait(reader.readuntil(b"\r\n"))
+            size = int(size_line.split(b";", 1)[0].strip(), 16)
+            if size == 0:
+                # Skip trailers
+                while (await self._wait(reader.readuntil(b"\r\n"))) != b"\r\n":
+                    pass
+                break
+
+            chunks.append(await self._wait(reader.readexactly(size)))
+            await self._wait(reader.readexactly(2))
+
+        return b"".join(chunks)
@@ -0,0 +1,198 @@
+#
+# SPDX-FileCopyrightText: Sebastiano Barezzi
+# SPDX-License-Identifier: Apache-2.0
+#
+
+from hashlib import md5
+from os import SEEK_END, fstat
+from os.path import basename
+from stat import S_ISREG
+from typing import BinaryIO, Dict, Iterable, Iterator, Optional, Union
+from uuid import uuid4
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+UploadSource = Union[BinaryIO, Iterable[bytes]]
+
+
+def get_source_size(source: UploadSource) -> Optional[int]:
+    """Return the number of bytes left in a source, None if it can't be known (e.g. pipes)."""
+    if not hasattr(source, "read"):
+        return None
+
+    try:
+        position = source.tell()  # type: ignore
+    except (AttributeError, OSError):
+        return None
+
+    try:
+        stat = fstat(source.fileno())  # type: ignore
+    except (AttributeError, OSError, ValueError):
+        # Not backed by a file descriptor (e.g. BytesIO)
+        pass
+    else:
+        if not S_ISREG(stat.st_mode):
+            return None
+        return max(stat.st_size - position, 0)
+
+    try:
+        if not source.seekable():  # type: ignore
+            return None
+        end = source.seek(0, SEEK_END)  # type: ignore
+        source.seek(position)  # type: ignore
+    except (AttributeError, OSError):
+        return None
+
+    return max(end - position, 0)
+
+
+def get_source_filename(source: UploadSource, default: str = "file") -> str:
+    """Guess the filename of a source, like requests does for files=."""
+    name = getattr(source, "name", None)
+    if isinstance(name, str) and name and not (name.startswith("<") and name.endswith(">")):
+        return basename(name)
+
+    return default
+
+
+class MultipartEncoder:
+    """
+    A streaming multipart/form-data body with a single file field.
+
+    The file is read in fixed-size chunks only while the body is being sent,
+    so memory usage doesn't depend on the file size, and its MD5 is computed
+    in the same pass.
+
+    The source can be any binary file-like object (files, pipes, BytesIO)
+    or an iterable of bytes (e.g. a generator). If the size of the source is
+    known the body has a length and it is sent with a Content-Length header,
+    otherwise requests sends it with chunked transfer encoding.
+
+    The body can be consumed only once, either by iterating over it
+    or through read().
+    """
+
+    def __init__(
+        self,
+        source: UploadSource,
+        filename: Optional[str] = None,
+        field_name: str = "file",
+        fields: Optional[Dict[str, str]] = None,
+        size: Optional[int] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        file_content_type: str = "application/octet-stream",
+    ):
+        """Initialize the encoder."""
+        self.source = source
+        self.filename = filename or get_source_filename(source)
+        self.chunk_size = chunk_size
+
+        self.boundary = uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+
+        self.md5 = md5()
+        self.bytes_read = 0
+
+        self._size = size if size is not None else get_source_size(source)
+
+        preamble = b""
+        for name, value in (fields or {}).items():
+            preamble += self._get_part_header(name)
+            preamble += value.encode("utf-8") + b"\r\n"
+        preamble += self._get_part_header(field_name, self.filename, file_content_type)
+        self._preamble = preamble
+        self._epilogue = f"\r\n--{self.boundary}--\r\n".encode("utf-8")
+
+        self._iterator: Optional[Iterator[bytes]] = None
+        self._chunk = memoryview(b"")
+        self._position = 0
+
+    @property
+    def len(self) -> Optional[int]:
+        """Total length of the body, None if unknown (used by requests' super_len)."""
+        if self._size is None:
+            return None
+
+        return len(self._preamble) + self._size + len(self._epilogue)
+
+    @property
+    def md5_hexdigest(self) -> str:
+        """MD5 of the file data read so far."""
+        return self.md5.hexdigest()
+
+    def __iter__(self) -> Iterator[bytes]:
+        if self._iterator is None:
+            self._iterator = self._generate()
+
+        return self._iterator
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        """Read up to size bytes of the body, everything left if size is negative."""
+        iterator = iter(self)
+
+        if size is None or size < 0:
+            rest = bytes(self._chunk[self._position :])
+            self._chunk = memoryview(b"")
+            self._position = 0
+            return rest + b"".join(iterator)
+
+        parts = []
+        remaining = size
+        while remaining > 0:
+            if self._position >= len(self._chunk):
+                self._chunk = memoryview(next(iterator, b""))
+                self._position = 0
+                if not self._chunk:
+                    break
+
+            part = self._chunk[self._position : self._position + remaining]
+            parts.append(bytes(part))
+            self._position += len(part)
+            remaining -= len(part)
+
+        return b"".join(parts)
+
+    def _generate(self) -> Iterator[bytes]:
+        yield self._preamble
+
+        for chunk in self._iter_source():
+            if not chunk:
+                continue
+
+            self.md5.update(chunk)
+            self.bytes_read += len(chunk)
+            yield chunk
+
+        if self._size is not None and self.bytes_read != self._size:
+            raise ValueError(f"Expected {self._size} bytes from source, got {self.bytes_read}")
+
+        yield self._epilogue
+
+    def _iter_source(self) -> Iterator[bytes]:
+        if hasattr(self.source, "read"):
+            read = self.source.read  # type: ignore
+            while True:
+                chunk = read(self.chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+        else:
+            yield from self.source  # type: ignore
+
+    def _get_part_header(
+        self, name: str, filename: Optional[str] = None, content_type: Optional[str] = None
+    ) -> bytes:
+        disposition = f'form-data; name="{_quote(name)}"'
+        if filename is not None:
+            disposition += f'; filename="{_quote(filename)}"'
+
+        header = f"--{self.boundary}\r\nContent-Disposition: {disposition}\r\n"
+        if content_type is not None:
+            header += f"Content-Type: {content_type}\r\n"
+        header += "\r\n"
+
+        return header.encode("utf-8")
+
+
+def _quote(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\r", "").replace("\n", "")
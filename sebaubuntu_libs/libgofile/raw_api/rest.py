@@ -3,40 +3,246 @@
 # SPDX-License-Identifier: Apache-2.0
 #
 
-import requests
-from requests.models import Response
-from typing import Any, Callable
+from sebaubuntu_libs.liblogging.tracing import is_tracing_enabled, trace
+from threading import Lock
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+if TYPE_CHECKING:
+    from requests import Session
+    from requests.models import Response
+    from sebaubuntu_libs.libgofile.scheduler import RequestScheduler
+
+# Connection pool defaults, per host
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 32
+
+# Retry defaults, the wait between retries is backoff_factor * 2 ** (retry - 1) seconds
+DEFAULT_RETRIES = 5
+DEFAULT_BACKOFF_FACTOR = 0.5
+RETRY_STATUS_FORCELIST = [429, 500, 502, 503, 504]
+# Creating folders and copying content (PUT) and uploads (POST) aren't idempotent
+RETRY_ALLOWED_METHODS = frozenset({"GET", "HEAD", "DELETE"})
+
+# API statuses meaning that we're sending too many requests
+RATE_LIMIT_STATUSES = ["error-rateLimit"]
+
+
+class GoFileError(Exception):
+    """An error status returned by the API."""
+
+    def __init__(self, status: str, response_json: Any = None):
+        super().__init__(f"Error: {status}")
+
+        self.status = status
+        self.response_json = response_json
+
+
+class GoFileRateLimitError(GoFileError):
+    """The API is throttling us, retry_after is how long it asked to wait, in seconds."""
+
+    def __init__(self, status: str, response_json: Any = None, retry_after: Optional[float] = None):
+        super().__init__(status, response_json)
+
+        self.retry_after = retry_after
+
+
+def create_session(
+    pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+    pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+    retries: int = DEFAULT_RETRIES,
+    backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+    retry_throttled: bool = True,
+) -> "Session":
+    """
+    Create a keep-alive session with a connection pool per host.
+
+    Requests answered with 429 or 5xx (and connection errors) are retried
+    with exponential backoff, honoring Retry-After.
+    Only idempotent methods (RETRY_ALLOWED_METHODS) are retried, PUT and POST are not.
+    With retry_throttled=False 429 answers aren't retried, so that they reach
+    a RequestScheduler as GoFileRateLimitError.
+    """
+    # requests is slow to import, only load it once it's needed
+    from requests import Session
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retry_class = Retry
+    if not retry_throttled:
+
+        class NotThrottledRetry(Retry):
+            # urllib3 retries these when there's a Retry-After, even if not in status_forcelist
+            RETRY_AFTER_STATUS_CODES = Retry.RETRY_AFTER_STATUS_CODES - {429}
+
+        retry_class = NotThrottledRetry
+
+    retry = retry_class(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=[
+            status for status in RETRY_STATUS_FORCELIST if retry_throttled or status != 429
+        ],
+        allowed_methods=RETRY_ALLOWED_METHODS,
+        # Let _process_response handle the last error response
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=retry,
+    )
+
+    session = Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    return session
 
 
 class GoFileRequests:
+    """
+    GoFile API requests helper.
+
+    All the requests go through a single shared session,
+    created on first use with the default settings,
+    call configure_session() to use different ones.
+
+    With set_scheduler(), requests are also paced by a RequestScheduler.
+    The session isn't retrying 429 answers then, the scheduler handles them
+    (a session given to set_session() should be created with
+    create_session(retry_throttled=False) for the same reason).
+    """
+
+    _session: Optional["Session"] = None
+    # Given to configure_session(), None for the defaults
+    _session_settings: Optional[Dict[str, Any]] = None
+    # Given to set_session(), it can't be created again
+    _session_is_custom = False
+    _session_lock = Lock()
+    _scheduler: Optional["RequestScheduler"] = None
+
+    @classmethod
+    def get_session(cls) -> "Session":
+        """Return the shared session, creating it if needed."""
+        if cls._session is None:
+            with cls._session_lock:
+                if cls._session is None:
+                    cls._session = cls._create_session(cls._session_settings)
+
+        return cls._session
+
+    @classmethod
+    def configure_session(
+        cls,
+        pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+        pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+        retries: int = DEFAULT_RETRIES,
+        backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+    ):
+        """Replace the shared session with a new one using the given settings."""
+        settings = {
+            "pool_connections": pool_connections,
+            "pool_maxsize": pool_maxsize,
+            "retries": retries,
+            "backoff_factor": backoff_factor,
+        }
+        cls._replace_session(cls._create_session(settings), settings)
+
+    @classmethod
+    def set_session(cls, session: "Session"):
+        """Replace the shared session, closing the old one."""
+        cls._replace_session(session, None, is_custom=True)
+
+    @classmethod
+    def set_scheduler(cls, scheduler: Optional["RequestScheduler"]):
+        """Pace all the requests with a scheduler, None to send them right away."""
+        had_scheduler = cls._scheduler is not None
+        cls._scheduler = scheduler
+
+        # Move the retries of 429 answers between the session and the scheduler
+        if (
+            cls._session is not None
+            and not cls._session_is_custom
+            and had_scheduler != (scheduler is not None)
+        ):
+            settings = cls._session_settings
+            cls._replace_session(cls._create_session(settings), settings)
+
+    @classmethod
+    def _create_session(cls, settings: Optional[Dict[str, Any]]) -> "Session":
+        return create_session(retry_throttled=cls._scheduler is None, **(settings or {}))
+
+    @classmethod
+    def _replace_session(
+        cls,
+        session: "Session",
+        settings: Optional[Dict[str, Any]],
+        is_custom: bool = False,
+    ):
+        with cls._session_lock:
+            old_session = cls._session
+            cls._session = session
+            cls._session_settings = settings
+            cls._session_is_custom = is_custom
+
+        if old_session is not None:
+            old_session.close()
+
     @classmethod
     def delete(cls, *args: Any, **kwargs: Any):
-        response = cls._send_request(requests.delete, *args, **kwargs)
-        return cls._process_response(response)
+        return cls._request(cls.get_session().delete, *args, **kwargs)
 
     @classmethod
     def get(cls, *args: Any, **kwargs: Any):
-        response = cls._send_request(requests.get, *args, **kwargs)
-        return cls._process_response(response)
+        return cls._request(cls.get_session().get, *args, **kwargs)
 
     @classmethod
     def post(cls, *args: Any, **kwargs: Any):
-        response = cls._send_request(requests.post, *args, **kwargs)
-        return cls._process_response(response)
+        return cls._request(cls.get_session().post, *args, **kwargs)
 
     @classmethod
     def put(cls, *args: Any, **kwargs: Any):
-        response = cls._send_request(requests.put, *args, **kwargs)
-        return cls._process_response(response)
+        return cls._request(cls.get_session().put, *args, **kwargs)
+
+    @classmethod
+    def _request(cls, func: Callable[..., "Response"], url: str, **kwargs: Any):
+        def send():
+            if not is_tracing_enabled():
+                return cls._process_response(cls._send_request(func, url, **kwargs))
+
+            with trace(f"GoFile {urlsplit(url).path}", "gofile", url=url):
+                return cls._process_response(cls._send_request(func, url, **kwargs))
+
+        scheduler = cls._scheduler
+        if scheduler is None:
+            return send()
+
+        # The account is identified by its token, when there's one
+        token = None
+        for arg in ["params", "data"]:
+            if isinstance(kwargs.get(arg), dict):
+                token = token or kwargs[arg].get("token")
+
+        return scheduler.call(
+            send,
+            endpoint=urlsplit(url).path,
+            account=token,
+            # Streamed bodies (e.g. uploads) can't be sent again
+            retryable=isinstance(kwargs.get("data", {}), dict),
+        )
 
     @staticmethod
     def _send_request(
-        func: Callable[..., Response],
+        func: Callable[..., "Response"],
         *args: Any,
         **kwargs: Any,
-    ) -> Response:
+    ) -> "Response":
         for arg in ["data", "params"]:
             kwargs[arg] = kwargs.get(arg, {})
+            # Streamed bodies (e.g. uploads) can't carry extra fields
+            if not isinstance(kwargs[arg], dict):
+                continue
             # We do a little trolling
             kwargs[arg]["websiteToken"] = "websiteToken"
 
@@ -44,12 +250,66 @@ class GoFileRequests:
         return response
 
     @staticmethod
-    def _process_response(response: Response):
-        response_json = response.json()
-        if "status" not in response_json:
-            raise Exception(f"Invalid response: {response_json}")
+    def _process_response(response: "Response"):
+        return process_response(
+            response.json, response.status_code, response.headers.get("Retry-After")
+        )
+
+
+def process_response(
+    get_json: Callable[[], Any],
+    status_code: int,
+    retry_after_header: Optional[str] = None,
+):
+    """
+    Decode an API response and return its data, see process_response_json.
+
+    Answers that aren't JSON raise GoFileRateLimitError on 429, GoFileError
+    on other HTTP errors.
+    """
+    retry_after = parse_retry_after(retry_after_header)
+
+    try:
+        response_json = get_json()
+    except ValueError as e:
+        if status_code == 429:
+            raise GoFileRateLimitError("error-rateLimit", retry_after=retry_after) from e
+        if status_code >= 400:
+            raise GoFileError(f"error-http{status_code}") from e
+        raise
+
+    return process_response_json(response_json, status_code, retry_after)
+
+
+def process_response_json(
+    response_json: Any,
+    status_code: Optional[int] = None,
+    retry_after: Optional[float] = None,
+):
+    """
+    Check the status of a decoded API response and return its data.
+
+    Error statuses raise GoFileError, GoFileRateLimitError when we're being throttled.
+    """
+    if "status" not in response_json:
+        raise Exception(f"Invalid response: {response_json}")
+
+    status = response_json["status"]
+    if status in RATE_LIMIT_STATUSES or (status != "ok" and status_code == 429):
+        raise GoFileRateLimitError(status, response_json, retry_after)
+
+    if status != "ok":
+        raise GoFileError(status, response_json)
+
+    return response_json["data"]
+
 
-        if response_json["status"] != "ok":
-            raise Exception(f"Error: {response_json['status']}")
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header in seconds, HTTP dates aren't supported."""
+    if value is None:
+        return None
 
-        return response_json["data"]
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        return None
@@ -0,0 +1,378 @@
+#
+# SPDX-FileCopyrightText: Sebastiano Barezzi
+# SPDX-License-Identifier: Apache-2.0
+#
+
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from heapq import heappop, heappush
+from itertools import count
+from sebaubuntu_libs.libgofile.raw_api.rest import GoFileRateLimitError
+from sebaubuntu_libs.liblogging import LOGD
+from threading import Condition, Lock, Thread, local
+from time import monotonic, sleep
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+# Requests per second
+DEFAULT_ENDPOINT_RATE = 5.0
+DEFAULT_ACCOUNT_RATE = 10.0
+DEFAULT_MIN_RATE = 0.2
+DEFAULT_MAX_RATE = 50.0
+# Requests that can be sent at once after being idle
+DEFAULT_BURST = 5
+
+# Multiplicative decrease when throttled, additive increase on success
+DEFAULT_DECREASE_FACTOR = 0.5
+DEFAULT_INCREASE_STEP = 0.5
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_MAX_RETRIES = 5
+# Wait when throttled without a Retry-After
+DEFAULT_THROTTLE_BACKOFF = 1.0
+
+# Lower is sooner
+DEFAULT_PRIORITY = 0
+
+# Latencies kept for the percentiles
+LATENCY_SAMPLES = 1024
+
+
+class TokenBucket:
+    """
+    Adaptive token bucket.
+
+    Tokens refill at rate per second, up to burst. The rate is halved when the
+    server throttles us and slowly increased back while requests succeed
+    (AIMD), a Retry-After pauses the bucket entirely until it expires.
+    Throttles arriving while paused come from requests sent before the
+    decrease, so they don't decrease the rate again.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int = DEFAULT_BURST,
+        min_rate: float = DEFAULT_MIN_RATE,
+        max_rate: float = DEFAULT_MAX_RATE,
+        decrease_factor: float = DEFAULT_DECREASE_FACTOR,
+        increase_step: float = DEFAULT_INCREASE_STEP,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.decrease_factor = decrease_factor
+        self.increase_step = increase_step
+
+        self._tokens = float(burst)
+        self._last_time = monotonic()
+        self._paused_until = 0.0
+        self._lock = Lock()
+
+    def reserve(self) -> float:
+        """Take a token, return how many seconds to wait before using it."""
+        with self._lock:
+            now = monotonic()
+            self._refill(now)
+
+            # Tokens can go negative, the following callers queue up behind
+            self._tokens -= 1
+            wait = max(-self._tokens / self.rate, self._paused_until - now, 0.0)
+
+            return wait
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.rate + self.increase_step, self.max_rate)
+
+    def on_throttle(self, retry_after: Optional[float] = None):
+        with self._lock:
+            now = monotonic()
+            self._refill(now)
+
+            if now >= self._paused_until:
+                self.rate = max(self.rate * self.decrease_factor, self.min_rate)
+            self._tokens = min(self._tokens, 0.0)
+            self._paused_until = max(self._paused_until, now + (retry_after or 1 / self.rate))
+
+    def _refill(self, now: float):
+        self._tokens = min(self._tokens + (now - self._last_time) * self.rate, float(self.burst))
+        self._last_time = now
+
+
+class SchedulerMetrics:
+    """Counters and latencies of a RequestScheduler."""
+
+    def __init__(self):
+        self.queue_depth = 0
+        self.in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.throttled = 0
+
+        # Seconds spent waiting in the queue (and for tokens) and running
+        self.queue_latencies: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self.run_latencies: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.queue_depth,
+            "in_flight": self.in_flight,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "throttled": self.throttled,
+            "queue_latency_p50": _percentile(self.queue_latencies, 0.5),
+            "queue_latency_p95": _percentile(self.queue_latencies, 0.95),
+            "run_latency_p50": _percentile(self.run_latencies, 0.5),
+            "run_latency_p95": _percentile(self.run_latencies, 0.95),
+        }
+
+
+class _Call:
+    def __init__(
+        self,
+        func: Callable[[], Any],
+        endpoint: str,
+        account: Optional[str],
+        priority: int,
+        retryable: bool,
+    ):
+        self.func = func
+        self.endpoint = endpoint
+        self.account = account
+        self.priority = priority
+        self.retryable = retryable
+
+        self.future: "Future[Any]" = Future()
+        self.attempts = 0
+        self.queued_time = monotonic()
+
+
+class RequestScheduler:
+    """
+    Rate-limit-aware scheduler for API calls.
+
+    Calls are queued by priority (lower first, FIFO within a priority) and run
+    by up to max_workers threads, each paced by a TokenBucket for its endpoint
+    and one for its account. When a call raises GoFileRateLimitError the
+    buckets slow down (honoring Retry-After) and the call is queued again,
+    up to max_retries times, so bulk jobs settle at the highest rate the
+    server accepts instead of failing.
+
+    Use GoFileRequests.set_scheduler() to pace all the libgofile requests.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        endpoint_rate: float = DEFAULT_ENDPOINT_RATE,
+        account_rate: float = DEFAULT_ACCOUNT_RATE,
+        burst: int = DEFAULT_BURST,
+        min_rate: float = DEFAULT_MIN_RATE,
+        max_rate: float = DEFAULT_MAX_RATE,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        throttle_backoff: float = DEFAULT_THROTTLE_BACKOFF,
+    ):
+        self.max_workers = max_workers
+        self.endpoint_rate = endpoint_rate
+        self.account_rate = account_rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.max_retries = max_retries
+        self.throttle_backoff = throttle_backoff
+
+        self.metrics = SchedulerMetrics()
+
+        self._queue: List[Tuple[int, int, _Call]] = []
+        self._sequence = count()
+        self._condition = Condition()
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self._shutdown = False
+        self._thread_local = local()
+
+        self._workers = [
+            Thread(target=self._work, name=f"RequestScheduler-{i}", daemon=True)
+            for i in range(max_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+    def submit(
+        self,
+        func: Callable[..., Any],
+        *args: Any,
+        endpoint: str = "",
+        account: Optional[str] = None,
+        priority: Optional[int] = None,
+        retryable: bool = True,
+        **kwargs: Any,
+    ) -> "Future[Any]":
+        """
+        Queue a call, returning its future.
+
+        priority defaults to the one set with priority() in this thread.
+        Calls that can't be repeated (retryable=False) aren't retried when throttled.
+        """
+        call = _Call(
+            lambda: func(*args, **kwargs),
+            endpoint,
+            account,
+            priority if priority is not None else self._get_thread_priority(),
+            retryable,
+        )
+
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("Scheduler is shut down")
+
+            self.metrics.submitted += 1
+            self._push(call)
+
+        return call.future
+
+    def call(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Queue a call and wait for its result, see submit()."""
+        # Calls made from a scheduled call run right away, its worker would wait on itself
+        if getattr(self._thread_local, "worker", False):
+            kwargs.pop("endpoint", None)
+            kwargs.pop("account", None)
+            kwargs.pop("priority", None)
+            kwargs.pop("retryable", None)
+            return func(*args, **kwargs)
+
+        return self.submit(func, *args, **kwargs).result()
+
+    @contextmanager
+    def priority(self, priority: int) -> Iterator[None]:
+        """Set the default priority of the calls submitted by this thread."""
+        old_priority = self._get_thread_priority()
+        self._thread_local.priority = priority
+
+        try:
+            yield
+        finally:
+            self._thread_local.priority = old_priority
+
+    def _get_thread_priority(self) -> int:
+        return getattr(self._thread_local, "priority", DEFAULT_PRIORITY)
+
+    def get_rates(self) -> Dict[str, float]:
+        """Current rate of every bucket, by "endpoint:..." and "account:..." keys."""
+        with self._condition:
+            return {f"{kind}:{key}": bucket.rate for (kind, key), bucket in self._buckets.items()}
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting calls, the queued ones still run."""
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+    def _push(self, call: _Call):
+        heappush(self._queue, (call.priority, next(self._sequence), call))
+        self.metrics.queue_depth = len(self._queue)
+        self._condition.notify()
+
+    def _get_bucket(self, kind: str, key: str, rate: float) -> TokenBucket:
+        with self._condition:
+            if (kind, key) not in self._buckets:
+                self._buckets[(kind, key)] = TokenBucket(
+                    rate, burst=self.burst, min_rate=self.min_rate, max_rate=self.max_rate
+                )
+
+            return self._buckets[(kind, key)]
+
+    def _work(self):
+        self._thread_local.worker = True
+
+        while True:
+            with self._condition:
+                while not self._queue and not self._shutdown:
+                    self._condition.wait()
+
+                if not self._queue:
+                    return
+
+                _, _, call = heappop(self._queue)
+                self.metrics.queue_depth = len(self._queue)
+
+            self._run(call)
+
+    def _run(self, call: _Call):
+        buckets = [self._get_bucket("endpoint", call.endpoint, self.endpoint_rate)]
+        if call.account is not None:
+            buckets.append(self._get_bucket("account", call.account, self.account_rate))
+
+        wait = max(bucket.reserve() for bucket in buckets)
+        if wait > 0:
+            sleep(wait)
+
+        with self._condition:
+            self.metrics.in_flight += 1
+            self.metrics.queue_latencies.append(monotonic() - call.queued_time)
+
+        call.attempts += 1
+        start_time = monotonic()
+        try:
+            result = call.func()
+        except GoFileRateLimitError as e:
+            self._on_throttle(call, buckets, e)
+            return
+        except BaseException as e:
+            with self._condition:
+                self.metrics.in_flight -= 1
+                self.metrics.failed += 1
+            call.future.set_exception(e)
+            return
+
+        for bucket in buckets:
+            bucket.on_success()
+
+        with self._condition:
+            self.metrics.in_flight -= 1
+            self.metrics.completed += 1
+            self.metrics.run_latencies.append(monotonic() - start_time)
+        call.future.set_result(result)
+
+    def _on_throttle(self, call: _Call, buckets: List[TokenBucket], error: GoFileRateLimitError):
+        retry_after = error.retry_after
+        if retry_after is None:
+            retry_after = self.throttle_backoff
+
+        for bucket in buckets:
+            bucket.on_throttle(retry_after)
+
+        with self._condition:
+            self.metrics.in_flight -= 1
+            self.metrics.throttled += 1
+
+            if call.retryable and call.attempts <= self.max_retries:
+                LOGD(f"Throttled on {call.endpoint}, retrying in {retry_after}s")
+                call.queued_time = monotonic()
+                self._push(call)
+                return
+
+            self.metrics.failed += 1
+
+        call.future.set_exception(error)
+
+
+def _percentile(values: Deque[float], percentile: float) -> Optional[float]:
+    if not values:
+        return None
+
+    sorted_values = sorted(values)
+    return sorted_values[min(int(len(sorted_values) * percentile), len(sorted_values) - 1)]
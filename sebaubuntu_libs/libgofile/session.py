@@ -3,7 +3,11 @@
 # SPDX-License-Identifier: Apache-2.0
 #
 
+from pathlib import PurePosixPath
+from sebaubuntu_libs.libgofile.contents import Content
 from sebaubuntu_libs.libgofile.utils import get_account, get_content
+from sebaubuntu_libs.libgofile.walker import DEFAULT_MAX_WORKERS, ContentCache, walk
+from typing import Iterator, Optional, Tuple
 
 
 class Session:
@@ -11,9 +15,21 @@ class Session:
         self.token = token
 
         self.account = get_account(token)
+        self.cache = ContentCache()
 
     def get_root_content(self):
         return get_content(self.account.root_folder, self.token)
 
     def get_content(self, content_id: str):
         return get_content(content_id, self.token)
+
+    def walk(
+        self,
+        content_id: Optional[str] = None,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+    ) -> Iterator[Tuple[PurePosixPath, Content]]:
+        """Recursively walk a folder (the root folder by default), see walker.walk()."""
+        if content_id is None:
+            content_id = self.account.root_folder
+
+        return walk(content_id, self.token, max_workers=max_workers, cache=self.cache)
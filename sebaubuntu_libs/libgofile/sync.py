@@ -0,0 +1,249 @@
+#
+# SPDX-FileCopyrightText: Sebastiano Barezzi
+# SPDX-License-Identifier: Apache-2.0
+#
+
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import md5
+from json import dump, load
+import os
+from pathlib import Path, PurePosixPath
+from sebaubuntu_libs.libgofile.contents import File, Folder
+from sebaubuntu_libs.libgofile.uploader import DEFAULT_MAX_WORKERS, Uploader
+from sebaubuntu_libs.libgofile.utils import create_folder, delete_content
+from sebaubuntu_libs.libgofile.walker import walk
+from sebaubuntu_libs.liblogging import LOGD, LOGI, LOGW
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+# Kept in the synced directory by default, never uploaded
+DEFAULT_INDEX_FILENAME = ".gofile_sync_index.json"
+
+INDEX_VERSION = 1
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class HashIndex:
+    """
+    Persistent MD5 index of local files, by relative path.
+
+    An entry is valid while the file size and modification time don't change,
+    so unchanged files are never hashed again.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+
+        # Relative path -> (size, mtime_ns, md5)
+        self._entries: Dict[str, Tuple[int, int, str]] = {}
+        self._lock = Lock()
+
+        self.load()
+
+    def load(self):
+        if not self.path.is_file():
+            return
+
+        try:
+            with self.path.open() as f:
+                data = load(f)
+        except (OSError, ValueError) as e:
+            LOGW(f"Ignoring invalid hash index {self.path}: {e}")
+            return
+
+        if data.get("version") != INDEX_VERSION:
+            return
+
+        self._entries = {
+            relative_path: (size, mtime_ns, md5_hexdigest)
+            for relative_path, (size, mtime_ns, md5_hexdigest) in data["entries"].items()
+        }
+
+    def save(self):
+        with self._lock:
+            data: Dict[str, Any] = {
+                "version": INDEX_VERSION,
+                "entries": self._entries,
+            }
+
+            tmp_path = self.path.with_name(f"{self.path.name}.tmp")
+            with tmp_path.open("w") as f:
+                dump(data, f)
+            os.replace(tmp_path, self.path)
+
+    def get_md5(self, relative_path: str, path: Path) -> str:
+        """Get the MD5 of a file, hashing it only if it changed since the last time."""
+        stat = path.stat()
+
+        with self._lock:
+            entry = self._entries.get(relative_path)
+        if entry is not None and entry[:2] == (stat.st_size, stat.st_mtime_ns):
+            return entry[2]
+
+        hash = md5()
+        with path.open("rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                hash.update(chunk)
+
+        self.set_md5(relative_path, stat.st_size, stat.st_mtime_ns, hash.hexdigest())
+
+        return hash.hexdigest()
+
+    def set_md5(self, relative_path: str, size: int, mtime_ns: int, md5_hexdigest: str):
+        with self._lock:
+            self._entries[relative_path] = (size, mtime_ns, md5_hexdigest)
+
+    def prune(self, relative_paths: List[str]):
+        """Drop the entries of the files not in relative_paths."""
+        keep = set(relative_paths)
+
+        with self._lock:
+            self._entries = {
+                relative_path: entry
+                for relative_path, entry in self._entries.items()
+                if relative_path in keep
+            }
+
+
+class SyncResult:
+    """What a sync did, by relative path."""
+
+    def __init__(self):
+        self.uploaded: List[str] = []
+        self.skipped: List[str] = []
+        self.created_folders: List[str] = []
+        self.failed: Dict[str, Exception] = {}
+
+    def __bool__(self):
+        return not self.failed
+
+
+def sync_folder(
+    local_dir: Union[str, Path],
+    folder_id: str,
+    token: str,
+    index_path: Optional[Union[str, Path]] = None,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+) -> SyncResult:
+    """
+    Mirror a local directory to a GoFile folder, uploading only what changed.
+
+    Files are matched on relative path, size and MD5: local MD5s come from a
+    persistent HashIndex (index_path, by default in local_dir) and are computed
+    only for files with a remote counterpart of the same size.
+    Missing folders are created, new and changed files are uploaded with up to
+    max_workers concurrent uploads and the outdated remote copies are deleted.
+    Remote files without a local counterpart are left alone.
+    """
+    local_dir = Path(local_dir)
+    index_path = Path(index_path) if index_path is not None else local_dir / DEFAULT_INDEX_FILENAME
+    index = HashIndex(index_path)
+
+    result = SyncResult()
+
+    # Remote state
+    remote_files: Dict[str, File] = {}
+    remote_folders: Dict[str, str] = {"": folder_id}
+    for path, content in walk(folder_id, token, max_workers=max_workers):
+        if isinstance(content, Folder):
+            remote_folders[path.as_posix()] = content.content_id
+        elif isinstance(content, File):
+            remote_files[path.as_posix()] = content
+
+    # Local state
+    local_files: Dict[str, Path] = {}
+    for dirpath, _, filenames in os.walk(local_dir):
+        for filename in filenames:
+            path = Path(dirpath) / filename
+            if path in (index_path, index_path.with_name(f"{index_path.name}.tmp")):
+                continue
+            local_files[path.relative_to(local_dir).as_posix()] = path
+
+    # Only hash when the size matches, else the file is different anyway
+    candidates = [
+        relative_path
+        for relative_path, path in local_files.items()
+        if relative_path in remote_files and remote_files[relative_path].size == path.stat().st_size
+    ]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        md5s = dict(
+            zip(
+                candidates,
+                executor.map(
+                    lambda relative_path: index.get_md5(relative_path, local_files[relative_path]),
+                    candidates,
+                ),
+            )
+        )
+
+    to_upload: List[str] = []
+    for relative_path in sorted(local_files):
+        remote_file = remote_files.get(relative_path)
+        if remote_file is not None and md5s.get(relative_path) == remote_file.md5:
+            result.skipped.append(relative_path)
+        else:
+            to_upload.append(relative_path)
+
+    LOGI(f"Sync of {local_dir}: {len(to_upload)} to upload, {len(result.skipped)} unchanged")
+
+    # Create the missing folders, parents first
+    for relative_path in to_upload:
+        parent = PurePosixPath(relative_path).parent
+        for folder in reversed([parent, *parent.parents]):
+            folder_path = _get_folder_key(folder)
+            if folder_path in remote_folders:
+                continue
+
+            parent_id = remote_folders[_get_folder_key(folder.parent)]
+            created = create_folder(parent_id, folder.name, token)
+            remote_folders[folder_path] = created.content_id
+            result.created_folders.append(folder_path)
+            LOGD(f"Created folder {folder_path}")
+
+    # Only the MD5s of the uploads are needed
+    uploader = Uploader(token=token, max_workers=max_workers, resolve_files=False)
+    stats = {relative_path: local_files[relative_path].stat() for relative_path in to_upload}
+    upload_results = uploader.upload_files_to(
+        (
+            local_files[relative_path],
+            remote_folders[_get_folder_key(PurePosixPath(relative_path).parent)],
+        )
+        for relative_path in to_upload
+    )
+
+    outdated: List[str] = []
+    for relative_path, upload_result in zip(to_upload, upload_results):
+        if not upload_result.succeeded:
+            assert upload_result.error is not None
+            result.failed[relative_path] = upload_result.error
+            continue
+
+        result.uploaded.append(relative_path)
+
+        # The uploader already hashed the file, remember it
+        remote_md5 = upload_result.data.get("md5") if upload_result.data else None
+        if remote_md5 is not None:
+            stat = stats[relative_path]
+            index.set_md5(relative_path, stat.st_size, stat.st_mtime_ns, remote_md5)
+
+        if relative_path in remote_files:
+            outdated.append(remote_files[relative_path].content_id)
+
+    if outdated:
+        delete_content(outdated, token)
+
+    index.prune(list(local_files))
+    index.save()
+
+    LOGI(
+        f"Sync of {local_dir} done: {len(result.uploaded)} uploaded, "
+        f"{len(result.skipped)} unchanged, {len(result.failed)} failed"
+    )
+
+    return result
+
+
+def _get_folder_key(path: PurePosixPath) -> str:
+    # The synced folder itself is ""
+    return "" if path == PurePosixPath() else path.as_posix()
@@ -0,0 +1,317 @@
+#
+# SPDX-FileCopyrightText: Sebastiano Barezzi
+# SPDX-License-Identifier: Apache-2.0
+#
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from sebaubuntu_libs.libgofile.contents import File
+from sebaubuntu_libs.libgofile.raw_api.multipart import UploadSource
+from sebaubuntu_libs.libgofile.utils import get_content, get_server, upload_file
+from sebaubuntu_libs.liblogging import LOGW
+from threading import BoundedSemaphore, Lock
+from time import monotonic, sleep
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+# How long the best server stays valid, in seconds
+DEFAULT_SERVER_TTL = 300.0
+
+DEFAULT_MAX_WORKERS = 4
+# Independent from max_workers, so that a single server doesn't get all the workers
+DEFAULT_MAX_PER_HOST = 2
+DEFAULT_RETRIES = 2
+DEFAULT_RETRY_BACKOFF = 1.0
+
+UploaderFile = Union[str, Path, UploadSource]
+
+
+class ServerCache:
+    """
+    The best server to upload to, resolved once and reused for ttl seconds.
+
+    Only one thread resolves it at a time, without holding the lock,
+    the others wait for its result.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_SERVER_TTL):
+        self.ttl = ttl
+
+        self._server: Optional[str] = None
+        self._expire_time = 0.0
+        self._refresh: Optional["Future[str]"] = None
+        self._lock = Lock()
+
+    def get(self) -> str:
+        with self._lock:
+            if self._server is not None and monotonic() < self._expire_time:
+                return self._server
+
+            refresh = self._refresh
+            if refresh is not None:
+                resolving = False
+            else:
+                refresh = self._refresh = Future()
+                resolving = True
+
+        if not resolving:
+            return refresh.result()
+
+        try:
+            server = get_server()
+        except BaseException as e:
+            with self._lock:
+                self._refresh = None
+            refresh.set_exception(e)
+            raise
+
+        with self._lock:
+            self._server = server
+            self._expire_time = monotonic() + self.ttl
+            self._refresh = None
+        refresh.set_result(server)
+
+        return server
+
+    def invalidate(self):
+        """Forget the current server, e.g. after it failed."""
+        with self._lock:
+            self._server = None
+
+
+class UploadResult:
+    """
+    The outcome of the upload of one file.
+
+    data is the raw API answer, file the uploaded File, None if it
+    couldn't be retrieved (see Uploader).
+    """
+
+    def __init__(self, source: UploaderFile, folder_id: Optional[str] = None):
+        self.source = source
+        self.folder_id = folder_id
+        self.data: Optional[Dict[str, Any]] = None
+        self.file: Optional[File] = None
+        self.error: Optional[Exception] = None
+        self.attempts = 0
+
+        self._rewind_position = _get_rewind_position(source)
+
+    def __bool__(self):
+        return self.succeeded
+
+    @property
+    def succeeded(self) -> bool:
+        return self.error is None and self.data is not None
+
+    @property
+    def retryable(self) -> bool:
+        """Whether the file can be uploaded again (paths and seekable streams)."""
+        return self._rewind_position is not None
+
+    def rewind(self):
+        """Go back to where the file started, before uploading it again."""
+        if self._rewind_position is None:
+            raise ValueError(f"{self.source} can't be uploaded again")
+
+        if not isinstance(self.source, (str, Path)):
+            self.source.seek(self._rewind_position)  # type: ignore
+
+
+class Uploader:
+    """
+    Upload many files concurrently.
+
+    The best server is resolved once (and again only after the TTL expires
+    or after a failure), uploads run on a bounded worker pool and each
+    server gets at most max_per_host uploads at a time.
+    A failed upload doesn't affect the others, it is retried with backoff
+    when possible and reported in its UploadResult.
+    The upload answer lacks most of the file details, with resolve_files
+    (and a token) the uploaded files are then read from their folders,
+    with one request per folder.
+    """
+
+    def __init__(
+        self,
+        token: Optional[str] = None,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        max_per_host: int = DEFAULT_MAX_PER_HOST,
+        retries: int = DEFAULT_RETRIES,
+        retry_backoff: float = DEFAULT_RETRY_BACKOFF,
+        server_cache: Optional[ServerCache] = None,
+        resolve_files: bool = True,
+    ):
+        self.token = token
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.server_cache = server_cache or ServerCache()
+        self.resolve_files = resolve_files
+
+        self._host_semaphores: Dict[str, BoundedSemaphore] = {}
+        self._host_semaphores_lock = Lock()
+
+    def upload_files(
+        self,
+        files: Iterable[UploaderFile],
+        folder_id: Optional[str] = None,
+        description: Optional[str] = None,
+        password: Optional[str] = None,
+        tags: Optional[Iterable[str]] = None,
+        expire: Optional[datetime] = None,
+    ) -> List[UploadResult]:
+        """Upload files, returning one result per file in the same order."""
+        return self.upload_files_to(
+            ((file, folder_id) for file in files),
+            description=description,
+            password=password,
+            tags=tags,
+            expire=expire,
+        )
+
+    def upload_files_to(
+        self,
+        files: Iterable[Tuple[UploaderFile, Optional[str]]],
+        description: Optional[str] = None,
+        password: Optional[str] = None,
+        tags: Optional[Iterable[str]] = None,
+        expire: Optional[datetime] = None,
+    ) -> List[UploadResult]:
+        """Upload (file, folder ID) pairs, each file to its own folder, see upload_files()."""
+        results = [UploadResult(file, folder_id) for file, folder_id in files]
+
+        self._upload_results(
+            results,
+            description=description,
+            password=password,
+            tags=list(tags) if tags is not None else None,
+            expire=expire,
+        )
+
+        return results
+
+    def retry_failed(self, results: List[UploadResult], **kwargs: Any) -> List[UploadResult]:
+        """
+        Upload again the files that failed, updating their results in place.
+
+        kwargs are the same accepted by upload_files(),
+        folder_id, if given, replaces the folder of the failed files.
+        """
+        folder_id = kwargs.pop("folder_id", None)
+
+        failed = [result for result in results if not result.succeeded and result.retryable]
+        for result in failed:
+            result.rewind()
+            if folder_id is not None:
+                result.folder_id = folder_id
+
+        self._upload_results(failed, **kwargs)
+
+        return results
+
+    def _upload_results(self, results: List[UploadResult], **kwargs: Any):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self._upload, result, **kwargs) for result in results]
+            # Upload errors are saved in the results, raise anything else
+            for future in futures:
+                future.result()
+
+            if self.resolve_files and self.token is not None:
+                # Uploads usually share a few folders
+                folders: Dict[str, List[UploadResult]] = {}
+                for result in results:
+                    if result.succeeded:
+                        assert result.data is not None
+                        folders.setdefault(result.data["parentFolder"], []).append(result)
+
+                futures = [
+                    executor.submit(self._resolve_files, folder_id, folder_results)
+                    for folder_id, folder_results in folders.items()
+                ]
+                for future in futures:
+                    future.result()
+
+    def _get_host_semaphore(self, server: str) -> BoundedSemaphore:
+        with self._host_semaphores_lock:
+            if server not in self._host_semaphores:
+                self._host_semaphores[server] = BoundedSemaphore(self.max_per_host)
+
+            return self._host_semaphores[server]
+
+    def _resolve_files(self, folder_id: str, results: List[UploadResult]):
+        assert self.token is not None
+
+        try:
+            listing = get_content(folder_id, self.token).get_listing()
+        except Exception as e:
+            LOGW(f"Failed to get the uploaded files of folder {folder_id}: {e}")
+            return
+
+        indexes = {content_id: index for index, content_id in enumerate(listing.content_ids)}
+        for result in results:
+            assert result.data is not None
+            index = indexes.get(result.data["fileId"])
+            if index is not None:
+                file = listing[index]
+                assert isinstance(file, File)
+                result.file = file
+
+    def _upload(self, result: UploadResult, **kwargs: Any):
+        retries = 0
+
+        while True:
+            result.attempts += 1
+
+            try:
+                server = self.server_cache.get()
+                with self._get_host_semaphore(server):
+                    result.data = upload_file(
+                        result.source,
+                        server=server,
+                        token=self.token,
+                        folder_id=result.folder_id,
+                        **kwargs,
+                    )
+                result.error = None
+                return
+            except Exception as e:
+                result.error = e
+
+            if retries >= self.retries or not result.retryable:
+                LOGW(f"Upload of {result.source} failed: {result.error}")
+                return
+
+            # The server may be the problem, pick again
+            self.server_cache.invalidate()
+            result.rewind()
+            sleep(self.retry_backoff * 2**retries)
+            retries += 1
+
+
+def upload_files(
+    files: Iterable[UploaderFile],
+    token: Optional[str] = None,
+    folder_id: Optional[str] = None,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    **kwargs: Any,
+) -> List[UploadResult]:
+    """Upload many files concurrently, see Uploader."""
+    uploader = Uploader(token=token, max_workers=max_workers)
+
+    return uploader.upload_files(files, folder_id=folder_id, **kwargs)
+
+
+def _get_rewind_position(file: UploaderFile) -> Optional[int]:
+    if isinstance(file, (str, Path)):
+        # Reopened on every attempt
+        return 0
+
+    try:
+        if file.seekable():  # type: ignore
+            return file.tell()  # type: ignore
+    except (AttributeError, OSError, ValueError):
+        pass
+
+    return None
@@ -4,11 +4,11 @@
 #
 
 from datetime import datetime
-from io import BytesIO
 from pathlib import Path
 from sebaubuntu_libs.libgofile import raw_api
 from sebaubuntu_libs.libgofile.account import Account
 from sebaubuntu_libs.libgofile.contents import ContentResponse, Folder
+from sebaubuntu_libs.libgofile.raw_api.multipart import UploadSource
 from typing import Iterable, Optional, Union
 
 
@@ -18,7 +18,7 @@ def get_server() -> str:
 
 
 def upload_file(
-    file: Union[str, Path, BytesIO],
+    file: Union[str, Path, UploadSource],
     server: Optional[str] = None,
     token: Optional[str] = None,
     folder_id: Optional[str] = None,
@@ -26,35 +26,43 @@ def upload_file(
     password: Optional[str] = None,
     tags: Optional[Iterable[str]] = None,
     expire: Optional[datetime] = None,
+    filename: Optional[str] = None,
 ):
-    """Upload one file on a specific server."""
+    """
+    Upload one file on a specific server.
+
+    file can be a path, a binary file-like object (e.g. BytesIO or a pipe)
+    or an iterable of bytes, data is streamed with constant memory usage.
+    """
     if server is None:
         server = get_server()
 
-    needs_open = not isinstance(file, BytesIO)
+    needs_open = isinstance(file, (str, Path))
 
     if needs_open:
         with open(file, "rb") as f:
             data = raw_api.upload_file(
                 server=server,
-                file=f,  # type: ignore
+                file=f,
                 token=token,
                 folder_id=folder_id,
                 description=description,
                 password=password,
                 tags=",".join(tags) if tags else None,
                 expire=expire,
+                filename=filename,
             )
     else:
         data = raw_api.upload_file(
             server=server,
-            file=file,
+            file=file,  # type: ignore
             token=token,
             folder_id=folder_id,
             description=description,
             password=password,
             tags=",".join(tags) if tags else None,
             expire=expire,
+            filename=filename,
         )
 
     return data
@@ -0,0 +1,116 @@
+#
+# SPDX-FileCopyrightText: Sebastiano Barezzi
+# SPDX-License-Identifier: Apache-2.0
+#
+
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import PurePosixPath
+from sebaubuntu_libs.libgofile.contents import Content, ContentResponse, Folder
+from sebaubuntu_libs.libgofile.utils import get_content
+from threading import Lock
+from time import monotonic
+from typing import Dict, Iterator, Optional, Tuple
+
+DEFAULT_CACHE_TTL = 60.0
+DEFAULT_CACHE_MAX_SIZE = 1024
+
+DEFAULT_MAX_WORKERS = 8
+
+
+class ContentCache:
+    """
+    ContentResponse cache, by content ID.
+
+    Entries expire after ttl seconds, when there are more than max_size
+    entries the least recently used ones are evicted.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_CACHE_TTL, max_size: int = DEFAULT_CACHE_MAX_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+
+        self._entries: "OrderedDict[str, Tuple[float, ContentResponse]]" = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, content_id: str) -> Optional[ContentResponse]:
+        with self._lock:
+            entry = self._entries.get(content_id)
+            if entry is None:
+                return None
+
+            expire_time, content = entry
+            if monotonic() >= expire_time:
+                del self._entries[content_id]
+                return None
+
+            self._entries.move_to_end(content_id)
+            return content
+
+    def put(self, content_id: str, content: ContentResponse):
+        with self._lock:
+            self._entries[content_id] = (monotonic() + self.ttl, content)
+            self._entries.move_to_end(content_id)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, content_id: Optional[str] = None):
+        """Drop one entry, or all of them if content_id is None."""
+        with self._lock:
+            if content_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(content_id, None)
+
+    def get_content(self, content_id: str, token: str) -> ContentResponse:
+        """Get a content from the cache, fetching it if missing or expired."""
+        content = self.get(content_id)
+        if content is None:
+            content = get_content(content_id, token)
+            self.put(content_id, content)
+
+        return content
+
+
+def walk(
+    content_id: str,
+    token: str,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    cache: Optional[ContentCache] = None,
+) -> Iterator[Tuple[PurePosixPath, Content]]:
+    """
+    Recursively walk a folder, yielding (path, content) for every file and folder in it.
+
+    Paths are relative to the given folder. Subfolders are fetched concurrently,
+    at most max_workers at a time, and results are yielded as soon as each folder
+    is fetched, so only the folders still to be visited are kept in memory.
+    The order of the results isn't deterministic.
+    """
+    fetch = cache.get_content if cache is not None else get_content
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending: Dict["Future[ContentResponse]", PurePosixPath] = {}
+
+    try:
+        pending[executor.submit(fetch, content_id, token)] = PurePosixPath()
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                path = pending.pop(future)
+                response = future.result()
+
+                for content in response.get_contents():
+                    content_path = path / content.name
+                    if isinstance(content, Folder):
+                        pending[executor.submit(fetch, content.content_id, token)] = content_path
+
+                    yield content_path, content
+    finally:
+        # Also reached when the caller stops iterating early
+        executor.shutdown(wait=False, cancel_futures=True)
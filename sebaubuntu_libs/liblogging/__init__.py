@@ -4,8 +4,17 @@
 #
 """Logging utils."""
 
-from logging import basicConfig, INFO, DEBUG
+from atexit import register
+from logging import basicConfig, getLogger, INFO, DEBUG, Filter, Formatter, Handler, LogRecord
+from logging import StreamHandler
 from logging import debug, info, warning, error, fatal
+from queue import SimpleQueue
+from threading import Lock
+from time import monotonic
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+if TYPE_CHECKING:
+    from logging.handlers import QueueListener
 
 LOGD = debug
 LOGI = info
@@ -13,11 +22,133 @@ LOGW = warning
 LOGE = error
 LOGF = fatal
 
+VERBOSE_FORMAT = "[%(filename)s:%(lineno)s %(levelname)s] %(funcName)s: %(message)s"
+DEFAULT_FORMAT = "[%(levelname)s] %(message)s"
+
+
+class RateLimitFilter(Filter):
+    """
+    Drop records logged too often from the same call site.
+
+    Each call site (file and line) can log up to burst records at once and
+    rate records per second on average, the excess is dropped. The next
+    record let through from that call site tells how many were dropped.
+    Records above max_level (by default warnings and errors) always pass.
+    """
+
+    def __init__(self, rate: float, burst: int = 10, max_level: int = INFO):
+        super().__init__()
+
+        self.rate = rate
+        self.burst = burst
+        self.max_level = max_level
+
+        # Call site -> (tokens, last time, dropped records)
+        self._call_sites: Dict[Tuple[str, int], Tuple[float, float, int]] = {}
+        self._lock = Lock()
+
+    def filter(self, record: LogRecord):
+        if record.levelno > self.max_level:
+            return True
+
+        key = (record.pathname, record.lineno)
+        now = monotonic()
+
+        with self._lock:
+            tokens, last_time, dropped = self._call_sites.get(key, (self.burst, now, 0))
+            tokens = min(tokens + (now - last_time) * self.rate, self.burst)
+
+            if tokens < 1:
+                self._call_sites[key] = (tokens, now, dropped + 1)
+                return False
+
+            self._call_sites[key] = (tokens - 1, now, 0)
+
+        if dropped:
+            record.msg = f"{record.msg} [{dropped} similar messages suppressed]"
+
+        return True
+
+
+def _create_queue_handler(queue: "SimpleQueue[LogRecord]") -> Handler:
+    # logging.handlers is slow to import, only load it when queued logging is used
+    from logging.handlers import QueueHandler
+
+    class LazyQueueHandler(QueueHandler):
+        """QueueHandler leaving the formatting to the listener thread."""
+
+        def prepare(self, record: LogRecord):
+            # The record only crosses threads, it doesn't need to be pickled
+            return record
 
-def setup_logging(verbose: bool = False):
-    if verbose:
-        basicConfig(
-            format="[%(filename)s:%(lineno)s %(levelname)s] %(funcName)s: %(message)s", level=DEBUG
-        )
+    return LazyQueueHandler(queue)
+
+
+_queue_listener: Optional["QueueListener"] = None
+_handler: Optional[Handler] = None
+_stop_logging_registered = False
+
+
+def setup_logging(
+    verbose: bool = False,
+    queued: bool = False,
+    rate_limit: Optional[float] = None,
+    rate_limit_burst: int = 10,
+):
+    """
+    Configure the root logger.
+
+    With queued, records are put in a queue and formatted and written by a
+    background thread, so logging in hot loops only costs creating the records.
+    The queue is flushed at exit, or with stop_logging().
+    Calling it again replaces the handler installed by the previous call.
+    With rate_limit, each call site can log at most that many info and
+    debug messages per second (after a burst of rate_limit_burst), see
+    RateLimitFilter.
+    """
+    global _handler, _queue_listener, _stop_logging_registered
+
+    fmt = VERBOSE_FORMAT if verbose else DEFAULT_FORMAT
+    level = DEBUG if verbose else INFO
+
+    # Otherwise basicConfig() would do nothing, the root logger already has a handler
+    if _handler is not None:
+        getLogger().removeHandler(_handler)
+        _handler = None
+
+    # Removed first, so no record is queued after the old queue is flushed
+    stop_logging()
+
+    stream_handler = StreamHandler()
+    stream_handler.setFormatter(Formatter(fmt))
+
+    handler: Handler
+    if queued:
+        from logging.handlers import QueueListener
+
+        queue: "SimpleQueue[LogRecord]" = SimpleQueue()
+        handler = _create_queue_handler(queue)
+
+        _queue_listener = QueueListener(queue, stream_handler)
+        _queue_listener.start()
+
+        if not _stop_logging_registered:
+            register(stop_logging)
+            _stop_logging_registered = True
     else:
-        basicConfig(format="[%(levelname)s] %(message)s", level=INFO)
+        handler = stream_handler
+
+    if rate_limit is not None:
+        handler.addFilter(RateLimitFilter(rate_limit, burst=rate_limit_burst))
+
+    basicConfig(handlers=[handler], level=level)
+    _handler = handler
+
+
+def stop_logging():
+    """Write the queued records and stop the background thread of setup_logging(queued=True)."""
+    global _queue_listener
+
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        _queue_listener = None
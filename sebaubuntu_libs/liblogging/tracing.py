@@ -0,0 +1,281 @@
+#
+# SPDX-FileCopyrightText: Sebastiano Barezzi
+# SPDX-License-Identifier: Apache-2.0
+#
+"""
+Timing spans.
+
+Wrap a stage with trace() or decorate a function with traced() to record a
+span every time it runs, spans opened inside another one are nested in it.
+Tracing is disabled by default and then costs a flag check per span.
+
+Example:
+    tracer = enable_tracing()
+    Partitions(dump_path)
+    print(tracer.format_stats())
+    tracer.export_chrome_trace(Path("trace.json"))
+
+The Chrome trace can be opened with chrome://tracing or https://ui.perfetto.dev.
+"""
+
+from contextvars import ContextVar
+from functools import wraps
+import os
+from pathlib import Path
+from threading import Lock, get_ident
+from time import perf_counter_ns
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+# Spans kept for the Chrome trace, the per-stage stats count all of them
+DEFAULT_MAX_EVENTS = 1000000
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# inspect.CO_COROUTINE, inspect is slow to import
+_CO_COROUTINE = 0x80
+
+
+class SpanStats:
+    """Aggregated timings of the spans with the same name."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+        self.count = 0
+        self.total_ns = 0
+        # Total minus the time spent in nested spans
+        self.self_ns = 0
+        self.max_ns = 0
+
+    def add(self, duration_ns: int, children_ns: int):
+        self.count += 1
+        self.total_ns += duration_ns
+        self.self_ns += duration_ns - children_ns
+        self.max_ns = max(self.max_ns, duration_ns)
+
+
+class Span:
+    """A recorded run of a stage, times are perf_counter_ns() values."""
+
+    __slots__ = (
+        "tracer",
+        "name",
+        "category",
+        "args",
+        "thread_id",
+        "start_ns",
+        "end_ns",
+        "children_ns",
+        "_parent",
+        "_token",
+    )
+
+    def __init__(self, tracer: "Tracer", name: str, category: str, args: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+
+        self.thread_id = 0
+        self.start_ns = 0
+        self.end_ns = 0
+        self.children_ns = 0
+
+        self._parent: Optional[Span] = None
+        self._token: Any = None
+
+    @property
+    def duration_ns(self):
+        return self.end_ns - self.start_ns
+
+    def __enter__(self):
+        self._parent = _current_span.get()
+        self._token = _current_span.set(self)
+        self.thread_id = get_ident()
+        self.start_ns = perf_counter_ns()
+
+        return self
+
+    def __exit__(self, *args):
+        self.end_ns = perf_counter_ns()
+        _current_span.reset(self._token)
+
+        if self._parent is not None:
+            self._parent.children_ns += self.duration_ns
+        self._parent = None
+
+        self.tracer.add_span(self)
+
+
+class _NullSpan:
+    """What trace() returns while tracing is disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+# Innermost open span, per thread and per asyncio task
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """Collects the spans and their per-stage stats."""
+
+    def __init__(self, max_events: int = DEFAULT_MAX_EVENTS):
+        self.max_events = max_events
+
+        self.enabled = False
+        self.spans: List[Span] = []
+        self.dropped_spans = 0
+        self.stats: Dict[str, SpanStats] = {}
+
+        self._lock = Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def clear(self):
+        with self._lock:
+            self.spans = []
+            self.dropped_spans = 0
+            self.stats = {}
+
+    def add_span(self, span: Span):
+        with self._lock:
+            if span.name not in self.stats:
+                self.stats[span.name] = SpanStats(span.name)
+            self.stats[span.name].add(span.duration_ns, span.children_ns)
+
+            if len(self.spans) < self.max_events:
+                self.spans.append(span)
+            else:
+                self.dropped_spans += 1
+
+    def get_stats(self) -> List[SpanStats]:
+        """Per-stage stats, most time consuming first."""
+        with self._lock:
+            return sorted(self.stats.values(), key=lambda stats: stats.total_ns, reverse=True)
+
+    def format_stats(self) -> str:
+        """Per-stage stats as a table, times in milliseconds."""
+        stats_list = self.get_stats()
+
+        name_width = max([len(stats.name) for stats in stats_list] + [len("Stage")])
+        columns = " ".join(f"{column:>10}" for column in ["Total", "Self", "Mean", "Max"])
+        lines = [f"{'Stage':<{name_width}} {'Count':>8} {columns}"]
+        for stats in stats_list:
+            lines.append(
+                f"{stats.name:<{name_width}} {stats.count:>8}"
+                f" {stats.total_ns / 1e6:>10.2f} {stats.self_ns / 1e6:>10.2f}"
+                f" {stats.total_ns / stats.count / 1e6:>10.2f} {stats.max_ns / 1e6:>10.2f}"
+            )
+
+        return "\n".join(lines) + "\n"
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        """Return the spans in the Chrome trace event format."""
+        pid = os.getpid()
+
+        with self._lock:
+            spans = list(self.spans)
+
+        return {
+            "traceEvents": [
+                {
+                    "name": span.name,
+                    "cat": span.category,
+                    "ph": "X",
+                    "ts": span.start_ns / 1000,
+                    "dur": span.duration_ns / 1000,
+                    "pid": pid,
+                    "tid": span.thread_id,
+                    "args": {key: str(value) for key, value in span.args.items()},
+                }
+                for span in spans
+            ],
+            "displayTimeUnit": "ms",
+        }
+
+    def export_chrome_trace(self, path: Path):
+        from json import dump
+
+        with path.open("w") as f:
+            dump(self.to_chrome_trace(), f)
+
+
+_tracer = Tracer()
+
+
+def get_tracer() -> Tracer:
+    """Return the global tracer."""
+    return _tracer
+
+
+def enable_tracing() -> Tracer:
+    """Start recording spans, returns the global tracer."""
+    _tracer.enable()
+
+    return _tracer
+
+
+def disable_tracing():
+    _tracer.disable()
+
+
+def is_tracing_enabled() -> bool:
+    """Whether spans are being recorded, to skip preparing their name and args otherwise."""
+    return _tracer.enabled
+
+
+def trace(name: str, category: str = "", **args: Any):
+    """
+    Context manager recording a span.
+
+    args are attached to the span and converted to strings only when exported,
+    pass the objects as they are.
+    """
+    if not _tracer.enabled:
+        return _NULL_SPAN
+
+    return Span(_tracer, name, category, args)
+
+
+def traced(name: Optional[str] = None, category: str = "") -> Callable[[F], F]:
+    """Decorator recording a span for each call, named after the function by default."""
+
+    def decorator(func: F) -> F:
+        span_name = name or func.__qualname__
+
+        if getattr(getattr(func, "__code__", None), "co_flags", 0) & _CO_COROUTINE:
+
+            @wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any):
+                if not _tracer.enabled:
+                    return await func(*args, **kwargs)
+
+                with Span(_tracer, span_name, category, {}):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper  # type: ignore[return-value]
+
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any):
+            if not _tracer.enabled:
+                return func(*args, **kwargs)
+
+            with Span(_tracer, span_name, category, {}):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
@@ -4,18 +4,155 @@
 #
 """nekobin library."""
 
-from requests import post
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import StringIO
+from threading import Lock
+from typing import TYPE_CHECKING, Deque, Iterable, Iterator, List, Optional, TextIO, Union
+
+if TYPE_CHECKING:
+    from requests import Session
 
 URL = "https://nekobin.com"
 
+# Stay under the paste size limit, in UTF-8 bytes
+DEFAULT_MAX_DOCUMENT_SIZE = 256 * 1024
+# Fits several index lines (~100 bytes each), so every level of indexes is smaller than the last
+MIN_MAX_DOCUMENT_SIZE = 1024
+DEFAULT_MAX_WORKERS = 4
+
+_session: Optional["Session"] = None
+_session_lock = Lock()
+
+
+def get_session() -> "Session":
+    """Return the shared keep-alive session, creating it if needed."""
+    global _session
+
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                # requests is slow to import, only load it once it's needed
+                from requests import Session
+                from requests.adapters import HTTPAdapter
+                from urllib3.util.retry import Retry
+
+                # Pasting the same document twice is harmless, retry POSTs too
+                retry = Retry(
+                    total=3,
+                    backoff_factor=0.5,
+                    status_forcelist=[429, 500, 502, 503, 504],
+                    allowed_methods=None,
+                )
+                session = Session()
+                session.mount("https://", HTTPAdapter(pool_maxsize=16, max_retries=retry))
+                session.mount("http://", HTTPAdapter(pool_maxsize=16, max_retries=retry))
+                _session = session
+
+    return _session
+
 
 def to_nekobin(data: str) -> str:
     """Upload a string to Nekobin and return its URL."""
     json = {"content": data}
 
-    resp = post(f"{URL}/api/documents", json=json)
+    resp = get_session().post(f"{URL}/api/documents", json=json)
     resp.raise_for_status()
     resp_json = resp.json()
 
     key = resp_json.get("result").get("key")
     return f"{URL}/{key}"
+
+
+def split_documents(
+    lines: Iterable[str], max_document_size: int = DEFAULT_MAX_DOCUMENT_SIZE
+) -> Iterator[str]:
+    """
+    Group lines in documents of at most max_document_size UTF-8 bytes.
+
+    Documents end on line boundaries, lines longer than the limit are split.
+    """
+    document: List[str] = []
+    document_size = 0
+
+    for line in lines:
+        line_size = len(line.encode("utf-8"))
+
+        if document and document_size + line_size > max_document_size:
+            yield "".join(document)
+            document = []
+            document_size = 0
+
+        while line_size > max_document_size:
+            # Split by characters, so the UTF-8 size can only be smaller
+            head, line = _split_utf8(line, max_document_size)
+            yield head
+            line_size = len(line.encode("utf-8"))
+
+        if line:
+            document.append(line)
+            document_size += line_size
+
+    if document:
+        yield "".join(document)
+
+
+def to_nekobin_large(
+    data: Union[str, TextIO, Iterable[str]],
+    max_document_size: int = DEFAULT_MAX_DOCUMENT_SIZE,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+) -> str:
+    """
+    Upload a text of any size to Nekobin and return its URL.
+
+    data can be a string, a text file or any iterable of lines, it's read
+    lazily and only a few documents are held in memory at a time.
+    The text is split with split_documents() and the parts are uploaded
+    concurrently. If there's more than one part, the returned URL is the one
+    of an index document listing the URLs of the parts in order.
+    max_document_size must be at least MIN_MAX_DOCUMENT_SIZE.
+    """
+    if max_document_size < MIN_MAX_DOCUMENT_SIZE:
+        raise ValueError(
+            f"max_document_size must be at least {MIN_MAX_DOCUMENT_SIZE}, not {max_document_size}"
+        )
+
+    lines = StringIO(data) if isinstance(data, str) else data
+
+    urls: List[str] = []
+    futures: Deque["Future[str]"] = deque()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for document in split_documents(lines, max_document_size):
+            # Bound the documents waiting to be uploaded
+            if len(futures) >= 2 * max_workers:
+                urls.append(futures.popleft().result())
+
+            futures.append(executor.submit(to_nekobin, document))
+
+        while futures:
+            urls.append(futures.popleft().result())
+
+    if not urls:
+        return to_nekobin("")
+
+    if len(urls) == 1:
+        return urls[0]
+
+    index = "".join(f"Part {i}/{len(urls)}: {url}\n" for i, url in enumerate(urls, 1))
+
+    # A huge index gets split too, with its own index
+    return to_nekobin_large(index, max_document_size, max_workers)
+
+
+def _split_utf8(line: str, max_size: int):
+    # Find the longest prefix fitting in max_size bytes
+    low, high = 1, min(len(line), max_size)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if len(line[:middle].encode("utf-8")) <= max_size:
+            low = middle
+        else:
+            high = middle - 1
+
+    return line[:low], line[low:]
@@ -0,0 +1,80 @@
+#
+# SPDX-FileCopyrightText: Sebastiano Barezzi
+# SPDX-License-Identifier: Apache-2.0
+#
+"""Indexed registry library."""
+
+from operator import attrgetter
+from typing import Dict, Generic, Hashable, Iterable, Iterator, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class Registry(Generic[T]):
+    """
+    A list of objects indexed by some of their attributes.
+
+    Every attribute in keys gets a hash index, filled when an object is
+    registered, so looking objects up by it takes constant time instead of
+    a scan of the whole list. Attributes in multi_keys hold a collection
+    of values (e.g. a list of mount points), an object is indexed by each of them.
+    Values are read at registration, changing them afterwards doesn't update the indexes.
+
+    Example:
+        _REGISTRY: Registry[PartitionModel] = Registry(keys=["name"], multi_keys=["mount_points"])
+        _REGISTRY.register(model)
+        _REGISTRY.get("mount_points", "/system")
+    """
+
+    def __init__(self, keys: Iterable[str] = (), multi_keys: Iterable[str] = ()):
+        self.all: List[T] = []
+
+        self._getters = {key: attrgetter(key) for key in keys}
+        self._multi_getters = {key: attrgetter(key) for key in multi_keys}
+
+        # Attribute -> value -> objects with that value, in registration order
+        self._indexes: Dict[str, Dict[Hashable, List[T]]] = {
+            key: {} for key in [*self._getters, *self._multi_getters]
+        }
+
+    def __iter__(self) -> Iterator[T]:
+        return iter(self.all)
+
+    def __len__(self):
+        return len(self.all)
+
+    def register(self, obj: T) -> T:
+        """Add an object to the registry and its indexes, returns it."""
+        self.all.append(obj)
+
+        for key, getter in self._getters.items():
+            self._indexes[key].setdefault(getter(obj), []).append(obj)
+
+        for key, getter in self._multi_getters.items():
+            index = self._indexes[key]
+            for value in getter(obj):
+                objs = index.setdefault(value, [])
+                # A value repeated in the same object doesn't make it match twice
+                if not objs or objs[-1] is not obj:
+                    objs.append(obj)
+
+        return obj
+
+    def get(self, key: str, value: Hashable) -> Optional[T]:
+        """Get the first registered object whose key attribute is (or contains) value, or None."""
+        try:
+            objs = self._indexes[key].get(value)
+        except TypeError:
+            # Unhashable, no indexed value can match it
+            return None
+
+        return objs[0] if objs else None
+
+    def get_all(self, key: str, value: Hashable) -> List[T]:
+        """Get the registered objects whose key attribute is (or contains) value, in order."""
+        try:
+            objs = self._indexes[key].get(value)
+        except TypeError:
+            return []
+
+        return list(objs) if objs else []
@@ -4,13 +4,205 @@
 #
 """sed (stream editor) library."""
 
+from functools import lru_cache
+import os
+from pathlib import Path
 import re
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Pattern, Tuple, Union
 
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
 
-def sed(string: str, regexp: str, replacement: str, flags: str = ""):
-    """re wrapper for sed."""
+# Compiled expressions kept around
+REGEX_CACHE_SIZE = 512
+
+# Files are read and written as UTF-8, bytes that aren't valid UTF-8 are kept as they are
+ENCODING = "utf-8"
+ENCODING_ERRORS = "surrogateescape"
+
+
+@lru_cache(maxsize=REGEX_CACHE_SIZE)
+def compile_expression(regexp: str, flags: str = "") -> Pattern[str]:
+    """Compile a regexp with sed flags, cached."""
     _flags = 0
     _flags |= re.M if "m" in flags or "M" in flags else 0
     _flags |= re.I if "i" in flags or "I" in flags else 0
 
-    return re.sub(regexp, replacement, string, (0 if "g" in flags else 1), _flags)
+    return re.compile(regexp, _flags)
+
+
+def sed(string: str, regexp: str, replacement: str, flags: str = ""):
+    """re wrapper for sed."""
+    return compile_expression(regexp, flags).sub(
+        replacement, string, count=0 if "g" in flags else 1
+    )
+
+
+class SedScript:
+    """
+    A list of sed expressions, compiled once and applied in order.
+
+    apply() works like calling sed() once per expression on the whole string.
+    The file functions can instead stream the file line by line, applying
+    every expression to each line like sed(1) does: expressions must not
+    match across lines and without "g" they replace once per line.
+    """
+
+    def __init__(self, expressions: Iterable[Tuple[str, ...]] = ()):
+        """Initialize a script from (regexp, replacement[, flags]) tuples."""
+        self._expressions: List[Tuple[Pattern[str], str, int]] = []
+
+        for expression in expressions:
+            self.add(*expression)
+
+    def __len__(self):
+        return len(self._expressions)
+
+    def add(self, regexp: str, replacement: str, flags: str = "") -> "SedScript":
+        """Append an expression, returns the script to chain calls."""
+        self._expressions.append(
+            (compile_expression(regexp, flags), replacement, 0 if "g" in flags else 1)
+        )
+
+        return self
+
+    def apply(self, string: str) -> str:
+        for pattern, replacement, count in self._expressions:
+            string = pattern.sub(replacement, string, count=count)
+
+        return string
+
+    def apply_lines(self, lines: Iterable[str]) -> Iterator[str]:
+        r"""
+        Apply the script to each line.
+
+        Like sed(1), the trailing newline isn't part of what the expressions
+        see, it's added back to the result:
+
+        >>> script = SedScript([(r"\s+$", ""), ("$", ";")])
+        >>> list(script.apply_lines(["a  \n", "b\t\n", "c"]))
+        ['a;\n', 'b;\n', 'c;']
+        """
+        for line in lines:
+            yield self._apply_line(line)
+
+    def apply_file(
+        self,
+        path: Union[str, Path],
+        output: Optional[Union[str, Path]] = None,
+        line_mode: bool = True,
+    ) -> bool:
+        """
+        Apply the script to a file, in place unless output is given.
+
+        With line_mode the file is streamed line by line, else it's mapped
+        in memory and the script is applied to the whole content.
+        The result is written to a temporary file that atomically replaces
+        the destination, a file left unchanged in place isn't touched at all.
+        Returns whether the content changed.
+        """
+        # Only needed to edit files, keep importing the module cheap
+        from shutil import copymode
+        from tempfile import NamedTemporaryFile
+
+        path = Path(path)
+        output = Path(output) if output is not None else path
+
+        with NamedTemporaryFile(
+            "w",
+            encoding=ENCODING,
+            errors=ENCODING_ERRORS,
+            newline="",
+            dir=output.parent,
+            prefix=f".{output.name}.",
+            delete=False,
+        ) as temp_file:
+            try:
+                if line_mode:
+                    changed = self._apply_file_lines(path, temp_file)
+                else:
+                    changed = self._apply_file_mmap(path, temp_file)
+            except BaseException:
+                temp_file.close()
+                os.unlink(temp_file.name)
+                raise
+
+        if not changed and output == path:
+            os.unlink(temp_file.name)
+            return False
+
+        copymode(path, temp_file.name)
+        os.replace(temp_file.name, output)
+
+        return changed
+
+    def apply_files(
+        self,
+        paths: Iterable[Union[str, Path]],
+        max_workers: Optional[int] = None,
+        line_mode: bool = True,
+        use_processes: bool = False,
+    ) -> Dict[Path, bool]:
+        """
+        Apply the script in place to many files concurrently.
+
+        Regex matching holds the GIL, use_processes spreads the work
+        on a process pool to use all the CPUs on big rewrites.
+        Returns whether each file changed.
+        """
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+        paths = [Path(path) for path in paths]
+
+        executor: "Executor"
+        if use_processes:
+            executor = ProcessPoolExecutor(max_workers=max_workers)
+        else:
+            executor = ThreadPoolExecutor(max_workers=max_workers)
+
+        with executor:
+            results = executor.map(
+                _apply_file, [self] * len(paths), paths, [line_mode] * len(paths)
+            )
+
+            return dict(zip(paths, results))
+
+    def _apply_file_lines(self, path: Path, temp_file) -> bool:
+        changed = False
+
+        # Split on "\n" only and left untranslated, like sed(1)
+        with path.open(encoding=ENCODING, errors=ENCODING_ERRORS, newline="\n") as f:
+            for line in f:
+                new_line = self._apply_line(line)
+                changed = changed or new_line != line
+                temp_file.write(new_line)
+
+        return changed
+
+    def _apply_line(self, line: str) -> str:
+        if line.endswith("\n"):
+            return f"{self.apply(line[:-1])}\n"
+
+        return self.apply(line)
+
+    def _apply_file_mmap(self, path: Path, temp_file) -> bool:
+        from mmap import ACCESS_READ, mmap
+
+        with path.open("rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                # Empty files can't be mapped
+                string = ""
+            else:
+                with mmap(f.fileno(), 0, access=ACCESS_READ) as mapped_file:
+                    # Decoded straight from the mapping, without reading it in a buffer first
+                    string = str(mapped_file, ENCODING, ENCODING_ERRORS)
+
+        new_string = self.apply(string)
+        temp_file.write(new_string)
+
+        return new_string != string
+
+
+def _apply_file(script: SedScript, path: Path, line_mode: bool) -> bool:
+    # Module level, so it can be sent to worker processes
+    return script.apply_file(path, line_mode=line_mode)